@@ -0,0 +1,165 @@
+"""
+Bandwidth saved vs. CPU spent by permessage-deflate on rosbridge JSON traffic.
+
+Frames are compressed the way permessage-deflate does it (raw deflate, one stream per connection
+with context takeover, sync flush after every message), at several zlib levels.
+
+Usage:
+    python benchmarks/deflate_benchmark.py                       # synthetic /joint_states, /tf, /odom, typedefs
+    python benchmarks/deflate_benchmark.py --frames traffic.jsonl  # one rosbridge frame per line
+"""
+
+import json
+import math
+import random
+import time
+import zlib
+from argparse import ArgumentParser
+from pathlib import Path
+
+LEVELS = (1, 3, 6, 9)
+JOINTS = [f"{leg}_{joint}_joint" for leg in ("lf", "rf", "lh", "rh") for joint in ("hip", "upper_leg", "lower_leg")]
+
+
+def _stamp(t: float) -> dict:
+    return {"sec": int(t), "nanosec": int((t % 1) * 1e9)}
+
+
+def synthetic_frames(seconds: float = 10.0) -> list[str]:
+    """Rosbridge frames for the topics the MCP server typically sees, at their usual rates."""
+    frames = []
+    rnd = random.Random(0)
+    t = 0.0
+    while t < seconds:
+        header = {"stamp": _stamp(t), "frame_id": ""}
+        frames.append(
+            json.dumps(
+                {
+                    "op": "publish",
+                    "topic": "/joint_states",
+                    "msg": {
+                        "header": header,
+                        "name": JOINTS,
+                        "position": [math.sin(t + i) * 0.5 for i in range(len(JOINTS))],
+                        "velocity": [rnd.uniform(-1, 1) for _ in JOINTS],
+                        "effort": [0.0] * len(JOINTS),
+                    },
+                }
+            )
+        )
+        frames.append(
+            json.dumps(
+                {
+                    "op": "publish",
+                    "topic": "/tf",
+                    "msg": {
+                        "transforms": [
+                            {
+                                "header": {"stamp": _stamp(t), "frame_id": parent},
+                                "child_frame_id": child,
+                                "transform": {
+                                    "translation": {"x": rnd.random(), "y": rnd.random(), "z": 0.0},
+                                    "rotation": {"x": 0.0, "y": 0.0, "z": rnd.random(), "w": rnd.random()},
+                                },
+                            }
+                            for parent, child in (("odom", "base_footprint"), ("base_footprint", "base_link"))
+                        ]
+                    },
+                }
+            )
+        )
+        if int(t * 50) % 2 == 0:
+            frames.append(
+                json.dumps(
+                    {
+                        "op": "publish",
+                        "topic": "/odom",
+                        "msg": {
+                            "header": {"stamp": _stamp(t), "frame_id": "odom"},
+                            "child_frame_id": "base_footprint",
+                            "pose": {
+                                "pose": {
+                                    "position": {"x": t * 0.1, "y": 0.0, "z": 0.0},
+                                    "orientation": {"x": 0.0, "y": 0.0, "z": 0.0, "w": 1.0},
+                                },
+                                "covariance": [0.0] * 36,
+                            },
+                            "twist": {
+                                "twist": {
+                                    "linear": {"x": 0.1, "y": 0.0, "z": 0.0},
+                                    "angular": {"x": 0.0, "y": 0.0, "z": 0.0},
+                                },
+                                "covariance": [0.0] * 36,
+                            },
+                        },
+                    }
+                )
+            )
+        t += 1 / 50.0
+    typedef = {
+        "type": "geometry_msgs/Twist",
+        "fieldnames": ["linear", "angular"],
+        "fieldtypes": ["geometry_msgs/Vector3", "geometry_msgs/Vector3"],
+        "fieldarraylen": [-1, -1],
+        "examples": ["{}", "{}"],
+        "constnames": [],
+        "constvalues": [],
+    }
+    frames.append(
+        json.dumps({"op": "service_response", "service": "/rosapi/message_details", "values": {"typedefs": [typedef]}})
+    )
+    return frames
+
+
+def load_frames(path: Path) -> list[str]:
+    with open(path) as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def measure(frames: list[bytes], level: int) -> dict:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, 5)
+    compressed = []
+    start = time.process_time()
+    for frame in frames:
+        data = compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        compressed.append(data[:-4])  # permessage-deflate drops the trailing 00 00 ff ff
+    compress_s = time.process_time() - start
+
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    start = time.process_time()
+    for data in compressed:
+        decompressor.decompress(data + b"\x00\x00\xff\xff")
+    decompress_s = time.process_time() - start
+
+    raw_bytes = sum(len(f) for f in frames)
+    out_bytes = sum(len(c) for c in compressed)
+    return {
+        "level": level,
+        "raw_bytes": raw_bytes,
+        "compressed_bytes": out_bytes,
+        "ratio": raw_bytes / out_bytes,
+        "saved_pct": 100.0 * (1 - out_bytes / raw_bytes),
+        "compress_us_per_msg": 1e6 * compress_s / len(frames),
+        "decompress_us_per_msg": 1e6 * decompress_s / len(frames),
+        "compress_mb_per_cpu_s": raw_bytes / 1e6 / compress_s if compress_s > 0 else math.inf,
+    }
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--frames", type=Path, help="JSON lines file of recorded rosbridge frames")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Length of the synthetic traffic, in seconds")
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N runs; defaults to %(default)s")
+    args = parser.parse_args()
+
+    text_frames = load_frames(args.frames) if args.frames else synthetic_frames(args.seconds)
+    frames = [f.encode("utf-8") for f in text_frames]
+    print(f"{len(frames)} frames, {sum(len(f) for f in frames) / 1e3:.1f} kB")
+    print(f"{'level':>5} {'ratio':>6} {'saved':>7} {'comp us/msg':>12} {'decomp us/msg':>14} {'comp MB/cpu-s':>14}")
+    for level in LEVELS:
+        best = min((measure(frames, level) for _ in range(args.repeat)), key=lambda r: r["compress_us_per_msg"])
+        print(
+            f"{best['level']:>5} {best['ratio']:>6.1f} {best['saved_pct']:>6.1f}% "
+            f"{best['compress_us_per_msg']:>12.1f} {best['decompress_us_per_msg']:>14.1f} "
+            f"{best['compress_mb_per_cpu_s']:>14.1f}"
+        )
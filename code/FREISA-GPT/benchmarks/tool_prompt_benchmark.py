@@ -0,0 +1,102 @@
+"""
+System prompt size and LLM latency with every tool described vs. only the top-k relevant ones.
+
+Connects to the MCP servers of the configuration, builds the system prompt and the `tools` parameter of a few
+voice commands both ways and prints their sizes; with --llm-base-url, also times the LLM responses to both.
+With --prompt-tools, the tools are described in the system prompt instead of the `tools` parameter.
+
+Usage (from the FREISA-GPT directory):
+    python benchmarks/tool_prompt_benchmark.py --top-k 4
+    python benchmarks/tool_prompt_benchmark.py --top-k 4 --llm-base-url http://<your_llm_api_url> --repeat 3
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.mcp_client_pupper.mcp_client import ChatSession, ChatSessionConfig  # noqa: E402
+from src.mcp_client_pupper.utils.llm_client import LLMClientConfig  # noqa: E402
+
+COMMANDS = [
+    "Walk forward",
+    "Turn left",
+    "Come here",
+    "What do you see?",
+    "Is there an obstacle in front of you?",
+    "What's your battery level?",
+    "Go faster",
+    "Which topics are there?",
+]
+
+
+async def run(args):
+    session = ChatSession(
+        ChatSessionConfig(
+            mcp_server_config_file=args.mcp_server_config,
+            llm_client_config=LLMClientConfig(
+                base_url=args.llm_base_url or "http://localhost",
+                model=args.llm_model,
+                api_key=os.getenv("OPENAI_API_KEY"),
+            ),
+            native_tools=not args.prompt_tools,
+            tool_top_k=args.top_k,
+        )
+    )
+
+    def size(system: str, tools) -> int:
+        return len(system) + (len(json.dumps(tools)) if tools else 0)
+
+    try:
+        await session.set_up_mcp_client()
+        if not session.tool_index:
+            print("No tools: check the MCP server configuration")
+            return
+
+        full = session.system_message
+        full_tools = [schema for schema, _ in session.tool_schemas.values()] if session.native_tools else None
+        full_size = size(full, full_tools)
+        print(
+            f"{len(session.tool_index)} tools, full system prompt and tools: {full_size} chars (~{full_size // 4} tokens)\n"
+        )
+        print(f"{'command':40s} {'chars':>7s} {'saved':>6s}  {'full s':>7s} {'top-k s':>7s}  tools")
+        for command in COMMANDS:
+            prompt = session.system_message_for(command)
+            tools = session.tools_for(command)
+            line = f"{command:40s} {size(prompt, tools):7d} {1 - size(prompt, tools) / full_size:6.0%}"
+            if args.llm_base_url:
+                latencies = {}
+                for name, system, offered in (("full", full, full_tools), ("top", prompt, tools)):
+                    times = []
+                    for _ in range(args.repeat):
+                        start = time.perf_counter()
+                        await session.llm_client.get_response(
+                            [{"role": "system", "content": system}, {"role": "user", "content": command}], offered
+                        )
+                        times.append(time.perf_counter() - start)
+                    latencies[name] = statistics.median(times)
+                line += f"  {latencies['full']:7.2f} {latencies['top']:7.2f}"
+            else:
+                line += f"  {'-':>7s} {'-':>7s}"
+            print(f"{line}  {', '.join(session.tool_retriever.top(command, args.top_k))}")
+    finally:
+        await session.cleanup_servers()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top-k", type=int, default=4, help="Tools described in full; defaults to %(default)s")
+    parser.add_argument("--prompt-tools", action="store_true", help="Describe the tools in the system prompt")
+    parser.add_argument("--mcp-server-config", type=Path, default=Path("./servers_config.json"))
+    parser.add_argument("--llm-base-url", type=str, default=os.getenv("OPENAI_BASE_URL"), help="Times the LLM if set")
+    parser.add_argument("--llm-model", type=str, default=os.getenv("OPENAI_MODEL", "gpt-oss:20b"))
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="LLM requests per prompt (median); defaults to %(default)s"
+    )
+    asyncio.run(run(parser.parse_args()))
@@ -28,6 +28,58 @@
         help="LLM model. To be chosen among the ones available at the specified `--llm-base-url`",
         default=os.getenv("OPENAI_MODEL", DEFAULT_MODEL),
     )
+    parser.add_argument(
+        "--llm-stream",
+        action="store_true",
+        help="Stream the LLM responses and execute each tool call as soon as it is generated",
+    )
+    parser.add_argument(
+        "--llm-http2",
+        action="store_true",
+        help="Use HTTP/2 to reach the LLM over HTTPS (requires `httpx[http2]`)",
+    )
+    parser.add_argument(
+        "--llm-prompt-tools",
+        action="store_true",
+        help="Describe the tools in the system prompt instead of the `tools` parameter, for LLM providers "
+        "without function calling",
+    )
+    parser.add_argument(
+        "--tool-top-k",
+        type=int,
+        default=None,
+        help="Describe to the LLM only the K tools most relevant to each command (the others in one line each)",
+    )
+    parser.add_argument(
+        "--plan-cache",
+        type=Path,
+        default=None,
+        help="JSON file caching the tool calls of each command, to execute repeated commands without the LLM",
+    )
+    parser.add_argument(
+        "--command-grammar",
+        action="store_true",
+        help="Execute the simple motion commands (walk, turn, stop) directly, without the LLM",
+    )
+    parser.add_argument(
+        "--grammar-topic",
+        type=str,
+        default="/cmd_vel",
+        help="Velocity command topic of `--command-grammar`; defaults to %(default)s",
+    )
+    parser.add_argument(
+        "--grammar-msg-type",
+        type=str,
+        default=None,
+        help="Type of `--grammar-topic`, e.g. geometry_msgs/msg/TwistStamped; looked up on the robot if not set",
+    )
+    parser.add_argument(
+        "--response-mode",
+        choices=["none", "async", "sync"],
+        default="sync",
+        help="Final reply phrased by the LLM once the tools completed: waited for (sync), generated in the "
+        "background (async) or skipped (none); defaults to %(default)s",
+    )
     parser.add_argument(
         "--mcp-server-config",
         type=Path,
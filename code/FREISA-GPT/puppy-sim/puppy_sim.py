@@ -0,0 +1,581 @@
+"""
+Kinematic simulation of the mini pupper, speaking the rosbridge protocol.
+
+A stand-in for rosbridge on the robot, for end-to-end tests and benchmarks of the FREISA-GPT stack
+on a plain Linux box, without Docker nor ROS:
+
+- `/cmd_vel` (Twist or TwistStamped) is integrated into the pose of the robot, published on `/odom`
+  and `/tf`; the robot stops when no command was received for half a second, like the real one
+- `/joint_states` follows a synthetic trot while the robot moves
+- `/camera/image_raw` (and optionally `/camera/depth/image_raw`) carry synthetic images of any size
+- messages published by clients on other topics are forwarded to their subscribers
+- the rosapi services used by the MCP server are answered (topics, types, message details, time, parameters)
+
+Each message is encoded once per tick (JSON, or CBOR for the clients asking for it) and queued to every
+subscriber; like rosbridge, a subscriber that does not keep up loses its oldest messages.
+
+Usage:
+    python puppy-sim/puppy_sim.py                                    # rosbridge on port 9090
+    python puppy-sim/puppy_sim.py --port 9091 --odom-rate 100 --camera-size 1280x720 --camera-rate 30
+    python puppy-sim/puppy_sim.py --camera-rate 0 --depth-rate 10     # depth camera only
+"""
+
+import asyncio
+import base64
+import json
+import math
+import struct
+import time
+from argparse import ArgumentParser
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import websockets
+
+JOINTS = [f"{leg}_{joint}_joint" for leg in ("lf", "rf", "lh", "rh") for joint in ("hip", "upper_leg", "lower_leg")]
+# Standing pose: hip, upper leg, lower leg angles (rad)
+STANDING_POSE = (0.0, 0.6, -1.2)
+# Trot: diagonal legs move together
+LEG_PHASES = {"lf": 0.0, "rh": 0.0, "rf": math.pi, "lh": math.pi}
+GAIT_FREQUENCY_HZ = 2.5
+
+# The robot stops when the last velocity command is older than this
+CMD_TIMEOUT_S = 0.5
+# Messages queued per client before the oldest ones are dropped
+CLIENT_QUEUE_SIZE = 100
+
+# Message definitions for `rosapi/MessageDetails`: type -> [(field, type, array length)],
+# with -1 for single values, 0 for unbounded arrays and N for fixed-size arrays
+MESSAGE_DEFINITIONS: Dict[str, List[Tuple[str, str, int]]] = {
+    "builtin_interfaces/Time": [("sec", "int32", -1), ("nanosec", "uint32", -1)],
+    "std_msgs/Header": [("stamp", "builtin_interfaces/Time", -1), ("frame_id", "string", -1)],
+    "std_msgs/String": [("data", "string", -1)],
+    "geometry_msgs/Vector3": [("x", "float64", -1), ("y", "float64", -1), ("z", "float64", -1)],
+    "geometry_msgs/Point": [("x", "float64", -1), ("y", "float64", -1), ("z", "float64", -1)],
+    "geometry_msgs/Quaternion": [
+        ("x", "float64", -1),
+        ("y", "float64", -1),
+        ("z", "float64", -1),
+        ("w", "float64", -1),
+    ],
+    "geometry_msgs/Twist": [("linear", "geometry_msgs/Vector3", -1), ("angular", "geometry_msgs/Vector3", -1)],
+    "geometry_msgs/TwistStamped": [("header", "std_msgs/Header", -1), ("twist", "geometry_msgs/Twist", -1)],
+    "geometry_msgs/Pose": [("position", "geometry_msgs/Point", -1), ("orientation", "geometry_msgs/Quaternion", -1)],
+    "geometry_msgs/PoseWithCovariance": [("pose", "geometry_msgs/Pose", -1), ("covariance", "float64", 36)],
+    "geometry_msgs/TwistWithCovariance": [("twist", "geometry_msgs/Twist", -1), ("covariance", "float64", 36)],
+    "geometry_msgs/Transform": [
+        ("translation", "geometry_msgs/Vector3", -1),
+        ("rotation", "geometry_msgs/Quaternion", -1),
+    ],
+    "geometry_msgs/TransformStamped": [
+        ("header", "std_msgs/Header", -1),
+        ("child_frame_id", "string", -1),
+        ("transform", "geometry_msgs/Transform", -1),
+    ],
+    "tf2_msgs/TFMessage": [("transforms", "geometry_msgs/TransformStamped", 0)],
+    "nav_msgs/Odometry": [
+        ("header", "std_msgs/Header", -1),
+        ("child_frame_id", "string", -1),
+        ("pose", "geometry_msgs/PoseWithCovariance", -1),
+        ("twist", "geometry_msgs/TwistWithCovariance", -1),
+    ],
+    "sensor_msgs/JointState": [
+        ("header", "std_msgs/Header", -1),
+        ("name", "string", 0),
+        ("position", "float64", 0),
+        ("velocity", "float64", 0),
+        ("effort", "float64", 0),
+    ],
+    "sensor_msgs/Image": [
+        ("header", "std_msgs/Header", -1),
+        ("height", "uint32", -1),
+        ("width", "uint32", -1),
+        ("encoding", "string", -1),
+        ("is_bigendian", "uint8", -1),
+        ("step", "uint32", -1),
+        ("data", "uint8", 0),
+    ],
+}
+
+
+def normalize_type(msg_type: str) -> str:
+    """'geometry_msgs/msg/Twist' -> 'geometry_msgs/Twist'."""
+    parts = msg_type.split("/")
+    return f"{parts[0]}/{parts[2]}" if len(parts) == 3 and parts[1] == "msg" else msg_type
+
+
+def typedefs(msg_type: str) -> List[dict]:
+    """Typedefs of a message type and of its nested types, as returned by `rosapi/MessageDetails`."""
+    result, pending, seen = [], [normalize_type(msg_type)], set()
+    while pending:
+        name = pending.pop(0)
+        if name in seen or name not in MESSAGE_DEFINITIONS:
+            continue
+        seen.add(name)
+        fields = MESSAGE_DEFINITIONS[name]
+        result.append(
+            {
+                "type": name,
+                "fieldnames": [f for f, _, _ in fields],
+                "fieldtypes": [t for _, t, _ in fields],
+                "fieldarraylen": [n for _, _, n in fields],
+                "examples": ["" for _ in fields],
+                "constnames": [],
+                "constvalues": [],
+            }
+        )
+        pending.extend(t for _, t, _ in fields if "/" in t)
+    return result
+
+
+def cbor_dumps(value) -> bytes:
+    """Minimal CBOR encoder for rosbridge messages; byte strings stay binary, as rosbridge does for uint8[]."""
+
+    def head(major: int, argument: int) -> bytes:
+        if argument < 24:
+            return bytes([major << 5 | argument])
+        for info, fmt in ((24, ">B"), (25, ">H"), (26, ">I"), (27, ">Q")):
+            if argument < 1 << (8 * struct.calcsize(fmt)):
+                return bytes([major << 5 | info]) + struct.pack(fmt, argument)
+        raise ValueError(f"Integer too large for CBOR: {argument}")
+
+    if value is None:
+        return b"\xf6"
+    if value is True:
+        return b"\xf5"
+    if value is False:
+        return b"\xf4"
+    if isinstance(value, int):
+        return head(0, value) if value >= 0 else head(1, -1 - value)
+    if isinstance(value, float):
+        return b"\xfb" + struct.pack(">d", value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return head(2, len(value)) + bytes(value)
+    if isinstance(value, str):
+        encoded = value.encode("utf-8")
+        return head(3, len(encoded)) + encoded
+    if isinstance(value, (list, tuple)):
+        return head(4, len(value)) + b"".join(cbor_dumps(v) for v in value)
+    if isinstance(value, dict):
+        return head(5, len(value)) + b"".join(cbor_dumps(k) + cbor_dumps(v) for k, v in value.items())
+    raise TypeError(f"Cannot encode {type(value).__name__} to CBOR")
+
+
+def stamp(t: float) -> dict:
+    return {"sec": int(t), "nanosec": int((t % 1.0) * 1e9)}
+
+
+def yaw_to_quaternion(yaw: float) -> dict:
+    return {"x": 0.0, "y": 0.0, "z": math.sin(yaw / 2.0), "w": math.cos(yaw / 2.0)}
+
+
+class PuppyModel:
+    """Planar kinematics of the robot: the velocity command, in the body frame, is integrated into the pose."""
+
+    def __init__(self, max_linear_speed: float = 0.3, max_angular_speed: float = 1.0):
+        self.params = {
+            "/puppy_sim:max_linear_speed": max_linear_speed,
+            "/puppy_sim:max_angular_speed": max_angular_speed,
+            "/puppy_sim:cmd_timeout": CMD_TIMEOUT_S,
+        }
+        self.x = self.y = self.yaw = 0.0
+        self.vx = self.vy = self.wz = 0.0
+        self.command = (0.0, 0.0, 0.0)
+        self.command_time = 0.0
+        self.gait_phase = 0.0
+        self.last_step = time.monotonic()
+
+    def set_command(self, msg: dict):
+        """Apply a Twist or TwistStamped message."""
+        twist = msg.get("twist", msg)
+        linear, angular = twist.get("linear", {}), twist.get("angular", {})
+        self.command = (float(linear.get("x", 0.0)), float(linear.get("y", 0.0)), float(angular.get("z", 0.0)))
+        self.command_time = time.monotonic()
+
+    def step(self):
+        now = time.monotonic()
+        dt, self.last_step = now - self.last_step, now
+        max_linear = float(self.params["/puppy_sim:max_linear_speed"])
+        max_angular = float(self.params["/puppy_sim:max_angular_speed"])
+        fresh = now - self.command_time < float(self.params["/puppy_sim:cmd_timeout"])
+        vx, vy, wz = self.command if fresh else (0.0, 0.0, 0.0)
+        self.vx = max(-max_linear, min(max_linear, vx))
+        self.vy = max(-max_linear, min(max_linear, vy))
+        self.wz = max(-max_angular, min(max_angular, wz))
+
+        self.yaw = math.atan2(math.sin(self.yaw + self.wz * dt), math.cos(self.yaw + self.wz * dt))
+        self.x += (self.vx * math.cos(self.yaw) - self.vy * math.sin(self.yaw)) * dt
+        self.y += (self.vx * math.sin(self.yaw) + self.vy * math.cos(self.yaw)) * dt
+        if self.moving:
+            self.gait_phase = (self.gait_phase + 2.0 * math.pi * GAIT_FREQUENCY_HZ * dt) % (2.0 * math.pi)
+
+    @property
+    def moving(self) -> bool:
+        return abs(self.vx) + abs(self.vy) + abs(self.wz) > 1e-3
+
+    def odometry(self, t: float) -> dict:
+        covariance = [0.0] * 36
+        return {
+            "header": {"stamp": stamp(t), "frame_id": "odom"},
+            "child_frame_id": "base_link",
+            "pose": {
+                "pose": {"position": {"x": self.x, "y": self.y, "z": 0.0}, "orientation": yaw_to_quaternion(self.yaw)},
+                "covariance": covariance,
+            },
+            "twist": {
+                "twist": {
+                    "linear": {"x": self.vx, "y": self.vy, "z": 0.0},
+                    "angular": {"x": 0.0, "y": 0.0, "z": self.wz},
+                },
+                "covariance": covariance,
+            },
+        }
+
+    def transforms(self, t: float) -> dict:
+        return {
+            "transforms": [
+                {
+                    "header": {"stamp": stamp(t), "frame_id": "odom"},
+                    "child_frame_id": "base_link",
+                    "transform": {
+                        "translation": {"x": self.x, "y": self.y, "z": 0.0},
+                        "rotation": yaw_to_quaternion(self.yaw),
+                    },
+                }
+            ]
+        }
+
+    def joint_states(self, t: float) -> dict:
+        position, velocity = [], []
+        amplitude = 0.25 if self.moving else 0.0
+        omega = 2.0 * math.pi * GAIT_FREQUENCY_HZ
+        for name in JOINTS:
+            leg, joint = name.split("_", 1)
+            index = ("hip_joint", "upper_leg_joint", "lower_leg_joint").index(joint)
+            phase = self.gait_phase + LEG_PHASES[leg]
+            swing = amplitude * (0.2, 1.0, 0.8)[index]
+            position.append(STANDING_POSE[index] + swing * math.sin(phase))
+            velocity.append(swing * omega * math.cos(phase))
+        return {
+            "header": {"stamp": stamp(t), "frame_id": ""},
+            "name": JOINTS,
+            "position": position,
+            "velocity": velocity,
+            "effort": [0.0] * len(JOINTS),
+        }
+
+
+class ImageSource:
+    """
+    Synthetic camera: diagonal stripes scrolling by a few pixels per frame.
+
+    Frames are slices of a pattern twice their size, so producing one costs a single copy.
+    """
+
+    def __init__(self, width: int, height: int, encoding: str, frame_id: str):
+        self.width, self.height, self.encoding, self.frame_id = width, height, encoding, frame_id
+        channels, self.item_size = {"rgb8": (3, 1), "16UC1": (1, 2)}[encoding]
+        self.step = width * channels * self.item_size
+        self.frame_bytes = self.step * height
+        self.count = 0
+        if encoding == "rgb8":
+            row = bytes(v for x in range(width) for v in ((x * 2) % 256, (x * 5) % 256, 128))
+        else:  # depth in millimeters: a ramp from 0.5 to 4.5 m, with invalid (0) pixels every 10 columns
+            row = b"".join(struct.pack("<H", 0 if x % 10 == 0 else 500 + 4000 * x // width) for x in range(width))
+        # Each row is the previous one shifted by a pixel
+        pixel = channels * self.item_size
+        rows = (row[(y * pixel) % len(row) :] + row[: (y * pixel) % len(row)] for y in range(height))
+        self.pattern = b"".join(rows) * 2
+
+    def image(self, t: float) -> dict:
+        shift = (self.count * 4 * self.step // self.width) % self.frame_bytes  # 4 pixels per frame
+        self.count += 1
+        return {
+            "header": {"stamp": stamp(t), "frame_id": self.frame_id},
+            "height": self.height,
+            "width": self.width,
+            "encoding": self.encoding,
+            "is_bigendian": 0,
+            "step": self.step,
+            "data": self.pattern[shift : shift + self.frame_bytes],
+        }
+
+
+class Frame:
+    """A `publish` message, encoded on first use in each format and shared by all the subscribers."""
+
+    def __init__(self, topic: str, msg: dict):
+        self.topic, self.msg = topic, msg
+        self.encoded: Dict[str, object] = {}
+
+    def get(self, compression: str):
+        if compression not in self.encoded:
+            message = {"op": "publish", "topic": self.topic, "msg": self.msg}
+            if compression == "cbor":
+                self.encoded[compression] = cbor_dumps(message)
+            else:
+                self.encoded[compression] = json.dumps(message, default=lambda b: base64.b64encode(b).decode("ascii"))
+        return self.encoded[compression]
+
+
+class Subscription:
+    def __init__(self, msg_type: str, throttle_rate_ms: int, compression: str):
+        self.msg_type = msg_type
+        self.throttle_s = throttle_rate_ms / 1000.0
+        self.compression = "cbor" if compression in ("cbor", "cbor-raw") else "json"
+
+
+class Client:
+    """A rosbridge client: its subscriptions and a bounded queue of outgoing frames."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        # Topic -> subscription id -> subscription; a client may subscribe to a topic several times
+        self.subscriptions: Dict[str, Dict[Optional[str], Subscription]] = {}
+        self.last_sent: Dict[str, float] = {}
+        self.queue: asyncio.Queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        self.dropped = 0
+
+    def enqueue(self, data):
+        if self.queue.full():
+            self.queue.get_nowait()  # oldest message first
+            self.dropped += 1
+        self.queue.put_nowait(data)
+
+    def offer(self, frame: Frame, now: float):
+        subscriptions = self.subscriptions.get(frame.topic)
+        if not subscriptions:
+            return
+        # Like rosbridge, a message is sent once for all the subscriptions of the client to its topic: at the
+        # smallest throttle rate, with the compression of the latest subscription
+        throttle_s = min(subscription.throttle_s for subscription in subscriptions.values())
+        if now - self.last_sent.get(frame.topic, 0.0) < throttle_s:
+            return
+        self.last_sent[frame.topic] = now
+        latest = next(reversed(subscriptions.values()))
+        self.enqueue(frame.get(latest.compression))
+
+    def unsubscribe(self, topic: str, subscription_id: Optional[str]):
+        """Drop the subscription with this id, or every subscription to the topic if there is no id."""
+        subscriptions = self.subscriptions.get(topic, {})
+        if subscription_id is None:
+            subscriptions.clear()
+        else:
+            subscriptions.pop(subscription_id, None)
+        if not subscriptions:
+            self.subscriptions.pop(topic, None)
+
+    async def write_loop(self):
+        while True:
+            await self.ws.send(await self.queue.get())
+
+
+class RosbridgeSim:
+    def __init__(self, model: PuppyModel, cameras: Dict[str, ImageSource]):
+        self.model = model
+        self.cameras = cameras
+        self.clients: Set[Client] = set()
+        self.topics = {
+            "/cmd_vel": "geometry_msgs/msg/Twist",
+            "/odom": "nav_msgs/msg/Odometry",
+            "/tf": "tf2_msgs/msg/TFMessage",
+            "/joint_states": "sensor_msgs/msg/JointState",
+            **{topic: "sensor_msgs/msg/Image" for topic in cameras},
+        }
+        self.services: Dict[str, Callable[[dict], Tuple[bool, dict]]] = {
+            "/rosapi/topics": lambda args: (True, {"topics": list(self.topics), "types": list(self.topics.values())}),
+            "/rosapi/topic_type": self._topic_type,
+            "/rosapi/message_details": self._message_details,
+            "/rosapi/get_time": lambda args: (True, {"time": stamp(time.time())}),
+            "/rosapi/nodes": lambda args: (True, {"nodes": ["/puppy_sim", "/rosapi", "/rosbridge_websocket"]}),
+            "/rosapi/services": lambda args: (True, {"services": list(self.services)}),
+            "/rosapi/get_param_names": lambda args: (True, {"names": list(self.model.params)}),
+            "/rosapi/get_param": self._get_param,
+            "/rosapi/set_param": self._set_param,
+        }
+
+    # rosapi services: (success, values)
+
+    def _topic_type(self, args: dict) -> Tuple[bool, dict]:
+        return True, {"type": self.topics.get(args.get("topic", ""), "")}
+
+    def _message_details(self, args: dict) -> Tuple[bool, dict]:
+        definitions = typedefs(args.get("type", ""))
+        if not definitions:
+            return False, {"message": f"Unknown message type {args.get('type')}"}
+        return True, {"typedefs": definitions}
+
+    def _get_param(self, args: dict) -> Tuple[bool, dict]:
+        name = args.get("name", "")
+        if name in self.model.params:
+            return True, {"value": json.dumps(self.model.params[name])}
+        return True, {"value": args.get("default_value", args.get("default", ""))}
+
+    def _set_param(self, args: dict) -> Tuple[bool, dict]:
+        try:
+            self.model.params[args.get("name", "")] = json.loads(args.get("value", "null"))
+        except json.JSONDecodeError as e:
+            return False, {"message": f"Invalid parameter value: {e}"}
+        return True, {}
+
+    # Publishing
+
+    def broadcast(self, frame: Frame):
+        now = time.monotonic()
+        for client in list(self.clients):
+            client.offer(frame, now)
+
+    async def publish_loop(self, topic: str, rate_hz: float, make: Callable[[float], dict]):
+        if rate_hz <= 0:
+            return
+        period = 1.0 / rate_hz
+        next_tick = time.monotonic()
+        while True:
+            next_tick += period
+            await asyncio.sleep(max(next_tick - time.monotonic(), 0.0))
+            if any(topic in c.subscriptions for c in self.clients):
+                self.broadcast(Frame(topic, make(time.time())))
+
+    async def physics_loop(self, rate_hz: float):
+        while True:
+            self.model.step()
+            await asyncio.sleep(1.0 / rate_hz)
+
+    # Client messages
+
+    def status(self, client: Client, level: str, msg: str, op_id: Optional[str] = None):
+        status = {"op": "status", "level": level, "msg": msg}
+        if op_id is not None:
+            status["id"] = op_id
+        client.enqueue(json.dumps(status))
+
+    def handle(self, client: Client, raw):
+        try:
+            message = json.loads(raw)
+            op = message["op"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            self.status(client, "error", "Invalid rosbridge message")
+            return
+        op_id = message.get("id")
+        topic = message.get("topic", "")
+
+        if op == "subscribe":
+            msg_type = message.get("type") or self.topics.get(topic)
+            if msg_type is None:
+                error = f"Cannot infer topic type for topic {topic} as it is not yet advertised"
+                self.status(client, "error", error, op_id)
+                return
+            self.topics.setdefault(topic, msg_type)
+            subscriptions = client.subscriptions.setdefault(topic, {})
+            subscriptions.pop(op_id, None)  # a new subscription with the same id replaces it, as the latest
+            subscriptions[op_id] = Subscription(
+                msg_type, int(message.get("throttle_rate", 0)), message.get("compression", "none")
+            )
+        elif op == "unsubscribe":
+            client.unsubscribe(topic, op_id)
+        elif op == "advertise":
+            self.topics.setdefault(topic, message.get("type", ""))
+        elif op == "unadvertise":
+            pass
+        elif op == "publish":
+            msg = message.get("msg", {})
+            if topic == "/cmd_vel":
+                try:
+                    self.model.set_command(msg)
+                except (AttributeError, TypeError, ValueError) as e:
+                    self.status(client, "error", f"Invalid /cmd_vel message: {e}", op_id)
+                    return
+            self.broadcast(Frame(topic, msg))
+        elif op == "call_service":
+            service = message.get("service", "")
+            handler = self.services.get(service)
+            if handler is None:
+                result, values = False, {"message": f"Service {service} does not exist"}
+            else:
+                result, values = handler(message.get("args") or {})
+            response = {"op": "service_response", "service": service, "values": values, "result": result}
+            if op_id is not None:
+                response["id"] = op_id
+            client.enqueue(json.dumps(response))
+        else:
+            self.status(client, "error", f"Unsupported operation {op}", op_id)
+
+    async def serve_client(self, ws):
+        client = Client(ws)
+        self.clients.add(client)
+        writer = asyncio.create_task(client.write_loop())
+        try:
+            async for raw in ws:
+                self.handle(client, raw)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            writer.cancel()
+            self.clients.discard(client)
+
+    async def report_loop(self, period_s: float):
+        while True:
+            await asyncio.sleep(period_s)
+            subscriptions = sum(len(s) for c in self.clients for s in c.subscriptions.values())
+            dropped = sum(c.dropped for c in self.clients)
+            print(
+                f"[puppy-sim] {len(self.clients)} clients, {subscriptions} subscriptions, "
+                f"pose ({self.model.x:.2f}, {self.model.y:.2f}, {math.degrees(self.model.yaw):.0f}°), "
+                f"{dropped} messages dropped",
+                flush=True,
+            )
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height)
+
+
+async def main():
+    parser = ArgumentParser(description="Kinematic mini pupper simulation serving the rosbridge protocol.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="defaults to %(default)s")
+    parser.add_argument("--port", type=int, default=9090, help="defaults to %(default)s")
+    parser.add_argument(
+        "--odom-rate", type=float, default=50.0, help="/odom and /tf rate (Hz); defaults to %(default)s"
+    )
+    parser.add_argument(
+        "--joint-rate", type=float, default=50.0, help="/joint_states rate (Hz); defaults to %(default)s"
+    )
+    parser.add_argument("--camera-rate", type=float, default=15.0, help="/camera/image_raw rate (Hz), 0 to disable")
+    parser.add_argument("--camera-size", type=parse_size, default=(640, 480), help="WIDTHxHEIGHT; defaults to 640x480")
+    parser.add_argument("--depth-rate", type=float, default=0.0, help="/camera/depth/image_raw rate (Hz), 0 to disable")
+    parser.add_argument("--max-linear-speed", type=float, default=0.3, help="m/s; defaults to %(default)s")
+    parser.add_argument("--max-angular-speed", type=float, default=1.0, help="rad/s; defaults to %(default)s")
+    parser.add_argument("--report-period", type=float, default=10.0, help="Status line period (s), 0 to disable")
+    args = parser.parse_args()
+
+    width, height = args.camera_size
+    cameras = {}
+    if args.camera_rate > 0:
+        cameras["/camera/image_raw"] = ImageSource(width, height, "rgb8", "camera")
+    if args.depth_rate > 0:
+        cameras["/camera/depth/image_raw"] = ImageSource(width, height, "16UC1", "camera_depth")
+    model = PuppyModel(args.max_linear_speed, args.max_angular_speed)
+    sim = RosbridgeSim(model, cameras)
+
+    tasks = [
+        sim.physics_loop(max(args.odom_rate, 100.0)),
+        sim.publish_loop("/odom", args.odom_rate, model.odometry),
+        sim.publish_loop("/tf", args.odom_rate, model.transforms),
+        sim.publish_loop("/joint_states", args.joint_rate, model.joint_states),
+    ]
+    for topic, camera in cameras.items():
+        rate = args.depth_rate if camera.encoding == "16UC1" else args.camera_rate
+        tasks.append(sim.publish_loop(topic, rate, camera.image))
+    if args.report_period > 0:
+        tasks.append(sim.report_loop(args.report_period))
+
+    async with websockets.serve(sim.serve_client, args.host, args.port, max_size=None):
+        print(f"[puppy-sim] rosbridge protocol on ws://{args.host}:{args.port}", flush=True)
+        await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -3,6 +3,7 @@
 
 from .mcp_client import ChatSessionConfig
 from .puppy_voice_assistant import PuppyVoiceAssistant, VoiceConfig
+from .utils.http_pool import http_pool
 from .utils.llm_client import LLMClientConfig
 
 """
@@ -22,7 +23,20 @@ async def main(args):
 
     chat_config = ChatSessionConfig(
         mcp_server_config_file=args.mcp_server_config,
-        llm_client_config=LLMClientConfig(base_url=args.llm_base_url, model=args.llm_model, api_key=api_key),
+        llm_client_config=LLMClientConfig(
+            base_url=args.llm_base_url,
+            model=args.llm_model,
+            api_key=api_key,
+            stream=args.llm_stream,
+            http2=args.llm_http2,
+        ),
+        native_tools=not args.llm_prompt_tools,
+        tool_top_k=args.tool_top_k,
+        plan_cache_file=args.plan_cache,
+        command_grammar=args.command_grammar,
+        grammar_topic=args.grammar_topic,
+        grammar_msg_type=args.grammar_msg_type,
+        response_mode=args.response_mode,
     )
     voice_config = VoiceConfig(
         model=args.whisper_model,
@@ -31,5 +45,9 @@ async def main(args):
         block_duration=args.block_duration,
     )
     voice_assistant = PuppyVoiceAssistant(voice_config, chat_config, args.puppy_api_url)
-    await voice_assistant.set_up_mcp_client()
-    voice_assistant.start()
+    try:
+        await voice_assistant.set_up()
+        await voice_assistant.start()
+    finally:
+        await voice_assistant.chat_session.cleanup_servers()
+        await http_pool.aclose()
@@ -1,18 +1,29 @@
 import asyncio
+import functools
+import hashlib
 import json
 import logging
 import os
 import shutil
+import time
 from contextlib import AsyncExitStack
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
 
+import mcp.types as types
 from mcp.client.session import ClientSession
+from mcp.client.sse import sse_client
 from mcp.client.stdio import StdioServerParameters, stdio_client
+from mcp.client.streamable_http import streamablehttp_client
 
+from .utils.command_grammar import CommandGrammar
+from .utils.json_stream import JsonObjectScanner
 from .utils.llm_client import LLMClient, LLMClientConfig
+from .utils.plan_cache import CachedPlan, PlanCache
 from .utils.puppy_interaction import parse_action
+from .utils.timeline import Timeline
+from .utils.tool_retriever import ToolRetriever
 
 # Adapted from
 # https://github.com/modelcontextprotocol/python-sdk/blob/main/examples/clients/simple-chatbot/mcp_simple_chatbot/main.py
@@ -54,9 +65,57 @@ def __init__(self, name: str, config: dict[str, Any]) -> None:
         self.session: ClientSession | None = None
         self._cleanup_lock: asyncio.Lock = asyncio.Lock()
         self.exit_stack: AsyncExitStack = AsyncExitStack()
+        # Task holding the connection open, until `_closing` is set
+        self._connection: asyncio.Task | None = None
+        self._closing: asyncio.Event = asyncio.Event()
+        # Set when the server notifies that its tools changed, until they are listed again
+        self.tools_changed: bool = False
+
+    async def _handle_message(self, message: Any) -> None:
+        """Handle the messages of the server that are not responses to our requests.
+
+        Only the notification of a changed tool list is of interest; the tools are not listed from here, as this
+        runs in the task reading the responses.
+        """
+        # A ServerNotification wraps the notification in `root`
+        notification = getattr(message, "root", message)
+        if isinstance(notification, types.ToolListChangedNotification):
+            logger.info(f"Tools of server {self.name} changed")
+            self.tools_changed = True
 
     async def initialize(self) -> None:
-        """Initialize the server connection."""
+        """Initialize the server connection.
+
+        Servers configured with a `url` are already running (e.g. a shared `mcp_server_pupper` in
+        `streamable-http` mode) and are connected to over HTTP; the others are spawned over stdio.
+
+        The connection is opened, held and closed by a task of its own, as the transports must be closed by the task
+        that opened them: this way servers can be initialized concurrently and cleaned up from anywhere.
+        """
+        ready = asyncio.get_running_loop().create_future()
+        self._closing = asyncio.Event()
+        self._connection = asyncio.create_task(self._hold_connection(ready), name=f"mcp-server-{self.name}")
+        await ready
+
+    async def _hold_connection(self, ready: asyncio.Future) -> None:
+        try:
+            async with AsyncExitStack() as self.exit_stack:
+                if "url" in self.config:
+                    await self._initialize_http()
+                else:
+                    await self._initialize_stdio()
+                ready.set_result(None)
+                await self._closing.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.error(f"Connection to server {self.name} failed: {e}")
+        finally:
+            self.session = None
+            self.stdio_context = None
+
+    async def _initialize_stdio(self) -> None:
         command = shutil.which("npx") if self.config["command"] == "npx" else self.config["command"]
         if command is None:
             raise ValueError("The command must be a valid string and cannot be None.")
@@ -69,12 +128,29 @@ async def initialize(self) -> None:
         try:
             stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
             read, write = stdio_transport
-            session = await self.exit_stack.enter_async_context(ClientSession(read, write))
+            session = await self.exit_stack.enter_async_context(
+                ClientSession(read, write, message_handler=self._handle_message)
+            )
             await session.initialize()
             self.session = session
         except Exception as e:
             logger.error(f"Error initializing server {self.name}: {e}")
-            await self.cleanup()
+            raise
+
+    async def _initialize_http(self) -> None:
+        url = self.config["url"]
+        try:
+            if self.config.get("transport") == "sse":
+                read, write = await self.exit_stack.enter_async_context(sse_client(url))
+            else:
+                read, write, _ = await self.exit_stack.enter_async_context(streamablehttp_client(url))
+            session = await self.exit_stack.enter_async_context(
+                ClientSession(read, write, message_handler=self._handle_message)
+            )
+            await session.initialize()
+            self.session = session
+        except Exception as e:
+            logger.error(f"Error initializing server {self.name} at {url}: {e}")
             raise
 
     async def list_tools(self) -> list[Any]:
@@ -89,12 +165,22 @@ async def list_tools(self) -> list[Any]:
         if not self.session:
             raise RuntimeError(f"Server {self.name} not initialized")
 
+        self.tools_changed = False
         tools_response = await self.session.list_tools()
         tools = []
 
         for item in tools_response:
             if isinstance(item, tuple) and item[0] == "tools":
-                tools.extend(Tool(tool.name, tool.description, tool.inputSchema, tool.title) for tool in item[1])
+                tools.extend(
+                    Tool(
+                        tool.name,
+                        tool.description,
+                        tool.inputSchema,
+                        tool.title,
+                        read_only=bool(tool.annotations and tool.annotations.readOnlyHint),
+                    )
+                    for tool in item[1]
+                )
 
         return tools
 
@@ -144,12 +230,34 @@ async def execute_tool(
     async def cleanup(self) -> None:
         """Clean up server resources."""
         async with self._cleanup_lock:
+            if self._connection is None:
+                return
+            self._closing.set()
             try:
-                await self.exit_stack.aclose()
-                self.session = None
-                self.stdio_context = None
+                await self._connection
             except Exception as e:
                 logger.error(f"Error during cleanup of server {self.name}: {e}")
+            self._connection = None
+
+
+def _without_titles(schema: Any) -> Any:
+    """A copy of a JSON schema without the titles of its nodes, generated from the names of the arguments
+    (e.g. "Msg Type" for `msg_type`)."""
+    if isinstance(schema, list):
+        return [_without_titles(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    result = {}
+    for key, value in schema.items():
+        if key == "title" and isinstance(value, str):
+            continue
+        if key in ("default", "const", "enum", "examples"):
+            result[key] = value
+        elif key in ("properties", "$defs", "definitions") and isinstance(value, dict):
+            result[key] = {name: _without_titles(node) for name, node in value.items()}
+        else:
+            result[key] = _without_titles(value)
+    return result
 
 
 class Tool:
@@ -161,11 +269,51 @@ def __init__(
         description: str,
         input_schema: dict[str, Any],
         title: str | None = None,
+        read_only: bool = False,
     ) -> None:
         self.name: str = name
         self.title: str | None = title
         self.description: str = description
         self.input_schema: dict[str, Any] = input_schema
+        # Declared by the server with the `readOnlyHint` annotation: the tool does not act on the robot
+        self.read_only: bool = read_only
+
+    def search_text(self) -> str:
+        """Text to match against the requests: the name (counted twice), title, description and arguments."""
+        words = [self.name, self.name, self.title or "", self.description or ""]
+        for param_name, param_info in self.input_schema.get("properties", {}).items():
+            words += [param_name, param_info.get("description", "")]
+        return " ".join(words)
+
+    def format_for_openai(self, full: bool = True) -> Dict[str, Any]:
+        """Format the tool for the `tools` parameter of the chat completions API.
+
+        Args:
+            full: Whether to keep the whole description and the descriptions of the arguments; otherwise only the
+                first line of the description and the names and types of the arguments are kept, like
+                `format_summary_for_llm`.
+        """
+        description = self.description or ""
+        parameters = _without_titles(self.input_schema or {"type": "object", "properties": {}})
+        if not full:
+            description = description.strip().split("\n")[0]
+            parameters["properties"] = {
+                name: {key: value for key, value in info.items() if key != "description"}
+                for name, info in parameters.get("properties", {}).items()
+            }
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": description, "parameters": parameters},
+        }
+
+    def format_summary_for_llm(self) -> str:
+        """Format the tool in one line, for the tools not described in full.
+
+        Returns:
+            The name, the arguments and the first line of the description.
+        """
+        summary = (self.description or "").strip().split("\n")[0]
+        return f"- {self.name}({', '.join(self.input_schema.get('properties', {}))}): {summary}"
 
     def format_for_llm(self) -> str:
         """Format tool information for LLM.
@@ -196,10 +344,156 @@ def format_for_llm(self) -> str:
         return output
 
 
+class ToolCallDispatcher:
+    """Executes the tool calls of one LLM response as they are dispatched.
+
+    Calls acting on the same thing (see `actuator_key`) are executed one after the other, in the order they were
+    dispatched; the others are executed concurrently.
+    """
+
+    def __init__(self, session: "ChatSession") -> None:
+        self.session = session
+        self.start: float = time.perf_counter()
+        self.tasks: List[asyncio.Future] = []
+        # Actuator key -> task of the last call dispatched on it
+        self.lanes: Dict[str, asyncio.Task] = {}
+        # Calls dispatched, {"id": ..., "function": {"name": ..., "arguments": ...}} with the arguments decoded,
+        # then once `results` returned, the result of each and whether they all succeeded
+        self.calls: List[Dict[str, Any]] = []
+        self.outputs: List[str] = []
+        self.succeeded: bool = False
+
+    @staticmethod
+    def actuator_key(tool: Tool, tool_args: dict[str, Any]) -> Optional[str]:
+        """What a tool call acts on: its topic, or else the tool itself; None for read-only tools.
+
+        Calls with the same key must not be reordered nor overlap, e.g. two `publish_for_durations` on `/cmd_vel`
+        ("walk forward, then turn left").
+        """
+        if tool.read_only:
+            return None
+        topic = tool_args.get("topic") if isinstance(tool_args, dict) else None
+        return f"topic:{topic}" if isinstance(topic, str) and topic else f"tool:{tool.name}"
+
+    def dispatch(self, called_tool: dict[str, Any]) -> None:
+        """Start executing a tool call, {"id": ..., "function": {"name": ..., "arguments": ...}}, in the background.
+        Calls without an id are given one.
+
+        A malformed call (no function name, or arguments that are not a JSON object) is not executed: it is
+        reported as a failed call among the results, and the other calls are still executed.
+        """
+        call_id = called_tool.get("id") if isinstance(called_tool, dict) else None
+        if not isinstance(call_id, str) or not call_id:
+            call_id = f"call_{len(self.calls)}"
+        function = called_tool.get("function") if isinstance(called_tool, dict) else None
+        tool_name = function.get("name") if isinstance(function, dict) else None
+        if not isinstance(tool_name, str) or not tool_name:
+            self._fail(call_id, "", {}, f"Invalid tool call, without a function name: {called_tool}")
+            return
+        tool_args = function.get("arguments") or {}
+        if isinstance(tool_args, str):
+            try:
+                tool_args = json.loads(tool_args) if tool_args.strip() else {}
+            except json.JSONDecodeError as e:
+                self._fail(call_id, tool_name, tool_args, f"Invalid arguments for tool {tool_name} ({e}): {tool_args}")
+                return
+        if not isinstance(tool_args, dict):
+            self._fail(
+                call_id, tool_name, tool_args, f"Invalid arguments for tool {tool_name}, not an object: {tool_args}"
+            )
+            return
+
+        self.calls.append({"id": call_id, "function": {"name": tool_name, "arguments": tool_args}})
+        route = self.session.tool_index.get(tool_name)
+        key = self.actuator_key(route[1], tool_args) if route is not None else None
+        previous = self.lanes.get(key) if key is not None else None
+        task = asyncio.create_task(self._execute_after(previous, tool_name, tool_args))
+        if key is not None:
+            self.lanes[key] = task
+        self.tasks.append(task)
+
+    def _fail(self, call_id: str, tool_name: str, tool_args: Any, error: str) -> None:
+        logger.error(error)
+        self.calls.append({"id": call_id, "function": {"name": tool_name, "arguments": tool_args}})
+        failed = asyncio.get_running_loop().create_future()
+        failed.set_result((error, False))
+        self.tasks.append(failed)
+
+    async def _execute_after(
+        self, previous: Optional[asyncio.Task], tool_name: str, tool_args: dict[str, Any]
+    ) -> Tuple[str, bool]:
+        if previous is not None:
+            await asyncio.wait([previous])
+        return await self.session._execute_tool_call(tool_name, tool_args)
+
+    async def results(self) -> List[str]:
+        """Wait for every dispatched call.
+
+        Returns:
+            The result of each call, in the order they were dispatched.
+        """
+        outcomes = await asyncio.gather(*self.tasks)
+        logger.info(f"Executed {len(self.tasks)} tool call(s) in {time.perf_counter() - self.start:.2f} s")
+        self.succeeded = all(ok for _, ok in outcomes)
+        self.outputs = [result for result, _ in outcomes]
+        return self.outputs
+
+    def observes(self) -> bool:
+        """Whether a read-only tool was called, whose result the reply to the user depends on."""
+        for call in self.calls:
+            route = self.session.tool_index.get(call["function"]["name"])
+            if route is not None and route[1].read_only:
+                return True
+        return False
+
+
+def _result_data(result: Any) -> Any:
+    """What a tool returned: its structured content, or else the first JSON object of its text content."""
+    structured = getattr(result, "structuredContent", None)
+    if isinstance(structured, dict):
+        # Results that are not objects are wrapped in {"result": ...}
+        return structured.get("result", structured)
+    for content in getattr(result, "content", None) or []:
+        try:
+            data = json.loads(getattr(content, "text", None) or "null")
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def _result_is_error(result: Any) -> bool:
+    """Whether a tool result is an error: flagged as such, or an {"error": ...} object like the pupper tools return,
+    or an object with a non-empty "errors" (e.g. messages of `publish_for_durations` that failed)."""
+    if getattr(result, "isError", False):
+        return True
+    data = _result_data(result)
+    return isinstance(data, dict) and ("error" in data or bool(data.get("errors")))
+
+
 @dataclass
 class ChatSessionConfig:
     mcp_server_config_file: Path
     llm_client_config: LLMClientConfig
+    # Give the tools to the LLM through the `tools` parameter of the chat completions API (function calling);
+    # otherwise describe them in the system prompt, with the JSON format of the calls
+    native_tools: bool = True
+    # Describe in full only the tools most relevant to each request, and the others in one line each; all if None
+    tool_top_k: Optional[int] = None
+    # File keeping the tool calls planned for each command, to execute repeated commands without the LLM
+    plan_cache_file: Optional[Path] = None
+    # Execute the simple motion commands ("walk forward", "turn left", "stop") without the LLM
+    command_grammar: bool = False
+    # Velocity command topic of the command grammar, and its type; looked up with `get_topic_type` if None
+    grammar_topic: str = "/cmd_vel"
+    grammar_msg_type: Optional[str] = None
+    # Final reply phrased by the LLM from the tool results: "sync" waits for it, "async" generates it in the
+    # background once the tools completed, "none" skips it
+    response_mode: str = "sync"
+
+
+RESPONSE_MODES = ("none", "async", "sync")
 
 
 class ChatSession:
@@ -208,9 +502,11 @@ class ChatSession:
     The session lifecycle is:
 
     1. **Initialization** – receives a list of servers, an LLM client, and a PuppyFace visualizer.
-    2. **Server startup** – each server is initialized and its available tools are gathered.
+    2. **Server startup** – the servers are initialized and their available tools are gathered concurrently, while
+       the connection to the LLM is checked.
     3. **Main loop** – user input is collected, sent to the LLM, and the LLM's JSON tool call is parsed.
-    4. **Tool execution** – matching server executes the requested tool, progress is logged.
+    4. **Tool execution** – the servers providing the requested tools execute them, concurrently unless they act on
+       the same topic, progress is logged.
     5. **Response handling** – the tool's result is formatted back into a natural‑language reply and sent to the LLM for
        a final response.
     6. **Cleanup** – upon exit or error, all servers are gracefully shut down.
@@ -227,7 +523,27 @@ def __init__(self, config: ChatSessionConfig) -> None:
         with open(config.mcp_server_config_file) as f:
             self.server_config = json.load(f)
 
+        # Tool name -> server providing it and its description, so that tool calls are routed without listing
+        # the tools of every server
+        self.tool_index: Dict[str, Tuple[Server, Tool]] = {}
+
         self.llm_client_config = config.llm_client_config
+        self.native_tools = config.native_tools
+        # Tool name -> tool in the format of the `tools` parameter, in full and summarized, with `native_tools`
+        self.tool_schemas: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        self.tool_top_k = config.tool_top_k
+        self.tool_retriever: Optional[ToolRetriever] = None
+        self.plan_cache: Optional[PlanCache] = (
+            PlanCache(config.plan_cache_file) if config.plan_cache_file is not None else None
+        )
+        self.command_grammar: Optional[CommandGrammar] = (
+            CommandGrammar(config.grammar_topic, config.grammar_msg_type) if config.command_grammar else None
+        )
+        if config.response_mode not in RESPONSE_MODES:
+            raise ValueError(f"Unknown response mode {config.response_mode!r}, expected one of {RESPONSE_MODES}")
+        self.response_mode = config.response_mode
+        # Replies generated in the background with the "async" response mode
+        self.reply_tasks: Set[asyncio.Task] = set()
         self._init_servers()
         self._init_llm_client()
 
@@ -236,11 +552,14 @@ def _init_servers(self) -> bool:
         return True
 
     def _init_llm_client(self):
+        # The connection is checked by `set_up_mcp_client`, concurrently with the startup of the servers
         self.llm_client = LLMClient(self.llm_client_config)
-        return self.llm_client.test_connection()
 
     async def cleanup_servers(self) -> None:
         """Clean up all servers properly."""
+        for task in self.reply_tasks:
+            task.cancel()
+        await asyncio.gather(*self.reply_tasks, return_exceptions=True)
         for server in reversed(self.servers):
             try:
                 await server.cleanup()
@@ -250,79 +569,280 @@ async def cleanup_servers(self) -> None:
     async def process_llm_response(self, llm_response: str) -> str:
         """Process the LLM response and execute tools if needed.
 
+        All the tool calls of the response are executed, concurrently except for the calls acting on the same
+        thing (see `ToolCallDispatcher`), which are executed one after the other in the order of the response.
+
         Args:
             llm_response: The response from the LLM.
 
         Returns:
-            The result of tool execution or the original response.
-            If no tool is used, the output contains the original response.
+            The results of the tool executions, one line per call in the order of the response, or the original
+            response if no tool is used.
+        """
+        dispatcher = await self._dispatch_response(llm_response)
+        if dispatcher is None:
+            return llm_response
+        return "\n".join(await dispatcher.results())
+
+    async def _dispatch_response(self, llm_response: str) -> Optional[ToolCallDispatcher]:
+        """Start executing the tool calls of an LLM response.
+
+        Returns:
+            The dispatcher executing them, or None if no tool is used.
         """
         try:
             json_response = json.loads(llm_response)
-            if "tool_calls" in json_response and len(json_response["tool_calls"]) > 0:
-                for called_tool in json_response["tool_calls"]:
-                    tool_name = called_tool["function"]["name"]
-                    tool_args = called_tool["function"]["arguments"]
-                    logger.info(f"Executing tool: {tool_name}")
-                    logger.info(f"With arguments: {tool_args}")
-
-                    # Look for server with right tool:
-                    for server in self.servers:
-                        tools = await server.list_tools()
-                        if any(tool.name == tool_name for tool in tools):
-                            logger.debug("Found matching tool!")
-                            try:
-                                result = await server.execute_tool(tool_name, tool_args)
-                                logger.debug(f"Result from tool: {result}")
-
-                                if isinstance(result, dict) and "progress" in result:
-                                    progress = result["progress"]
-                                    total = result["total"]
-                                    percentage = (progress / total) * 100
-                                    logger.info(f"Progress: {progress}/{total} ({percentage:.1f}%)")
-
-                                return f"Tool execution result: {result}"
-                            except Exception as e:
-                                error_msg = f"Error executing tool: {str(e)}"
-                                logger.error(error_msg)
-                                return error_msg
-
-                    return f"No server found with tool: {tool_name}"
-            logger.info("LLM response did not use any tools")
-            return llm_response
         except json.JSONDecodeError:
-            return llm_response
+            return None
+        if not isinstance(json_response, dict):
+            return None
+
+        tool_calls = json_response.get("tool_calls")
+        if not tool_calls and not self.native_tools:
+            tool_calls = self._content_tool_calls(json_response.get("content"))
+        if not tool_calls:
+            logger.info("LLM response did not use any tools")
+            return None
+        if not isinstance(tool_calls, list):
+            # A lone call (anything else is reported as one malformed call)
+            tool_calls = [tool_calls]
+
+        await self._refresh_changed_tools()
+        dispatcher = ToolCallDispatcher(self)
+        for called_tool in tool_calls:
+            dispatcher.dispatch(called_tool)
+        return dispatcher
+
+    @staticmethod
+    def _content_tool_calls(content: Any) -> List[Dict[str, Any]]:
+        """Tool calls written in the content, as JSON objects with a "tool" key: the format asked by the system
+        prompt when the tools are not given to the LLM through the `tools` parameter."""
+        tool_calls = []
+        for text in JsonObjectScanner().feed(content if isinstance(content, str) else ""):
+            try:
+                obj = json.loads(text)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(obj, dict) and isinstance(obj.get("tool"), str):
+                tool_calls.append({"function": {"name": obj["tool"], "arguments": obj.get("arguments") or {}}})
+        return tool_calls
+
+    async def _stream_and_execute(
+        self, messages: List[Dict[str, str]], tools: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[str, str, Optional[ToolCallDispatcher]]:
+        """Stream the response of the LLM, executing each tool call as soon as it is complete.
+
+        Returns:
+            The response of the LLM; the results of the tool executions or the response itself if no tool is
+            used, as `process_llm_response`; and the dispatcher that executed them, if any.
+        """
+        await self._refresh_changed_tools()
+
+        dispatcher = ToolCallDispatcher(self)
+        llm_response, stats = await self.llm_client.stream_response(
+            messages, dispatcher.dispatch, tools, content_tools=not self.native_tools
+        )
+
+        def seconds(value: Optional[float]) -> str:
+            return "-" if value is None else f"{value:.2f} s"
+
+        logger.info(
+            f"LLM response: first token {seconds(stats.first_token_s)}, "
+            f"first action {seconds(stats.first_tool_call_s)}, complete {seconds(stats.total_s)} "
+            f"({stats.tool_calls} tool call(s))"
+        )
+        if not dispatcher.tasks:
+            logger.info("LLM response did not use any tools")
+            return llm_response, llm_response, None
+        return llm_response, "\n".join(await dispatcher.results()), dispatcher
+
+    async def _refresh_changed_tools(self) -> None:
+        if any(server.tools_changed for server in self.servers):
+            try:
+                await self.refresh_tools()
+            except Exception as e:
+                logger.warning(f"Could not refresh the tools, keeping the previous ones: {e}")
+
+    async def _execute_tool_call(self, tool_name: str, tool_args: dict[str, Any]) -> Tuple[str, bool]:
+        """Execute a tool call on the server providing the tool.
+
+        Returns:
+            The result of the call, its duration and the tool name, or the error; and whether the call succeeded.
+        """
+        logger.info(f"Executing tool: {tool_name}")
+        logger.info(f"With arguments: {tool_args}")
+
+        route = self.tool_index.get(tool_name)
+        if route is None:
+            return f"No server found with tool: {tool_name}", False
+
+        server, _ = route
+        start = time.perf_counter()
+        try:
+            result = await server.execute_tool(tool_name, tool_args)
+            elapsed = time.perf_counter() - start
+            logger.debug(f"Result from tool {tool_name} in {elapsed:.2f} s: {result}")
+
+            if isinstance(result, dict) and "progress" in result:
+                progress = result["progress"]
+                total = result["total"]
+                percentage = (progress / total) * 100
+                logger.info(f"Progress: {progress}/{total} ({percentage:.1f}%)")
 
-    async def set_up_mcp_client(self):
+            return f"Tool execution result of {tool_name} ({elapsed:.2f} s): {result}", not _result_is_error(result)
+        except Exception as e:
+            error_msg = f"Error executing tool {tool_name} ({time.perf_counter() - start:.2f} s): {str(e)}"
+            logger.error(error_msg)
+            return error_msg, False
+
+    async def set_up_mcp_client(self, timeline: Optional[Timeline] = None):
         """
         Initialization step.
         It is used to fetch all the tools information and add it to the system prompt (`self.system_message`).
+
+        Every server is initialized and its tools listed concurrently, while the connection to the LLM is checked.
+
+        Args:
+            timeline: Records the duration of each step; if None, a timeline of its own is logged at the end
         """
+        own_timeline = timeline is None
+        if timeline is None:
+            timeline = Timeline()
+
         try:
-            for server in self.servers:
-                try:
-                    await server.initialize()
-                except Exception as e:
-                    logger.error(f"Failed to initialize server: {e}")
-                    await self.cleanup_servers()
-                    return
-
-            all_tools = []
-            for server in self.servers:
-                tools = await server.list_tools()
-                all_tools.extend(tools)
-
-            tools_description = "\n".join([tool.format_for_llm() for tool in all_tools])
-
-            self.system_message = (
-                "You are an assistant that is used to translate natural language commands coming from the user"
-                "into calls to specific Tools that are used to control a dog-like robot running ROS2.\n"
-                "Pay attention to what the user says, as his commands come from voice recordings that are translated"
-                "to text.\n"
-                "The user is controlling you as if it was talking to a dog, so expect messages of the type: "
-                "'Walk forward', or 'Come here'.\n"
-                "The user will not give you very detailed description, so you have to assume how a dog would respond "
-                "to the voice commands.\n"
+            _, *listings = await asyncio.gather(
+                self._check_llm_connection(timeline),
+                *(self._start_server(server, timeline) for server in self.servers),
+                return_exceptions=True,
+            )
+            failures = [(server, e) for server, e in zip(self.servers, listings) if isinstance(e, BaseException)]
+            if failures:
+                for server, e in failures:
+                    logger.error(f"Failed to initialize server {server.name}: {e}")
+                await self.cleanup_servers()
+                return
+
+            self._build_tool_index(listings)
+            if self.command_grammar is not None and self.command_grammar.msg_type is None:
+                with timeline.phase("look up the type of the command grammar topic"):
+                    await self._resolve_grammar_msg_type()
+
+        except Exception as e:
+            # Handle exception
+            logger.error(e)
+        finally:
+            if own_timeline:
+                timeline.log(logger, "MCP client setup")
+
+    async def _check_llm_connection(self, timeline: Timeline) -> None:
+        with timeline.phase("check LLM connection"):
+            try:
+                await self.llm_client.check_connection()
+            except Exception as e:
+                logger.error(f"Error checking the LLM connection: {e}")
+
+    @staticmethod
+    async def _start_server(server: Server, timeline: Timeline) -> List[Tool]:
+        with timeline.phase(f"start server {server.name}"):
+            await server.initialize()
+        with timeline.phase(f"list tools of {server.name}"):
+            return await server.list_tools()
+
+    async def refresh_tools(self) -> None:
+        """List the tools of every server again, e.g. when a server notifies that its tools changed."""
+        self._build_tool_index(await asyncio.gather(*(server.list_tools() for server in self.servers)))
+
+    def _build_tool_index(self, listings: List[List[Tool]]) -> None:
+        """Build the tool index and the system prompt from the tools of every server, in the order of `self.servers`.
+
+        When two servers provide a tool with the same name, the first one in the configuration gets the calls.
+        """
+        tool_index: Dict[str, Tuple[Server, Tool]] = {}
+        for server, tools in zip(self.servers, listings):
+            for tool in tools:
+                if tool.name in tool_index:
+                    logger.warning(
+                        f"Tool {tool.name} of server {server.name} hidden by server {tool_index[tool.name][0].name}"
+                    )
+                    continue
+                tool_index[tool.name] = (server, tool)
+        self.tool_index = tool_index
+        logger.debug(f"Tool index: {', '.join(tool_index)}")
+
+        if self.native_tools:
+            # Converted once per tool listing
+            self.tool_schemas = {
+                name: (tool.format_for_openai(), tool.format_for_openai(full=False))
+                for name, (_, tool) in tool_index.items()
+            }
+            self.system_message = self._build_system_message(None)
+        else:
+            self.system_message = self._build_system_message([tool for _, tool in tool_index.values()])
+        self.tool_retriever = ToolRetriever({name: tool.search_text() for name, (_, tool) in tool_index.items()})
+        if self.plan_cache is not None:
+            catalog = json.dumps([(name, tool.input_schema) for name, (_, tool) in tool_index.items()], sort_keys=True)
+            self.plan_cache.set_catalog(hashlib.sha256(catalog.encode()).hexdigest())
+
+    def _selects_tools(self) -> bool:
+        return (
+            self.tool_top_k is not None and self.tool_retriever is not None and self.tool_top_k < len(self.tool_index)
+        )
+
+    def system_message_for(self, user_input: str) -> str:
+        """The system prompt for a request: with `tool_top_k`, only the tools most relevant to the request are
+        described in full, the others in one line each. With `native_tools`, the prompt does not describe the
+        tools, see `tools_for`."""
+        if self.native_tools or not self._selects_tools():
+            return self.system_message
+
+        selected = set(self.tool_retriever.top(user_input, self.tool_top_k))
+        tools = [tool for _, tool in self.tool_index.values()]
+        message = self._build_system_message(
+            [tool for tool in tools if tool.name in selected], [tool for tool in tools if tool.name not in selected]
+        )
+        logger.info(
+            f"System prompt: {len(message)} chars (~{len(message) // 4} tokens) describing "
+            f"{', '.join(sorted(selected)) or 'no tool'}, instead of {len(self.system_message)} chars for all "
+            f"{len(tools)} tools"
+        )
+        return message
+
+    def tools_for(self, user_input: str) -> Optional[List[Dict[str, Any]]]:
+        """The `tools` parameter for a request with `native_tools`, None otherwise: with `tool_top_k`, only the
+        tools most relevant to the request are given in full, the others summarized."""
+        if not self.native_tools:
+            return None
+        if not self._selects_tools():
+            return [full for full, _ in self.tool_schemas.values()]
+
+        selected = set(self.tool_retriever.top(user_input, self.tool_top_k))
+        tools = [full if name in selected else summary for name, (full, summary) in self.tool_schemas.items()]
+        logger.info(
+            f"Tools: {len(json.dumps(tools))} chars describing {', '.join(sorted(selected)) or 'no tool'} in full, "
+            f"instead of {len(json.dumps([full for full, _ in self.tool_schemas.values()]))} chars for all "
+            f"{len(tools)} tools"
+        )
+        return tools
+
+    @staticmethod
+    def _build_system_message(tools: Optional[List[Tool]], other_tools: Sequence[Tool] = ()) -> str:
+        """The system prompt describing `tools` and how to call them, or only asking to call tools if `tools` is
+        None, when they are given through the `tools` parameter."""
+        if tools is None:
+            tools_instructions = (
+                "IMPORTANT: you MUST call a tool every time the user sends a command. "
+                "If no tool is needed, reply directly.\n\n"
+            )
+            tools_reference = "the tools you are given"
+        else:
+            tools_description = "\n".join([tool.format_for_llm() for tool in tools])
+            if other_tools:
+                tools_description += (
+                    "\nThese tools are also available; call them the same way if none of the tools above fits:\n"
+                    + "\n".join(tool.format_summary_for_llm() for tool in other_tools)
+                    + "\n"
+                )
+            tools_instructions = (
                 "You have access to these tools:\n\n"
                 f"{tools_description}\n"
                 "Choose the appropriate tool based on the user's question. "
@@ -336,18 +856,27 @@ async def set_up_mcp_client(self):
                 '        "argument-name": "value"\n'
                 "    }\n"
                 "}\n\n"
-                "After receiving a tool's response:\n"
-                "1. Transform the raw data into a natural, conversational response\n"
-                "2. Keep responses concise but informative\n"
-                "3. Focus on the most relevant information\n"
-                "4. Use appropriate context from the user's question\n"
-                "5. Avoid simply repeating the raw data\n\n"
-                "Please use ONLY the tools that are explicitly defined above.\n"
             )
-
-        except Exception as e:
-            # Handle exception
-            logger.error(e)
+            tools_reference = "the tools that are explicitly defined above"
+
+        return (
+            "You are an assistant that is used to translate natural language commands coming from the user"
+            "into calls to specific Tools that are used to control a dog-like robot running ROS2.\n"
+            "Pay attention to what the user says, as his commands come from voice recordings that are translated"
+            "to text.\n"
+            "The user is controlling you as if it was talking to a dog, so expect messages of the type: "
+            "'Walk forward', or 'Come here'.\n"
+            "The user will not give you very detailed description, so you have to assume how a dog would respond "
+            "to the voice commands.\n"
+            f"{tools_instructions}"
+            "After receiving a tool's response:\n"
+            "1. Transform the raw data into a natural, conversational response\n"
+            "2. Keep responses concise but informative\n"
+            "3. Focus on the most relevant information\n"
+            "4. Use appropriate context from the user's question\n"
+            "5. Avoid simply repeating the raw data\n\n"
+            f"Please use ONLY {tools_reference}.\n"
+        )
 
     async def process_user_request(self, user_input, url: Optional[str] = None) -> str:
         """Handle a single user request.
@@ -358,25 +887,46 @@ async def process_user_request(self, user_input, url: Optional[str] = None) -> s
         any tool calls, and returns the final assistant reply.
 
         Returns:
-            str: The assistant's final response.
+            str: The assistant's final response; "" if the tools were called and the response mode does not wait
+            for it ("none" or "async"), so that the caller can move on as soon as the tools completed.
         """
         if not self.system_message:
             logger.error("System message not set. Call set_up_mcp_client first.")
             return ""
 
-        # Initialise the message list with the system prompt.
-        messages = [{"role": "system", "content": self.system_message}]
-
         logger.debug(f"USER MESSAGE TO LLM: {user_input}")
 
         if not user_input:
             return ""
 
+        if self.command_grammar is not None:
+            reply = await self._run_grammar_command(user_input, url)
+            if reply is not None:
+                return reply
+
+        if self.plan_cache is not None:
+            # Plans made for other tools are dropped before looking the command up
+            await self._refresh_changed_tools()
+            plan = self.plan_cache.lookup(user_input)
+            if plan is not None:
+                return await self._replay_plan(user_input, plan, url)
+
+        # Initialise the message list with the system prompt.
+        messages = [{"role": "system", "content": self.system_message_for(user_input)}]
+
         messages.append({"role": "user", "content": user_input})
+        tools = self.tools_for(user_input)
 
         try:
-            # Send the current conversation to the LLM.
-            llm_response = await self.llm_client.get_response(messages)
+            # Send the current conversation to the LLM. When streaming, the tools are
+            # executed while the response is generated.
+            if self.llm_client.stream:
+                llm_response, result, dispatcher = await self._stream_and_execute(messages, tools)
+            else:
+                start = time.perf_counter()
+                llm_response = await self.llm_client.get_response(messages, tools)
+                logger.info(f"LLM response in {time.perf_counter() - start:.2f} s")
+                result, dispatcher = None, None
         except Exception as exc:
             logger.error(f"Error contacting LLM: {exc}")
             return ""
@@ -386,24 +936,202 @@ async def process_user_request(self, user_input, url: Optional[str] = None) -> s
         # Process the LLM's response.  If a tool was invoked, the result will
         # be a new system message that prompts the LLM to produce a final
         # conversational reply.
-        result = await self.process_llm_response(llm_response)
+        if result is None:
+            dispatcher = await self._dispatch_response(llm_response)
+            result = "\n".join(await dispatcher.results()) if dispatcher is not None else llm_response
 
         if url is not None:
             await parse_action(url, "state:wink")
 
-        if result != llm_response:
-            # The tool call produced a result; we need a second round of LLM
-            # inference to turn that into a natural response.
-            messages.append({"role": "assistant", "content": llm_response})
-            messages.append({"role": "system", "content": result})
+        if dispatcher is None:
+            return llm_response
+
+        # The tool call produced a result; we need a second round of LLM
+        # inference to turn that into a natural response.
+        store = None
+        if self.plan_cache is not None and dispatcher.succeeded:
+            plan = [{"function": call["function"]} for call in dispatcher.calls]
+            store = functools.partial(self.plan_cache.store, user_input, plan)
+        return await self._reply(messages, llm_response, result, dispatcher, store)
+
+    async def _resolve_grammar_msg_type(self) -> bool:
+        """Look up the type of the topic of the command grammar with `get_topic_type`.
+
+        Returns:
+            Whether the type is known.
+        """
+        grammar = self.command_grammar
+        route = self.tool_index.get("get_topic_type")
+        if route is None:
+            logger.warning("Command grammar: no server provides get_topic_type, set the message type of the topic")
+            return False
+        try:
+            data = _result_data(await route[0].execute_tool("get_topic_type", {"topic": grammar.topic}, retries=1))
+        except Exception as e:
+            data = {"error": str(e)}
+        if not isinstance(data, dict) or not data.get("type"):
+            logger.warning(f"Command grammar: type of {grammar.topic} unknown ({data}), asking the LLM meanwhile")
+            return False
+        grammar.msg_type = data["type"]
+        logger.info(f"Command grammar: publishing {grammar.msg_type} on {grammar.topic}")
+        return True
+
+    async def _run_grammar_command(self, user_input: str, url: Optional[str] = None) -> Optional[str]:
+        """Execute a command matched by the command grammar, without the LLM.
+
+        Returns:
+            The reply to the user, or None if no rule matches the command or its tools are not available.
+        """
+        start = time.perf_counter()
+        match = self.command_grammar.match(user_input)
+        if match is None:
+            return None
+        if self.command_grammar.msg_type is None:
+            # Not found at setup, e.g. the robot was not reachable yet
+            if not await self._resolve_grammar_msg_type():
+                return None
+            match = self.command_grammar.match(user_input)
+        missing = [
+            call["function"]["name"] for call in match.tool_calls if call["function"]["name"] not in self.tool_index
+        ]
+        if missing:
+            logger.warning(f"Command grammar: no server provides {', '.join(missing)}, asking the LLM")
+            return None
+
+        dispatcher = ToolCallDispatcher(self)
+        for called_tool in match.tool_calls:
+            dispatcher.dispatch(called_tool)
+        logger.info(
+            f"Command grammar: '{user_input}' read as '{match.rule}' ({match.confidence:.2f}), "
+            f"dispatched in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+        results = await dispatcher.results()
+
+        if url is not None:
+            await parse_action(url, "state:wink")
+        if not dispatcher.succeeded:
+            logger.error(f"Command grammar: '{user_input}' failed: {' '.join(results)}")
+            return "Sorry, I could not do that."
+        return match.reply
+
+    async def _replay_plan(self, user_input: str, plan: CachedPlan, url: Optional[str] = None) -> str:
+        """Execute the tool calls cached for a command instead of asking the LLM for them.
+
+        The cached reply is returned as it is if the tools only act; if one observes something (a read-only
+        tool), the LLM phrases the reply from the new results, which costs one LLM round instead of two. A plan
+        that fails is dropped from the cache, and the user is told it failed.
+        """
+        logger.info(f"Replaying the cached plan of '{plan.command}' ({len(plan.tool_calls)} tool call(s))")
+        dispatcher = ToolCallDispatcher(self)
+        for called_tool in plan.tool_calls:
+            dispatcher.dispatch(called_tool)
+        result = "\n".join(await dispatcher.results())
+
+        if url is not None:
+            await parse_action(url, "state:wink")
+
+        if not dispatcher.succeeded:
+            logger.error(f"Cached plan of '{plan.command}' failed: {result}")
+            self.plan_cache.forget(plan)
+            return "Sorry, I could not do that."
+        if plan.reply and not dispatcher.observes():
+            return plan.reply
+
+        messages = [
+            {"role": "system", "content": self.system_message_for(user_input)},
+            {"role": "user", "content": user_input},
+        ]
+        llm_response = json.dumps({"role": "assistant", "content": "", "tool_calls": plan.tool_calls})
+        return await self._reply(messages, llm_response, result, dispatcher)
+
+    async def _reply(
+        self,
+        messages: List[Dict[str, str]],
+        llm_response: str,
+        result: str,
+        dispatcher: ToolCallDispatcher,
+        store: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """Get the final reply from the tool results, according to the response mode.
+
+        Args:
+            store: Called with the reply phrased by the LLM (or "" with the "none" mode), e.g. to cache it
+
+        Returns:
+            The reply with the "sync" mode; "" with the others, which do not wait for the LLM.
+        """
+        if self.response_mode == "none":
+            if store is not None:
+                store("")
+            return ""
+        if self.response_mode == "async":
+            task = asyncio.create_task(self._reply_in_background(messages, llm_response, result, dispatcher, store))
+            self.reply_tasks.add(task)
+            task.add_done_callback(self.reply_tasks.discard)
+            return ""
+
+        reply, replied = await self._final_reply(messages, llm_response, result, dispatcher)
+        if replied and store is not None:
+            store(reply)
+        return reply
+
+    async def _reply_in_background(
+        self,
+        messages: List[Dict[str, str]],
+        llm_response: str,
+        result: str,
+        dispatcher: ToolCallDispatcher,
+        store: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        start = time.perf_counter()
+        reply, replied = await self._final_reply(messages, llm_response, result, dispatcher)
+        logger.info(f"Final response in {time.perf_counter() - start:.2f} s (background): {reply}")
+        if replied and store is not None:
+            store(reply)
+
+    async def _final_reply(
+        self, messages: List[Dict[str, Any]], llm_response: str, result: str, dispatcher: ToolCallDispatcher
+    ) -> Tuple[str, bool]:
+        """Ask the LLM to turn the results of the tool calls into a natural response.
+
+        With `native_tools`, the calls are sent back as the `tool_calls` of the assistant message, each followed by
+        a "tool" message with its result; otherwise the response and the results are sent back as text.
+
+        Returns:
+            The response, and whether it came from the LLM (rather than being an error message).
+        """
+        if self.native_tools:
             try:
-                final_response = await self.llm_client.get_response(messages)
-            except Exception as exc:
-                logger.error(f"Error contacting LLM for final response: {exc}")
-                return ""
-            return final_response["content"]
+                content = json.loads(llm_response).get("content") or ""
+            except (json.JSONDecodeError, AttributeError):
+                content = ""
+            tool_calls = []
+            for call in dispatcher.calls:
+                arguments = call["function"]["arguments"]
+                function = {
+                    "name": call["function"]["name"],
+                    "arguments": arguments if isinstance(arguments, str) else json.dumps(arguments),
+                }
+                tool_calls.append({"id": call["id"], "type": "function", "function": function})
+            messages.append({"role": "assistant", "content": content, "tool_calls": tool_calls})
+            for call, output in zip(dispatcher.calls, dispatcher.outputs):
+                messages.append({"role": "tool", "tool_call_id": call["id"], "content": output})
         else:
-            return llm_response
+            messages.append({"role": "assistant", "content": llm_response})
+            messages.append({"role": "system", "content": result})
+        try:
+            final_response = await self.llm_client.get_response(messages)
+        except Exception as exc:
+            logger.error(f"Error contacting LLM for final response: {exc}")
+            return "", False
+        try:
+            message = json.loads(final_response)
+        except json.JSONDecodeError:
+            # The error message of the LLM client
+            return final_response, False
+        if not isinstance(message, dict):
+            return final_response, False
+        return message.get("content") or "", True
 
     async def _start(self) -> None:
         """
@@ -10,7 +10,6 @@
 import importlib.metadata
 import logging
 import queue
-import time
 from dataclasses import dataclass, field
 from typing import Any, Callable, Dict, Optional
 
@@ -23,6 +22,7 @@
 from .mcp_client import ChatSession, ChatSessionConfig
 from .utils.math import similarity
 from .utils.puppy_interaction import parse_action
+from .utils.timeline import Timeline
 
 __version__ = importlib.metadata.version("pywhispercpp")
 
@@ -102,22 +102,38 @@ def __init__(
         self.q_threshold = voice_config.q_threshold
         self._silence_counter = 0
 
-        self.pwccp_model = Model(
-            voice_config.model,
-            print_realtime=False,
-            print_progress=False,
-            print_timestamps=False,
-            single_segment=True,
-            no_context=True,
-            **voice_config.model_params,
-        )
+        # Loaded by `set_up`, concurrently with the startup of the MCP servers
+        self.voice_config = voice_config
+        self.pwccp_model: Optional[Model] = None
         self.commands_callback = commands_callback
 
         self.wakeup_command = voice_config.wakeup_command
         self.waiting_cmd_prompt = True
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
 
-    async def set_up_mcp_client(self):
-        await self.chat_session.set_up_mcp_client()
+    async def set_up(self):
+        """
+        Load the Whisper model and set up the MCP client concurrently, then log how long each step took.
+        """
+        timeline = Timeline()
+        await asyncio.gather(
+            self._load_model(timeline),
+            self.chat_session.set_up_mcp_client(timeline),
+        )
+        timeline.log(logger, "Startup")
+
+    async def _load_model(self, timeline: Timeline):
+        with timeline.phase(f"load Whisper model {self.voice_config.model}"):
+            self.pwccp_model = await asyncio.to_thread(
+                Model,
+                self.voice_config.model,
+                print_realtime=False,
+                print_progress=False,
+                print_timestamps=False,
+                single_segment=True,
+                no_context=True,
+                **self.voice_config.model_params,
+            )
 
     def _audio_callback(self, indata, frames, time, status):
         """
@@ -142,7 +158,8 @@ def _audio_callback(self, indata, frames, time, status):
                     heard = self._transcribe_speech()
                     if len(heard) > 0:
                         logger.debug(f"USER COMMAND: {heard}")
-                        asyncio.run(self._process_heard_text(heard))
+                        # Processed by the loop of `start`, which holds the MCP sessions and the HTTP connections
+                        asyncio.run_coroutine_threadsafe(self._process_heard_text(heard), self.loop).result()
                     self._silence_counter = 0
             else:
                 self._silence_counter += 1
@@ -181,12 +198,13 @@ async def _process_heard_text(self, heard):
             await parse_action(self.puppy_api_url, "reset")
             self.waiting_cmd_prompt = True
 
-    def start(self) -> None:
+    async def start(self) -> None:
         """
-        Use this function to start the assistant
+        Use this function to start the assistant, from the event loop in which it was set up
         :return: None
         """
         logger.info(f"Starting Assistant ... Wakeup command: {self.wakeup_command}")
+        self.loop = asyncio.get_running_loop()
         with sd.InputStream(
             device=self.input_device,  # the default input device
             channels=self.channels,
@@ -197,8 +215,8 @@ def start(self) -> None:
             try:
                 logger.info("Assistant is listening ... (CTRL+C to stop)")
                 while True:
-                    time.sleep(0.1)
-            except KeyboardInterrupt:
+                    await asyncio.sleep(0.1)
+            except (KeyboardInterrupt, asyncio.CancelledError):
                 logger.info("Assistant stopped")
 
     @staticmethod
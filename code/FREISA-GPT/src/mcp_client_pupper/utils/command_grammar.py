@@ -0,0 +1,218 @@
+import logging
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .math import similarity
+
+logger = logging.getLogger(__name__)
+
+NUMBER_WORDS = {
+    "half": "0.5",
+    "one": "1",
+    "two": "2",
+    "three": "3",
+    "four": "4",
+    "five": "5",
+    "six": "6",
+    "seven": "7",
+    "eight": "8",
+    "nine": "9",
+    "ten": "10",
+    "fifteen": "15",
+    "twenty": "20",
+    "thirty": "30",
+    "forty": "40",
+    "forty-five": "45",
+    "sixty": "60",
+    "ninety": "90",
+}
+
+# Words that can surround a command without changing it ("Puppy, please walk forward now")
+FILLER_WORDS = frozenset("please puppy pupper now hey ok okay the can could would you just a little bit".split())
+
+_NUMBER = r"(?P<n>\d+(?:\.\d+)?)"
+_WALK = re.compile(
+    r"(?:walk|go|move|run|step) (?P<direction>forwards?|ahead|straight|backwards?|back|left|right)"
+    rf"(?: (?:for )?{_NUMBER} (?P<unit>seconds?|meters?|metres?))?"
+)
+_TURN = re.compile(
+    rf"(?P<verb>turn|rotate|spin)(?: (?P<direction>left|right|around))?(?: (?:by |for )?{_NUMBER} (?P<unit>degrees?|seconds?))?"
+)
+_STOP = re.compile(r"(?:stop|halt|freeze|stay)(?: moving| walking| there| here)?")
+
+DIRECTIONS = {
+    "forwards": "forward",
+    "ahead": "forward",
+    "straight": "forward",
+    "backwards": "backward",
+    "back": "backward",
+}
+
+# Words of the rules, to which the words of the transcript are corrected
+VOCABULARY = frozenset(
+    "walk go move run step forward forwards ahead straight backward backwards back left right for second seconds "
+    "meter meters metre metres turn rotate spin around by degree degrees stop halt freeze stay moving walking there "
+    "here".split()
+)
+
+
+@dataclass
+class GrammarMatch:
+    rule: str
+    # As dispatched: [{"function": {"name": ..., "arguments": {...}}}]
+    tool_calls: List[Dict[str, Any]]
+    reply: str
+    # Lowest similarity of a word of the transcript to the word of the rule it was read as, from 0 to 1 (exact)
+    confidence: float
+
+
+class CommandGrammar:
+    """
+    Rule-based interpretation of the simple motion commands ("walk forward for 3 seconds", "turn left",
+    "stop"), mapped directly to tool calls of the pupper MCP server without asking the LLM.
+
+    The transcript is lowercased, numbers written in words are turned into digits and filler words are dropped;
+    each remaining word is read as the closest word of the rules, if their similarity reaches `word_threshold`
+    (Whisper hears "forwards" or "turn lift"). The whole transcript must then match a rule: any other word, or
+    a second command ("walk forward and turn left"), leaves the command to the LLM.
+
+    Motions are published on `topic` for their duration, repeated every `period_s` since the robot stops when
+    it does not receive commands for half a second, then followed by a stop. The MCP server waits about
+    `status_wait_s` for an error from rosbridge after each message it publishes, which is taken out of the
+    delays so that motions last as long as asked.
+
+    Args:
+        topic (str): Velocity command topic
+        msg_type (Optional[str]): Its type, Twist or TwistStamped; the calls built while it is None cannot be
+            executed
+        linear_speed (float): Walking speed (m/s)
+        angular_speed (float): Turning speed (rad/s)
+        period_s (float): Interval between two velocity commands of a motion
+        status_wait_s (float): Time the MCP server waits after publishing each message
+        max_duration_s (float): Longer motions are left to the LLM
+        word_threshold (float): Minimum similarity of a word to a word of the rules, from 0 to 1 (identical)
+    """
+
+    def __init__(
+        self,
+        topic: str = "/cmd_vel",
+        msg_type: Optional[str] = None,
+        linear_speed: float = 0.2,
+        angular_speed: float = 0.8,
+        period_s: float = 0.25,
+        status_wait_s: float = 0.1,
+        max_duration_s: float = 30.0,
+        word_threshold: float = 0.75,
+    ):
+        self.topic = topic
+        self.msg_type = msg_type
+        self.linear_speed = linear_speed
+        self.angular_speed = angular_speed
+        self.period_s = period_s
+        self.status_wait_s = status_wait_s
+        self.max_duration_s = max_duration_s
+        self.word_threshold = word_threshold
+        self.rules: List[Tuple[str, re.Pattern, Callable[[re.Match], Optional[Tuple[List[Dict[str, Any]], str]]]]] = [
+            ("walk", _WALK, self._walk),
+            ("turn", _TURN, self._turn),
+            ("stop", _STOP, self._stop),
+        ]
+
+    def match(self, command: str) -> Optional[GrammarMatch]:
+        """The tool calls of a command, or None if no rule matches it as a whole."""
+        normalized = self.normalize(command)
+        if normalized is None:
+            return None
+        text, confidence = normalized
+        for name, pattern, plan in self.rules:
+            match = pattern.fullmatch(text)
+            if match is None:
+                continue
+            planned = plan(match)
+            if planned is None:
+                return None
+            tool_calls, reply = planned
+            return GrammarMatch(name, tool_calls, reply, confidence)
+        return None
+
+    def normalize(self, command: str) -> Optional[Tuple[str, float]]:
+        """The command in the words of the rules, and the lowest similarity of a corrected word; None if a word
+        is too far from all of them."""
+        words = []
+        confidence = 1.0
+        for word in re.findall(r"\d+(?:\.\d+)?|[a-z]+(?:-[a-z]+)?", command.lower()):
+            word = NUMBER_WORDS.get(word, word)
+            if word in FILLER_WORDS:
+                continue
+            if word[0].isdigit() or word in VOCABULARY:
+                words.append(word)
+                continue
+            score, closest = max((similarity(word, known), known) for known in VOCABULARY)
+            if score < self.word_threshold:
+                return None
+            words.append(closest)
+            confidence = min(confidence, score)
+        if not words:
+            return None
+        return " ".join(words), confidence
+
+    def _twist(self, x: float = 0.0, y: float = 0.0, z: float = 0.0) -> Dict[str, Any]:
+        twist = {"linear": {"x": x, "y": y, "z": 0.0}, "angular": {"x": 0.0, "y": 0.0, "z": z}}
+        return {"twist": twist} if (self.msg_type or "").endswith("TwistStamped") else twist
+
+    def _motion(self, twist: Dict[str, Any], duration_s: float) -> Optional[List[Dict[str, Any]]]:
+        if not 0 < duration_s <= self.max_duration_s:
+            return None
+        repeats = max(1, math.ceil(duration_s / self.period_s))
+        arguments = {
+            "topic": self.topic,
+            "msg_type": self.msg_type,
+            "messages": [twist] * repeats + [self._twist()],
+            "durations": [max(duration_s / repeats - self.status_wait_s, 0.0)] * repeats + [0],
+        }
+        return [{"function": {"name": "publish_for_durations", "arguments": arguments}}]
+
+    def _walk(self, match: re.Match) -> Optional[Tuple[List[Dict[str, Any]], str]]:
+        direction = DIRECTIONS.get(match["direction"], match["direction"])
+        x, y = {"forward": (1, 0), "backward": (-1, 0), "left": (0, 1), "right": (0, -1)}[direction]
+
+        amount = float(match["n"]) if match["n"] else None
+        if match["unit"] and match["unit"].startswith("met"):
+            duration_s = amount / self.linear_speed
+            how_long = f"{amount:g} meter{'s' if amount != 1 else ''}"
+        else:
+            duration_s = amount if amount is not None else 2.0
+            how_long = f"{duration_s:g} second{'s' if duration_s != 1 else ''}"
+
+        tool_calls = self._motion(self._twist(x * self.linear_speed, y * self.linear_speed), duration_s)
+        if tool_calls is None:
+            return None
+        return tool_calls, f"Walking {direction} for {how_long}!"
+
+    def _turn(self, match: re.Match) -> Optional[Tuple[List[Dict[str, Any]], str]]:
+        direction = match["direction"]
+        if direction is None and match["verb"] != "spin":
+            # "Turn" alone, or "turn 90 degrees": no way to tell the side
+            return None
+        sign = -1 if direction == "right" else 1
+
+        amount = float(match["n"]) if match["n"] else None
+        if match["unit"] and match["unit"].startswith("second"):
+            duration_s = amount
+            how_much = f"for {amount:g} second{'s' if amount != 1 else ''}"
+        else:
+            degrees = amount if amount is not None else {"around": 180.0, None: 360.0}.get(direction, 90.0)
+            duration_s = math.radians(degrees) / self.angular_speed
+            how_much = f"{degrees:g} degrees"
+
+        tool_calls = self._motion(self._twist(z=sign * self.angular_speed), duration_s)
+        if tool_calls is None:
+            return None
+        side = "right" if sign < 0 else "left"
+        return tool_calls, f"Turning {side} {how_much}!"
+
+    def _stop(self, match: re.Match) -> Optional[Tuple[List[Dict[str, Any]], str]]:
+        arguments = {"topic": self.topic, "msg_type": self.msg_type, "msg": self._twist()}
+        return [{"function": {"name": "publish_once", "arguments": arguments}}], "Stopping!"
@@ -0,0 +1,109 @@
+import asyncio
+import importlib.util
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Connections are kept open between requests, e.g. between two voice commands
+DEFAULT_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=10, keepalive_expiry=60.0)
+
+
+@dataclass
+class OriginStats:
+    requests: int = 0
+    connections: int = 0
+    tls_handshakes: int = 0
+
+    @property
+    def reused(self) -> int:
+        """Requests sent over a connection opened for a previous request."""
+        return max(self.requests - self.connections, 0)
+
+
+class HttpClientPool:
+    """Async HTTP clients shared by the whole process, one per origin (scheme, host and port), so that the TCP and
+    TLS connections are reused from one request to the next instead of being opened for every request.
+
+    Clients are bound to the event loop they were created in; a client requested from another loop is replaced.
+    Call `aclose` on shutdown.
+
+    Example usage
+    ```python
+    client = http_pool.client("https://openwebui.example.com/api/chat/completions")
+    response = await client.post(url, json=payload)
+    ```
+    """
+
+    def __init__(self, limits: httpx.Limits = DEFAULT_LIMITS) -> None:
+        self.limits = limits
+        self.clients: Dict[Tuple[str, bool], Tuple[httpx.AsyncClient, asyncio.AbstractEventLoop]] = {}
+        self.stats: Dict[str, OriginStats] = {}
+        self._warned_http2 = False
+
+    def client(self, url: str, http2: bool = False) -> httpx.AsyncClient:
+        """The client for the origin of `url`.
+
+        Args:
+            url: Any URL of the origin
+            http2: Negotiate HTTP/2 with the server (HTTPS only); requires the `h2` package (`httpx[http2]`)
+        """
+        if http2 and importlib.util.find_spec("h2") is None:
+            if not self._warned_http2:
+                logger.warning("HTTP/2 requested but the h2 package is not installed: using HTTP/1.1")
+                self._warned_http2 = True
+            http2 = False
+
+        origin = str(httpx.URL(url).copy_with(path="/", query=None, fragment=None)).rstrip("/")
+        loop = asyncio.get_running_loop()
+        entry = self.clients.get((origin, http2))
+        if entry is not None and entry[1] is loop and not entry[0].is_closed:
+            return entry[0]
+
+        stats = self.stats.setdefault(origin, OriginStats())
+
+        async def count_request(request: httpx.Request) -> None:
+            stats.requests += 1
+            request.extensions["trace"] = trace
+
+        async def trace(event: str, info: Dict[str, Any]) -> None:
+            if event == "connection.connect_tcp.complete":
+                stats.connections += 1
+            elif event == "connection.start_tls.complete":
+                stats.tls_handshakes += 1
+
+        client = httpx.AsyncClient(limits=self.limits, http2=http2, event_hooks={"request": [count_request]})
+        self.clients[(origin, http2)] = (client, loop)
+        return client
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        """Requests, connections opened, TLS handshakes and requests over a reused connection, per origin."""
+        return {
+            origin: {
+                "requests": stats.requests,
+                "connections": stats.connections,
+                "tls_handshakes": stats.tls_handshakes,
+                "reused": stats.reused,
+            }
+            for origin, stats in self.stats.items()
+        }
+
+    async def aclose(self) -> None:
+        """Close the clients of the running event loop, forget the others (their loop is gone) and log the metrics."""
+        loop = asyncio.get_running_loop()
+        for client, client_loop in self.clients.values():
+            if client_loop is loop:
+                await client.aclose()
+        self.clients.clear()
+        for origin, metrics in self.metrics().items():
+            logger.info(
+                f"HTTP {origin}: {metrics['requests']} request(s) over {metrics['connections']} connection(s), "
+                f"{metrics['reused']} reused"
+            )
+
+
+# Shared by the LLM client and the puppy API calls
+http_pool = HttpClientPool()
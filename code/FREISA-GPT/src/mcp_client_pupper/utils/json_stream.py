@@ -0,0 +1,72 @@
+import re
+from typing import List
+
+# Characters changing the state of the scanner; the others are copied as they are
+_SPECIAL = re.compile(r'[{}"\\]')
+
+
+class JsonObjectScanner:
+    """Finds the top-level JSON objects of a text received in pieces (e.g. streamed by an LLM), as soon as each one
+    closes.
+
+    Text outside of the objects is ignored, so objects can be surrounded by prose, separated by commas or wrapped in a
+    list. Braces within strings are not counted.
+
+    Example usage
+    ```python
+    scanner = JsonObjectScanner()
+    scanner.feed('[{"tool": "move", "argum')  # []
+    scanner.feed('ents": {"x": 1}}, {')  # ['{"tool": "move", "arguments": {"x": 1}}']
+    ```
+    """
+
+    def __init__(self) -> None:
+        self.depth: int = 0
+        self.in_string: bool = False
+        self.escape: bool = False
+        self.current: List[str] = []
+
+    def feed(self, text: str) -> List[str]:
+        """Scan the next piece of text.
+
+        Returns:
+            The objects closed by this piece, as JSON strings.
+        """
+        objects = []
+        copy_from = 0  # start of the text of the current object not yet in `self.current`
+        skip_to = 0  # characters before this one are escaped
+        if self.escape and text:
+            # The previous piece ended with a backslash within a string
+            self.escape = False
+            skip_to = 1
+        for match in _SPECIAL.finditer(text):
+            index = match.start()
+            if index < skip_to:
+                continue
+            char = match.group()
+            if self.depth == 0:
+                if char == "{":
+                    self.depth = 1
+                    copy_from = index
+                continue
+
+            if self.in_string:
+                if char == "\\":
+                    skip_to = index + 2
+                    self.escape = skip_to > len(text)
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.current.append(text[copy_from : index + 1])
+                    objects.append("".join(self.current))
+                    self.current = []
+
+        if self.depth > 0:
+            self.current.append(text[copy_from:])
+        return objects
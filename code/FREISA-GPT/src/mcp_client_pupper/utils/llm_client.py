@@ -1,10 +1,14 @@
 import json
 import logging
+import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import httpx
 
+from .http_pool import http_pool
+from .json_stream import JsonObjectScanner
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,6 +19,20 @@ class LLMClientConfig:
     api_key: Optional[str]
     chat_endpoint: str = "/api/chat/completions"
     models_endpoint: str = "/api/models"
+    # Stream the responses, so that tool calls are executed while the rest of the response is generated
+    stream: bool = False
+    # Negotiate HTTP/2 with the LLM provider (HTTPS only), see `HttpClientPool`
+    http2: bool = False
+
+
+@dataclass
+class StreamStats:
+    """Timing of a streamed response, in seconds from the request."""
+
+    first_token_s: Optional[float] = None
+    first_tool_call_s: Optional[float] = None
+    total_s: float = 0.0
+    tool_calls: int = 0
 
 
 class LLMClient:
@@ -26,6 +44,8 @@ def __init__(self, config: LLMClientConfig):
         self.chat_endpoint = config.chat_endpoint
         self.models_endpoint = config.models_endpoint
         self.api_key = config.api_key
+        self.stream = config.stream
+        self.http2 = config.http2
         self.headers = (
             {
                 "Content-Type": "application/json",
@@ -47,17 +67,35 @@ def test_connection(self) -> bool:
             logger.error(f"Error reaching LLM models endpoint: {str(e)}")
             return False
 
+        return self._has_model(response)
+
+    async def check_connection(self) -> bool:
+        """Same as `test_connection`, without blocking the event loop (e.g. while the MCP servers start)"""
+        url = f"{self.base_url}{self.models_endpoint}"
+        try:
+            client = http_pool.client(url, http2=self.http2)
+            response = await client.get(url, headers=self.headers, timeout=10.0)
+            response.raise_for_status()
+        except (httpx.RequestError, httpx.HTTPStatusError) as e:
+            logger.error(f"Error reaching LLM models endpoint: {str(e)}")
+            return False
+
+        return self._has_model(response)
+
+    def _has_model(self, response: httpx.Response) -> bool:
         if self.model not in [x for n in response.json()["data"] for x in [n["id"], n["name"]]]:
             logger.error(f"Requested model {self.model} not found!")
             return False
 
         return True
 
-    async def get_response(self, messages: list[dict[str, str]]) -> str:
+    async def get_response(self, messages: list[dict[str, str]], tools: Optional[List[Dict[str, Any]]] = None) -> str:
         """Get a response from the LLM.
 
         Args:
             messages: A list of message dictionaries ().
+            tools: Tools the LLM can call, in the format of the `tools` parameter of the chat completions API;
+                its calls are then in the `tool_calls` of the response.
 
         Returns:
             The LLM's response as a string.
@@ -76,14 +114,16 @@ async def get_response(self, messages: list[dict[str, str]]) -> str:
             "stream": False,
             "stop": None,
         }
+        if tools:
+            payload["tools"] = tools
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=self.headers, json=payload, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-                logger.debug(data)
-                return json.dumps(data["choices"][0]["message"])
+            client = http_pool.client(url, http2=self.http2)
+            response = await client.post(url, headers=self.headers, json=payload, timeout=30)
+            response.raise_for_status()
+            data = response.json()
+            logger.debug(data)
+            return json.dumps(data["choices"][0]["message"])
 
         except httpx.RequestError as e:
             error_message = f"Error getting LLM response: {str(e)} [{type(e).__name__}]"
@@ -95,3 +135,147 @@ async def get_response(self, messages: list[dict[str, str]]) -> str:
                 logger.error(f"Response details: {e.response.text}")
 
             return f"I encountered an error: {error_message}. Please try again or rephrase your request."
+
+    async def stream_response(
+        self,
+        messages: list[dict[str, str]],
+        on_tool_call: Callable[[Dict[str, Any]], None],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        content_tools: bool = True,
+    ) -> Tuple[str, StreamStats]:
+        """Get a response from the LLM as a stream of server-sent events, reporting each tool call as soon as it
+        is complete.
+
+        Tool calls are detected in the `tool_calls` deltas, once the JSON of their arguments closes, and with
+        `content_tools` in the content, as JSON objects with a "tool" key (the format asked by the system prompt)
+        as soon as they close.
+
+        Args:
+            messages: A list of message dictionaries.
+            on_tool_call: Called with each tool call, as {"id": ..., "function": {"name": ..., "arguments": {...}}}
+                (the id only for the calls of the `tool_calls` deltas), while the rest of the response is generated.
+            tools: Tools the LLM can call, as for `get_response`.
+            content_tools: Whether to look for tool calls in the content too.
+
+        Returns:
+            The complete message as a string, like `get_response`, and the timing of the response.
+        """
+        url = f"{self.base_url}{self.chat_endpoint}"
+
+        payload = {
+            "messages": messages,
+            "model": self.model,
+            "temperature": 0.7,
+            "max_tokens": 4096,
+            "top_p": 1,
+            "stream": True,
+            "stop": None,
+        }
+        if tools:
+            payload["tools"] = tools
+
+        stats = StreamStats()
+        start = time.perf_counter()
+
+        def report(name: str, arguments: Any, call_id: Optional[str] = None) -> None:
+            if stats.first_tool_call_s is None:
+                stats.first_tool_call_s = time.perf_counter() - start
+            stats.tool_calls += 1
+            called_tool: Dict[str, Any] = {"function": {"name": name, "arguments": arguments}}
+            if call_id:
+                called_tool["id"] = call_id
+            on_tool_call(called_tool)
+
+        content: list[str] = []
+        content_scanner = JsonObjectScanner()
+        # Index of the call in the deltas -> id, name, arguments received so far, scanner of the arguments, reported
+        native_calls: Dict[int, Dict[str, Any]] = {}
+
+        try:
+            client = http_pool.client(url, http2=self.http2)
+            async with client.stream("POST", url, headers=self.headers, json=payload, timeout=30) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:") :].strip()
+                    if data == "[DONE]":
+                        # The body is still read to its end, otherwise the connection could not be reused
+                        continue
+                    try:
+                        event = json.loads(data)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping a malformed stream event: {data[:200]}")
+                        continue
+                    choices = (event.get("choices") if isinstance(event, dict) else None) or [{}]
+                    delta = choices[0].get("delta") or {}
+                    if stats.first_token_s is None and (delta.get("content") or delta.get("tool_calls")):
+                        stats.first_token_s = time.perf_counter() - start
+
+                    if delta.get("content"):
+                        content.append(delta["content"])
+                    if delta.get("content") and content_tools:
+                        for text in content_scanner.feed(delta["content"]):
+                            try:
+                                obj = json.loads(text)
+                            except json.JSONDecodeError:
+                                continue
+                            if isinstance(obj, dict) and "tool" in obj:
+                                report(obj["tool"], obj.get("arguments", {}))
+
+                    for call_delta in delta.get("tool_calls") or []:
+                        call = native_calls.setdefault(
+                            call_delta.get("index", len(native_calls)),
+                            {"id": "", "name": "", "arguments": "", "scanner": JsonObjectScanner(), "reported": False},
+                        )
+                        call["id"] = call_delta.get("id") or call["id"]
+                        function = call_delta.get("function") or {}
+                        call["name"] += function.get("name") or ""
+                        arguments = function.get("arguments")
+                        if isinstance(arguments, dict):
+                            # Some providers send the arguments at once, already decoded
+                            call["arguments"] = arguments
+                            closed = True
+                        else:
+                            call["arguments"] += arguments or ""
+                            closed = bool(call["scanner"].feed(arguments or ""))
+                        if closed and call["name"] and not call["reported"]:
+                            call["reported"] = True
+                            report(call["name"], self._decode_arguments(call["arguments"]), call["id"])
+
+        except (httpx.RequestError, httpx.HTTPStatusError) as e:
+            error_message = f"Error getting LLM response: {str(e)} [{type(e).__name__}]"
+            logger.error(error_message)
+            stats.total_s = time.perf_counter() - start
+            return f"I encountered an error: {error_message}. Please try again or rephrase your request.", stats
+
+        # Calls whose arguments never formed an object, e.g. empty for tools without arguments
+        for call in native_calls.values():
+            if not call["reported"] and call["name"]:
+                call["reported"] = True
+                report(call["name"], self._decode_arguments(call["arguments"]), call["id"])
+
+        stats.total_s = time.perf_counter() - start
+        message: Dict[str, Any] = {"role": "assistant", "content": "".join(content)}
+        if native_calls:
+            message["tool_calls"] = [
+                {
+                    "id": call["id"],
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": call["arguments"]},
+                }
+                for call in native_calls.values()
+            ]
+        logger.debug(message)
+        return json.dumps(message), stats
+
+    @staticmethod
+    def _decode_arguments(arguments: Any) -> Dict[str, Any]:
+        if isinstance(arguments, dict):
+            return arguments
+        try:
+            decoded = json.loads(arguments) if arguments.strip() else {}
+        except json.JSONDecodeError:
+            logger.warning(f"Invalid tool call arguments: {arguments}")
+            return {}
+        return decoded if isinstance(decoded, dict) else {}
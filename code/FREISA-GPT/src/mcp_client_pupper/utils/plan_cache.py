@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .command_grammar import DIRECTIONS, NUMBER_WORDS
+from .math import similarity
+
+logger = logging.getLogger(__name__)
+
+# Words that do not change what a command asks for
+FILLER_WORDS = frozenset("please puppy now hey ok okay the a an".split())
+
+# Words a similar command must have too: "turn left" is not "turn right"
+DIRECTION_WORDS = frozenset(DIRECTIONS) | frozenset(DIRECTIONS.values()) | {"left", "right", "up", "down", "around"}
+
+
+@dataclass
+class CachedPlan:
+    command: str
+    # As dispatched: [{"function": {"name": ..., "arguments": {...}}}]
+    tool_calls: List[Dict[str, Any]]
+    reply: str
+    created: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+class PlanCache:
+    """
+    Tool calls planned by the LLM for the voice commands, so that repeated commands are executed without asking
+    the LLM again.
+
+    Commands are normalized (lowercase, numbers in digits, no punctuation nor filler words) and matched exactly,
+    then by similarity above `threshold`; a similar command only matches if it has the same numbers and
+    directions ("walk two meters" is not "walk 3 meters", "turn left" is not "turn right"). The least recently
+    used plans are evicted beyond `max_entries`, and plans expire `ttl_s` after being planned. Every plan is dropped when the tools of the servers change (see `set_catalog`).
+
+    Args:
+        path (Optional[Path]): JSON file keeping the plans between runs; in memory only if None
+        max_entries (int): Maximum number of plans
+        ttl_s (float): Lifetime of a plan
+        threshold (float): Minimum similarity of a command to a cached one, from 0 to 1 (identical)
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_entries: int = 256,
+        ttl_s: float = 7 * 24 * 3600.0,
+        threshold: float = 0.9,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        self.catalog: Optional[str] = None
+        self.plans: "OrderedDict[str, CachedPlan]" = OrderedDict()
+        self._load()
+
+    @staticmethod
+    def normalize(command: str) -> str:
+        words = re.findall(r"\d+(?:\.\d+)?|[a-z']+(?:-[a-z]+)?", command.lower())
+        return " ".join(NUMBER_WORDS.get(word, word) for word in words if word not in FILLER_WORDS)
+
+    @staticmethod
+    def _amounts(key: str) -> List[str]:
+        """The numbers and direction words of a normalized command, in order."""
+        return [DIRECTIONS.get(word, word) for word in key.split() if word[0].isdigit() or word in DIRECTION_WORDS]
+
+    def set_catalog(self, fingerprint: str):
+        """Drop every plan if the tools changed since they were planned."""
+        if fingerprint != self.catalog:
+            if self.plans:
+                logger.info(f"Tools changed: dropping {len(self.plans)} cached plan(s)")
+            self.plans.clear()
+            self.catalog = fingerprint
+            self._save()
+
+    def lookup(self, command: str) -> Optional[CachedPlan]:
+        key = self.normalize(command)
+        if not key:
+            return None
+        now = time.time()
+        for expired in [k for k, plan in self.plans.items() if now - plan.created > self.ttl_s]:
+            del self.plans[expired]
+
+        plan = self.plans.get(key)
+        if plan is None:
+            amounts = self._amounts(key)
+            best = 0.0
+            for candidate_key, candidate in self.plans.items():
+                # The similarity cannot reach the threshold with lengths too different
+                if min(len(key), len(candidate_key)) < self.threshold * max(len(key), len(candidate_key)):
+                    continue
+                if self._amounts(candidate_key) != amounts:
+                    continue
+                score = similarity(key, candidate_key)
+                if score >= self.threshold and score > best:
+                    best, plan = score, candidate
+            if plan is None:
+                return None
+            logger.info(f"'{key}' matched cached command '{plan.command}' ({best:.2f})")
+
+        self.plans.move_to_end(plan.command)
+        plan.hits += 1
+        return plan
+
+    def store(self, command: str, tool_calls: List[Dict[str, Any]], reply: str):
+        key = self.normalize(command)
+        if not key or not tool_calls:
+            return
+        self.plans[key] = CachedPlan(key, tool_calls, reply)
+        self.plans.move_to_end(key)
+        while len(self.plans) > self.max_entries:
+            self.plans.popitem(last=False)
+        self._save()
+
+    def forget(self, plan: CachedPlan):
+        """Drop a plan, e.g. one that failed when replayed."""
+        if self.plans.pop(plan.command, None) is not None:
+            self._save()
+
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.catalog = data.get("catalog")
+            for plan in data.get("plans", []):
+                self.plans[plan["command"]] = CachedPlan(**plan)
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Ignoring the plan cache {self.path}: {e}")
+            self.plans.clear()
+
+    def _save(self):
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp, "w") as f:
+                json.dump({"catalog": self.catalog, "plans": [asdict(plan) for plan in self.plans.values()]}, f)
+            os.replace(tmp, self.path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Could not save the plan cache {self.path}: {e}")
@@ -4,6 +4,8 @@
 import httpx
 from icecream import ic
 
+from .http_pool import http_pool
+
 logger = logging.getLogger(__name__)
 
 
@@ -57,13 +59,13 @@ async def call_api(
     headers = {"Content-Type": "application/json"}
 
     try:
-        async with httpx.AsyncClient() as client:
-            if method == "GET":
-                response = await client.get(url, headers=headers, timeout=120)
-            elif method == "POST":
-                response = await client.post(url, json=data, headers=headers, timeout=120)
-            else:
-                raise ValueError(f"Unsupported method: {method}")
+        client = http_pool.client(url)
+        if method == "GET":
+            response = await client.get(url, headers=headers, timeout=120)
+        elif method == "POST":
+            response = await client.post(url, json=data, headers=headers, timeout=120)
+        else:
+            raise ValueError(f"Unsupported method: {method}")
         response.raise_for_status()
     except httpx.RequestError as e:
         logger.error(f"Error calling Puppy API: {str(e)}")
@@ -0,0 +1,39 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+
+class Timeline:
+    """Start and end times of the phases of a process, such as the startup of the assistant.
+
+    Phases may overlap: each one is timed from the creation of the timeline.
+
+    Example usage
+    ```python
+    timeline = Timeline()
+    with timeline.phase("load model"):
+        await asyncio.to_thread(load_model)
+    timeline.log(logger, "Startup")
+    ```
+    """
+
+    def __init__(self) -> None:
+        self.origin: float = time.perf_counter()
+        self.phases: List[Tuple[str, float, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter() - self.origin
+        try:
+            yield
+        finally:
+            self.phases.append((name, start, time.perf_counter() - self.origin))
+
+    def log(self, logger: logging.Logger, title: str) -> None:
+        """Log the phases by start time, and the time elapsed since the creation of the timeline."""
+        lines = [f"{title} timeline ({time.perf_counter() - self.origin:.2f} s):"]
+        width = max((len(name) for name, _, _ in self.phases), default=0)
+        for name, start, end in sorted(self.phases, key=lambda phase: phase[1]):
+            lines.append(f"  {name:<{width}}  {start:6.2f} -> {end:6.2f} s  ({end - start:.2f} s)")
+        logger.info("\n".join(lines))
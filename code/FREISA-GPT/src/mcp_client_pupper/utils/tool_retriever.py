@@ -0,0 +1,106 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Words of voice commands -> words of the tool descriptions they call for. The commands are given to a dog
+# ("Walk forward", "Come here"), the tools are described in ROS terms.
+QUERY_EXPANSIONS: Dict[str, str] = {
+    "walk": "cmd vel publish linear velocity",
+    "go": "cmd vel publish linear velocity",
+    "move": "cmd vel publish linear velocity",
+    "come": "cmd vel publish linear velocity",
+    "run": "cmd vel publish linear velocity",
+    "forward": "cmd vel linear",
+    "back": "cmd vel linear",
+    "backward": "cmd vel linear",
+    "turn": "cmd vel publish angular velocity",
+    "rotate": "cmd vel publish angular velocity",
+    "spin": "cmd vel publish angular velocity",
+    "left": "cmd vel angular",
+    "right": "cmd vel angular",
+    "stop": "cmd vel publish",
+    "see": "image camera",
+    "look": "image camera",
+    "photo": "image camera",
+    "picture": "image camera",
+    "obstacle": "scan depth distance range",
+    "wall": "scan depth distance range",
+    "near": "scan depth distance",
+    "far": "scan depth distance",
+    "close": "scan depth distance",
+    "speed": "parameter",
+    "setting": "parameter",
+    "battery": "subscribe topic",
+}
+
+# Words matching every tool description equally badly
+STOPWORDS = frozenset(
+    "a an and are at be can could do does for from have how i in is it its me my of on or please that the there "
+    "this to what which who why will with would you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words, with snake_case and paths split, stopwords dropped and common English suffixes removed."""
+    tokens = []
+    for word in _WORD.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        for suffix in ("ing", "ed", "s"):
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[: -len(suffix)]
+                break
+        tokens.append(word)
+    return tokens
+
+
+class ToolRetriever:
+    """
+    Ranks tools by relevance to a request with Okapi BM25, to describe only the relevant ones to the LLM.
+
+    Built once per tool listing; ranking costs a few dictionary lookups per word of the request.
+
+    Args:
+        documents (Dict[str, str]): Text of each tool (name, description, arguments) by tool name
+        k1 (float): Saturation of the term frequency
+        b (float): Normalization by the length of the documents
+    """
+
+    def __init__(self, documents: Dict[str, str], k1: float = 1.5, b: float = 0.75):
+        self.names: List[str] = list(documents)
+        self.k1 = k1
+        self.b = b
+        counts = [Counter(tokenize(text)) for text in documents.values()]
+        self.lengths: List[int] = [sum(c.values()) for c in counts]
+        self.average_length: float = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        # Word -> [(document, frequency)]
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        for document, c in enumerate(counts):
+            for word, frequency in c.items():
+                self.postings.setdefault(word, []).append((document, frequency))
+        n = len(self.names)
+        self.idf: Dict[str, float] = {
+            word: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for word, postings in self.postings.items()
+        }
+
+    def scores(self, query: str) -> Dict[str, float]:
+        """BM25 score of each tool sharing words with the query (expanded with `QUERY_EXPANSIONS`)."""
+        words = tokenize(query)
+        words += [expansion for word in words for expansion in tokenize(QUERY_EXPANSIONS.get(word, ""))]
+        scores: Dict[int, float] = {}
+        for word in set(words):
+            for document, frequency in self.postings.get(word, ()):
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[document] / self.average_length)
+                scores[document] = scores.get(document, 0.0) + self.idf[word] * frequency * (self.k1 + 1) / (
+                    frequency + norm
+                )
+        return {self.names[document]: score for document, score in scores.items()}
+
+    def top(self, query: str, k: int) -> List[str]:
+        """Names of the `k` most relevant tools, best first; fewer if fewer tools share words with the query."""
+        scores = self.scores(query)
+        return sorted(scores, key=lambda name: -scores[name])[:k]
@@ -1,15 +1,46 @@
+import functools
 import json
 import logging
 import os
+import threading
 import time
 from argparse import ArgumentParser
-from typing import Optional
+from contextvars import ContextVar
+from typing import Any, Optional, Union
+
+from utils.startup_profile import StartupProfile
+
+# Created before the other imports, so that --profile-startup reports their cost too.
+# NumPy, OpenCV and PIL are imported lazily by the tools that need them.
+startup_profile = StartupProfile()
+
+import anyio  # noqa: E402
+from fastmcp import FastMCP  # noqa: E402
+from fastmcp.server.dependencies import get_context  # noqa: E402
+from fastmcp.server.middleware import Middleware, MiddlewareContext  # noqa: E402
+from fastmcp.utilities.types import Image  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import JSONResponse, Response, StreamingResponse  # noqa: E402
+
+startup_profile.mark("import fastmcp")
+
+from utils.link_quality import COMPRESSIONS, choose_qos  # noqa: E402
+from utils.message_schema import SchemaCache, SchemaError  # noqa: E402
+from utils.mjpeg import BOUNDARY, MjpegHub, multipart  # noqa: E402
+from utils.network_utils import ping_ip_and_port  # noqa: E402
+from utils.param_cache import ParamCache  # noqa: E402
+from utils.rosbridge_session import RosbridgeSession, SessionChannel  # noqa: E402
+from utils.websocket_manager import (  # noqa: E402
+    DEPTH_ENCODINGS,
+    WebSocketManager,
+    decode_image,
+    decode_message,
+    jsonable,
+    parse_image,
+    parse_json,
+)
 
-from fastmcp import FastMCP
-from fastmcp.utilities.types import Image
-from PIL import Image as PILImage
-from utils.network_utils import ping_ip_and_port
-from utils.websocket_manager import WebSocketManager, parse_image, parse_json
+startup_profile.mark("import utils")
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +48,10 @@
 ROSBRIDGE_IP = "127.0.0.1"  # Default is localhost. Replace with your local IPor set using the LLM.
 ROSBRIDGE_PORT = 9090  # Rosbridge default is 9090. Replace with your rosbridge port or set using the LLM.
 
-transport = os.getenv("MCP_TRANSPORT", "stdio")  # "stdio" or "http"
+# Annotation of the tools that only observe the robot, whose results clients cannot reuse from a previous call
+READ_ONLY = {"readOnlyHint": True}
+
+transport = os.getenv("MCP_TRANSPORT", "stdio")  # "stdio", "sse" or "streamable-http"
 parser = ArgumentParser()
 parser.add_argument(
     "--mcp-transport",
@@ -26,6 +60,18 @@
     default=transport,
     help="Specify the transport protocol for MCP ('stdio', 'sse', or 'streamable-http').",
 )
+parser.add_argument(
+    "--mcp-host",
+    type=str,
+    default="127.0.0.1",
+    help="Address the MCP server listens on with the 'sse' and 'streamable-http' transports; defaults to %(default)s",
+)
+parser.add_argument(
+    "--mcp-port",
+    type=int,
+    default=8000,
+    help="Port the MCP server listens on with the 'sse' and 'streamable-http' transports; defaults to %(default)s",
+)
 parser.add_argument(
     "--rosbridge-ip",
     type=str,
@@ -38,15 +84,120 @@
     default=ROSBRIDGE_PORT,
     help="Port of the rosbridge endpoint; defaults to %(default)s",
 )
+parser.add_argument(
+    "--ws-compression-level",
+    type=int,
+    choices=range(-1, 10),
+    default=6,
+    help="zlib level (0-9) for permessage-deflate on the rosbridge connection, -1 to disable; defaults to %(default)s",
+)
+parser.add_argument(
+    "--ws-compress-images",
+    action="store_true",
+    help="Also use permessage-deflate for image subscriptions, whose payloads rarely compress",
+)
+parser.add_argument(
+    "--mjpeg-fps",
+    type=float,
+    default=10.0,
+    help="Frame rate of the camera preview at /camera/stream, with the HTTP transports; defaults to %(default)s",
+)
+parser.add_argument(
+    "--mjpeg-quality",
+    type=int,
+    choices=range(0, 101),
+    metavar="[0-100]",
+    default=80,
+    help="JPEG quality of the camera preview; defaults to %(default)s",
+)
+parser.add_argument(
+    "--mjpeg-max-width",
+    type=int,
+    default=None,
+    help="Scale the camera preview down to this width, if wider",
+)
+parser.add_argument(
+    "--frame-ring",
+    action="append",
+    default=[],
+    metavar="TOPIC",
+    help="Decode the frames of an image topic into shared memory, for other processes of this host "
+    "(see utils/frame_ring.py); can be repeated",
+)
+parser.add_argument(
+    "--frame-ring-slots",
+    type=int,
+    default=4,
+    help="Number of frames kept in each shared memory ring; defaults to %(default)s",
+)
+parser.add_argument(
+    "--profile-startup",
+    action="store_true",
+    help="Report the time spent in each start-up phase on stderr",
+)
 args = parser.parse_args()
+startup_profile.enabled = args.profile_startup
+startup_profile.mark("parse arguments")
 
 # Initialize MCP server and WebSocket manager
 mcp = FastMCP("mcp-server-pupper")
+compression_level = args.ws_compression_level if args.ws_compression_level >= 0 else None
 # Increased default timeout for ROS operations
-ws_manager = WebSocketManager(args.rosbridge_ip, args.rosbridge_port, default_timeout=5.0)
+ws_manager = WebSocketManager(
+    args.rosbridge_ip, args.rosbridge_port, default_timeout=5.0, compression_level=compression_level
+)
+# Image subscriptions go through their own connection, without compression unless requested
+image_ws_manager = WebSocketManager(
+    args.rosbridge_ip,
+    args.rosbridge_port,
+    default_timeout=5.0,
+    compression_level=compression_level if args.ws_compress_images else None,
+    link_monitor=ws_manager.link_monitor,
+)
+
+# With the HTTP transports the server is long-running and serves several MCP clients, which share
+# one rosbridge session (connection, subscriptions and advertisements) per manager.
+# With stdio, each client runs its own server and every tool call uses the connection directly.
+shared_session = args.mcp_transport != "stdio"
+ros_session = RosbridgeSession(ws_manager) if shared_session else None
+image_ros_session = RosbridgeSession(image_ws_manager) if shared_session else None
+# Camera preview for browsers, fed by the shared image session
+mjpeg_hub = (
+    MjpegHub(
+        lambda: image_ros_session.channel("mjpeg"),
+        fps=args.mjpeg_fps,
+        quality=args.mjpeg_quality,
+        max_width=args.mjpeg_max_width,
+    )
+    if shared_session
+    else None
+)
+startup_profile.mark("create server")
+
+# Message types whose payloads are already compressed or do not compress well
+IMAGE_TYPES = ("Image", "CompressedImage")
+
+# Camera preview, see `camera_stream`
+DEFAULT_CAMERA_TOPIC = "/camera/image_raw"
+CAMERA_SNAPSHOT_TIMEOUT_S = 5.0
+
+# MCP session id of the client whose tool call is running, set by `_run_in_thread`
+client_id: ContextVar[str] = ContextVar("client_id", default="local")
+
+
+def _manager_for(msg_type: str = "") -> Union[WebSocketManager, SessionChannel]:
+    """
+    Return the rosbridge connection to use for a tool call: the connection itself with stdio,
+    or a channel on the shared session for the calling client with the HTTP transports.
+    Subscriptions of image types go through their own connection.
+    """
+    is_image = msg_type.rsplit("/", 1)[-1] in IMAGE_TYPES
+    if not shared_session:
+        return image_ws_manager if is_image else ws_manager
+    return (image_ros_session if is_image else ros_session).channel(client_id.get())
 
 
-@mcp.tool(description=("Fetch available topics from the ROS bridge.\nExample:\nget_topics()"))
+@mcp.tool(description=("Fetch available topics from the ROS bridge.\nExample:\nget_topics()"), annotations=READ_ONLY)
 def get_topics() -> dict:
     """
     Fetch available topics from the ROS bridge.
@@ -64,8 +215,9 @@ def get_topics() -> dict:
     }
 
     # Request topic list from rosbridge
-    with ws_manager:
-        response = ws_manager.request(message)
+    manager = _manager_for()
+    with manager:
+        response = manager.request(message)
 
     # Check for service response errors first
     if response and "result" in response and not response["result"]:
@@ -80,7 +232,10 @@ def get_topics() -> dict:
         return {"warning": "No topics found"}
 
 
-@mcp.tool(description=("Get the message type for a specific topic.\nExample:\nget_topic_type('/cmd_vel')"))
+@mcp.tool(
+    description=("Get the message type for a specific topic.\nExample:\nget_topic_type('/cmd_vel')"),
+    annotations=READ_ONLY,
+)
 def get_topic_type(topic: str) -> dict:
     """
     Get the message type for a specific topic.
@@ -106,8 +261,9 @@ def get_topic_type(topic: str) -> dict:
     }
 
     # Request topic type from rosbridge
-    with ws_manager:
-        response = ws_manager.request(message)
+    manager = _manager_for()
+    with manager:
+        response = manager.request(message)
 
     # Check for service response errors first
     if response and "result" in response and not response["result"]:
@@ -126,10 +282,80 @@ def get_topic_type(topic: str) -> dict:
         return {"error": f"Failed to get type for topic {topic}"}
 
 
+def _request_message_details(message_type: str) -> dict:
+    """Call `rosapi/MessageDetails`, which returns the typedefs of a message type and of its nested types."""
+    # rosbridge service call to get message details
+    message = {
+        "op": "call_service",
+        "service": "/rosapi/message_details",
+        "type": "rosapi/MessageDetails",
+        "args": {"type": message_type},
+        "id": f"get_message_details_request_{message_type.replace('/', '_')}",
+    }
+
+    # Request message details from rosbridge
+    manager = _manager_for()
+    with manager:
+        return manager.request(message)
+
+
+def _fetch_typedefs(message_type: str) -> list:
+    """
+    Return the typedefs of a message type for the schema cache.
+
+    Raises:
+        SchemaError: If rosapi does not know the type.
+        ConnectionError: If rosapi could not be reached.
+    """
+    response = _request_message_details(message_type)
+    if "error" in response:
+        raise ConnectionError(response["error"])
+    if "result" in response and not response["result"]:
+        raise SchemaError(response.get("values", {}).get("message", f"Unknown message type {message_type}"))
+    typedefs = response.get("values", {}).get("typedefs", [])
+    if not typedefs:
+        raise SchemaError(f"Unknown message type {message_type}")
+    return typedefs
+
+
+# Validators of the message types published so far, compiled from their typedefs
+schema_cache = SchemaCache(_fetch_typedefs)
+# How long to wait for a rosbridge error after publishing a payload that passed validation
+VALIDATED_STATUS_WAIT_S = 0.1
+
+
+def _check_payloads(msg_type: str, messages: list) -> tuple[list, Optional[dict], bool]:
+    """
+    Validate and normalize payloads against the definition of their type before publishing them.
+    If rosapi cannot be reached the payloads are sent unchecked, and rosbridge reports the errors.
+
+    Returns:
+        tuple: (normalized payloads, None, True), (payloads, None, False) if they could not be checked,
+            or (payloads, {"error": ..., "details": [...]}, True) if invalid.
+    """
+    try:
+        validator = schema_cache.validator(msg_type)
+    except SchemaError as e:
+        return messages, {"error": f"Cannot publish {msg_type}: {e}"}, True
+    except ConnectionError as e:
+        logger.warning(f"Publishing unchecked {msg_type} payloads: {e}")
+        return messages, None, False
+
+    errors: list[str] = []
+    normalized = []
+    for i, msg in enumerate(messages):
+        path = f"messages[{i}]" if len(messages) > 1 else ""
+        normalized.append(validator(msg, path, errors))
+    if errors:
+        return messages, {"error": f"Invalid {msg_type} message", "details": errors}, True
+    return normalized, None, True
+
+
 @mcp.tool(
     description=(
         "Get the complete structure/definition of a message type.\nExample:\nget_message_details('geometry_msgs/Twist')"
-    )
+    ),
+    annotations=READ_ONLY,
 )
 def get_message_details(message_type: str) -> dict:
     """
@@ -146,18 +372,7 @@ def get_message_details(message_type: str) -> dict:
     if not message_type or not message_type.strip():
         return {"error": "Message type cannot be empty"}
 
-    # rosbridge service call to get message details
-    message = {
-        "op": "call_service",
-        "service": "/rosapi/message_details",
-        "type": "rosapi/MessageDetails",
-        "args": {"type": message_type},
-        "id": f"get_message_details_request_{message_type.replace('/', '_')}",
-    }
-
-    # Request message details from rosbridge
-    with ws_manager:
-        response = ws_manager.request(message)
+    response = _request_message_details(message_type)
 
     # Check for service response errors first
     if response and "result" in response and not response["result"]:
@@ -189,14 +404,101 @@ def get_message_details(message_type: str) -> dict:
         return {"error": f"Failed to get details for message type {message_type}"}
 
 
+# Upper bound for throttle rates picked by adaptive QoS, unless the caller gives one
+DEFAULT_MAX_THROTTLE_RATE_MS = 2000
+# Link quality estimates older than this are refreshed with a probe before picking QoS settings
+QOS_PROBE_MAX_AGE_S = 10.0
+
+
+def _validate_qos_args(
+    queue_length: Optional[int],
+    throttle_rate_ms: Optional[int],
+    max_throttle_rate_ms: Optional[int],
+    compression: Optional[str],
+    fragment_size: Optional[int],
+) -> Optional[str]:
+    """Return an error message if the subscription settings given by the caller are invalid."""
+    if queue_length is not None and (not isinstance(queue_length, int) or queue_length < 1):
+        return "queue_length must be an integer ≥ 1"
+
+    if throttle_rate_ms is not None and (not isinstance(throttle_rate_ms, int) or throttle_rate_ms < 0):
+        return "throttle_rate_ms must be an integer ≥ 0"
+
+    if max_throttle_rate_ms is not None and (not isinstance(max_throttle_rate_ms, int) or max_throttle_rate_ms < 0):
+        return "max_throttle_rate_ms must be an integer ≥ 0"
+
+    if compression is not None and compression not in COMPRESSIONS:
+        return f"compression must be one of {', '.join(COMPRESSIONS)}"
+
+    if fragment_size is not None and (not isinstance(fragment_size, int) or fragment_size < 1):
+        return "fragment_size must be an integer ≥ 1"
+
+    return None
+
+
+def _add_qos_settings(
+    manager: WebSocketManager,
+    subscribe_msg: dict,
+    adaptive_qos: bool,
+    queue_length: Optional[int],
+    throttle_rate_ms: Optional[int],
+    max_throttle_rate_ms: Optional[int],
+    compression: Optional[str],
+    fragment_size: Optional[int],
+) -> dict:
+    """
+    Add throttle rate, queue length, compression and fragment size to a rosbridge `subscribe` message.
+
+    With adaptive QoS the settings are picked from the measured link quality, within the
+    caller-given bounds; otherwise only the parameters given by the caller are added.
+
+    Returns:
+        dict: The settings sent to rosbridge, to be reported to the caller.
+    """
+    if not adaptive_qos:
+        if queue_length is not None:
+            subscribe_msg["queue_length"] = queue_length
+        if throttle_rate_ms is not None:
+            subscribe_msg["throttle_rate"] = throttle_rate_ms
+        if compression is not None and compression != "none":
+            subscribe_msg["compression"] = compression
+        if fragment_size is not None:
+            subscribe_msg["fragment_size"] = fragment_size
+        return {
+            "adaptive": False,
+            "throttle_rate_ms": throttle_rate_ms,
+            "queue_length": queue_length,
+            "compression": compression or "none",
+            "fragment_size": fragment_size,
+        }
+
+    if manager.link_monitor.is_stale(QOS_PROBE_MAX_AGE_S):
+        manager.probe()
+
+    qos = choose_qos(
+        manager.link_monitor,
+        subscribe_msg["topic"],
+        subscribe_msg["type"],
+        min_throttle_rate_ms=throttle_rate_ms or 0,
+        max_throttle_rate_ms=max_throttle_rate_ms if max_throttle_rate_ms is not None else DEFAULT_MAX_THROTTLE_RATE_MS,
+        queue_length=queue_length,
+        compression=compression,
+        fragment_size=fragment_size,
+    )
+    qos.apply(subscribe_msg)
+    return {"adaptive": True, **qos.to_dict(), "link": manager.link_monitor.snapshot()}
+
+
 @mcp.tool(
     description=(
         "Subscribe to a ROS topic and return the first message received.\n"
         "Example:\n"
         "subscribe_once(topic='/cmd_vel', msg_type='geometry_msgs/msg/TwistStamped')\n"
         "subscribe_once(topic='/slow_topic', msg_type='my_package/SlowMsg', timeout=10.0)  # Specify timeout only if topic publishes infrequently\n"
-        "subscribe_once(topic='/high_rate_topic', msg_type='sensor_msgs/Image', queue_length=5, throttle_rate_ms=100)  # Control message buffering and rate"
-    )
+        "subscribe_once(topic='/high_rate_topic', msg_type='sensor_msgs/Image', queue_length=5, throttle_rate_ms=100)  # Control message buffering and rate\n"
+        "subscribe_once(topic='/camera/image_raw', msg_type='sensor_msgs/Image', max_throttle_rate_ms=1000)  # Bound the rate picked from the measured link quality"
+    ),
+    annotations=READ_ONLY,
 )
 def subscribe_once(
     topic: str = "",
@@ -204,6 +506,10 @@ def subscribe_once(
     timeout: Optional[float] = None,
     queue_length: Optional[int] = None,
     throttle_rate_ms: Optional[int] = None,
+    max_throttle_rate_ms: Optional[int] = None,
+    compression: Optional[str] = None,
+    fragment_size: Optional[int] = None,
+    adaptive_qos: bool = False,
 ) -> dict:
     """
     Subscribe to a given ROS topic via rosbridge and return the first message received.
@@ -214,10 +520,16 @@ def subscribe_once(
         timeout (Optional[float]): Timeout in seconds. If None, uses the default timeout.
         queue_length (Optional[int]): How many messages to buffer before dropping old ones. Must be ‚â• 1.
         throttle_rate_ms (Optional[int]): Minimum interval between messages in milliseconds. Must be ‚â• 0.
+        max_throttle_rate_ms (Optional[int]): Upper bound for the throttle rate picked by adaptive QoS.
+        compression (Optional[str]): One of 'none', 'png', 'cbor'. If None, picked by adaptive QoS.
+        fragment_size (Optional[int]): Maximum size of the fragments rosbridge splits large messages into.
+            If None, picked by adaptive QoS.
+        adaptive_qos (bool): Pick throttle rate and compression from the measured link quality,
+            within the given bounds. If False, the parameters are sent to rosbridge as they are.
 
     Returns:
         dict:
-            - {"msg": <parsed ROS message>} if successful
+            - {"msg": <parsed ROS message>, "qos": <subscription settings>} if successful
             - {"error": "<error message>"} if subscription or timeout fails
     """
     # Validate critical args before attempting subscription
@@ -225,11 +537,9 @@ def subscribe_once(
         return {"error": "Missing required arguments: topic and msg_type must be provided."}
 
     # Validate optional parameters
-    if queue_length is not None and (not isinstance(queue_length, int) or queue_length < 1):
-        return {"error": "queue_length must be an integer ‚â• 1"}
-
-    if throttle_rate_ms is not None and (not isinstance(throttle_rate_ms, int) or throttle_rate_ms < 0):
-        return {"error": "throttle_rate_ms must be an integer ‚â• 0"}
+    qos_error = _validate_qos_args(queue_length, throttle_rate_ms, max_throttle_rate_ms, compression, fragment_size)
+    if qos_error:
+        return {"error": qos_error}
 
     # Construct the rosbridge subscribe message
     subscribe_msg: dict = {
@@ -238,34 +548,39 @@ def subscribe_once(
         "type": msg_type,
     }
 
-    # Add optional parameters if provided
-    if queue_length is not None:
-        subscribe_msg["queue_length"] = queue_length
-
-    if throttle_rate_ms is not None:
-        subscribe_msg["throttle_rate"] = throttle_rate_ms
-
     # Subscribe and wait for the first message
-    with ws_manager:
+    manager = _manager_for(msg_type)
+    with manager:
+        qos = _add_qos_settings(
+            manager,
+            subscribe_msg,
+            adaptive_qos,
+            queue_length,
+            throttle_rate_ms,
+            max_throttle_rate_ms,
+            compression,
+            fragment_size,
+        )
+
         # Send subscription request
-        send_error = ws_manager.send(subscribe_msg)
+        send_error = manager.send(subscribe_msg)
         if send_error:
             return {"error": f"Failed to subscribe: {send_error}"}
 
         # Use default timeout if none specified
-        actual_timeout = timeout if timeout is not None else ws_manager.default_timeout
+        actual_timeout = timeout if timeout is not None else manager.default_timeout
 
         # Loop until we receive the first message or timeout
         end_time = time.time() + actual_timeout
         while time.time() < end_time:
-            response = ws_manager.receive(timeout=0.5)  # non-blocking small timeout
+            response = manager.receive(timeout=0.5)  # non-blocking small timeout
             if response is None:
                 continue  # idle timeout: no frame this tick
 
             if "Image" in msg_type:
                 msg_data = parse_image(response)
             else:
-                msg_data = parse_json(response)
+                msg_data = decode_message(response)
 
             if not msg_data:
                 continue  # non-JSON or empty
@@ -276,19 +591,21 @@ def subscribe_once(
 
             # Check for the first published message
             if msg_data.get("op") == "publish" and msg_data.get("topic") == topic:
+                manager.link_monitor.record_message(topic, len(response))
                 # Unsubscribe before returning the message
                 unsubscribe_msg = {"op": "unsubscribe", "topic": topic}
-                ws_manager.send(unsubscribe_msg)
+                manager.send(unsubscribe_msg)
                 if "Image" in msg_type:
                     return {
-                        "message": "Image received successfully and saved in the MCP server. Run the 'analyze_image' tool to analyze it"
+                        "message": "Image received successfully and saved in the MCP server. Run the 'analyze_image' tool to analyze it",
+                        "qos": qos,
                     }
                 else:
-                    return {"msg": msg_data.get("msg", {})}
+                    return {"msg": jsonable(msg_data.get("msg", {})), "qos": qos}
 
         # Timeout - unsubscribe and return error
         unsubscribe_msg = {"op": "unsubscribe", "topic": topic}
-        ws_manager.send(unsubscribe_msg)
+        manager.send(unsubscribe_msg)
         return {"error": "Timeout waiting for message from topic"}
 
 
@@ -296,10 +613,10 @@ def subscribe_once(
     description=(
         "Publish a single message to a ROS topic.\n"
         "Example:\n"
-        "publish_once(topic='/cmd_vel', msg_type='geometry_msgs/msg/TwistStamped', msg={'linear': {'x': 1.0}})"
+        "publish_once(topic='/cmd_vel', msg_type='geometry_msgs/msg/TwistStamped', msg={'twist': {'linear': {'x': 1.0}}})"
     )
 )
-def publish_once(topic: str = "", msg_type: str = "", msg: dict = {}) -> dict:
+def publish_once(topic: str = "", msg_type: str = "", msg: dict = {}, validate: bool = True) -> dict:
     """
     Publish a single message to a ROS topic via rosbridge.
 
@@ -307,27 +624,39 @@ def publish_once(topic: str = "", msg_type: str = "", msg: dict = {}) -> dict:
         topic (str): ROS topic name (e.g., "/cmd_vel")
         msg_type (str): ROS message type (e.g., "geometry_msgs/Twist")
         msg (dict): Message payload as a dictionary
+        validate (bool): Check the payload against the message definition, and normalize it, before sending
 
     Returns:
         dict:
             - {"success": True} if sent without errors
             - {"error": "<error message>"} if connection/send failed
+            - {"error": "Invalid <type> message", "details": [<field path>: <problem>, ...]} if validation failed
             - If rosbridge responds (usually it doesn‚Äôt for publish), parsed JSON or error info
     """
     # Validate critical args before attempting publish
     if not topic or not msg_type or msg == {}:
         return {"error": "Missing required arguments: topic, msg_type, and msg must all be provided."}
 
+    status_wait = 1.0
+    if validate:
+        payloads, invalid, validated = _check_payloads(msg_type, [msg])
+        if invalid:
+            return invalid
+        msg = payloads[0]
+        if validated:
+            status_wait = VALIDATED_STATUS_WAIT_S
+
     # Use proper advertise ‚Üí publish ‚Üí unadvertise pattern
-    with ws_manager:
+    manager = _manager_for()
+    with manager:
         # 1. Advertise the topic
         advertise_msg = {"op": "advertise", "topic": topic, "type": msg_type}
-        send_error = ws_manager.send(advertise_msg)
+        send_error = manager.send(advertise_msg)
         if send_error:
             return {"error": f"Failed to advertise topic: {send_error}"}
 
         # Check for advertise response/errors
-        response = ws_manager.receive(timeout=1.0)
+        response = manager.receive(timeout=1.0)
         if response:
             try:
                 msg_data = json.loads(response)
@@ -338,27 +667,30 @@ def publish_once(topic: str = "", msg_type: str = "", msg: dict = {}) -> dict:
 
         # 2. Publish the message
         publish_msg = {"op": "publish", "topic": topic, "msg": msg}
-        send_error = ws_manager.send(publish_msg)
+        send_error = manager.send(publish_msg)
         if send_error:
             # Try to unadvertise even if publish failed
-            ws_manager.send({"op": "unadvertise", "topic": topic})
+            manager.send({"op": "unadvertise", "topic": topic})
             return {"error": f"Failed to publish message: {send_error}"}
 
         # Check for publish response/errors
-        response = ws_manager.receive(timeout=1.0)
+        response = manager.receive(timeout=status_wait)
         if response:
             try:
                 msg_data = json.loads(response)
                 if msg_data.get("op") == "status" and msg_data.get("level") == "error":
+                    if validate:
+                        # Validation missed it: the definition may have changed since it was cached
+                        schema_cache.invalidate(msg_type)
                     # Unadvertise before returning error
-                    ws_manager.send({"op": "unadvertise", "topic": topic})
+                    manager.send({"op": "unadvertise", "topic": topic})
                     return {"error": f"Publish failed: {msg_data.get('msg', 'Unknown error')}"}
             except json.JSONDecodeError:
                 pass  # Non-JSON response is usually fine for publish
 
         # 3. Unadvertise the topic
         unadvertise_msg = {"op": "unadvertise", "topic": topic}
-        ws_manager.send(unadvertise_msg)
+        manager.send(unadvertise_msg)
 
     return {
         "success": True,
@@ -372,7 +704,8 @@ def publish_once(topic: str = "", msg_type: str = "", msg: dict = {}) -> dict:
         "Example:\n"
         "subscribe_for_duration(topic='/cmd_vel', msg_type='geometry_msgs/msg/TwistStamped', duration=5, max_messages=10)\n"
         "subscribe_for_duration(topic='/high_rate_topic', msg_type='sensor_msgs/Image', duration=10, queue_length=5, throttle_rate_ms=100)  # Control message buffering and rate"
-    )
+    ),
+    annotations=READ_ONLY,
 )
 def subscribe_for_duration(
     topic: str = "",
@@ -381,6 +714,10 @@ def subscribe_for_duration(
     max_messages: int = 100,
     queue_length: Optional[int] = None,
     throttle_rate_ms: Optional[int] = None,
+    max_throttle_rate_ms: Optional[int] = None,
+    compression: Optional[str] = None,
+    fragment_size: Optional[int] = None,
+    adaptive_qos: bool = False,
 ) -> dict:
     """
     Subscribe to a ROS topic via rosbridge for a fixed duration and collect messages.
@@ -392,13 +729,20 @@ def subscribe_for_duration(
         max_messages (int): Maximum number of messages to collect before stopping
         queue_length (Optional[int]): How many messages to buffer before dropping old ones. Must be ‚â• 1.
         throttle_rate_ms (Optional[int]): Minimum interval between messages in milliseconds. Must be ‚â• 0.
+        max_throttle_rate_ms (Optional[int]): Upper bound for the throttle rate picked by adaptive QoS.
+        compression (Optional[str]): One of 'none', 'png', 'cbor'. If None, picked by adaptive QoS.
+        fragment_size (Optional[int]): Maximum size of the fragments rosbridge splits large messages into.
+            If None, picked by adaptive QoS.
+        adaptive_qos (bool): Pick throttle rate and compression from the measured link quality,
+            within the given bounds. If False, the parameters are sent to rosbridge as they are.
 
     Returns:
         dict:
             {
                 "topic": topic_name,
                 "collected_count": N,
-                "messages": [msg1, msg2, ...]
+                "messages": [msg1, msg2, ...],
+                "qos": <subscription settings>
             }
     """
     # Validate critical args before subscribing
@@ -406,11 +750,9 @@ def subscribe_for_duration(
         return {"error": "Missing required arguments: topic and msg_type must be provided."}
 
     # Validate optional parameters
-    if queue_length is not None and (not isinstance(queue_length, int) or queue_length < 1):
-        return {"error": "queue_length must be an integer ‚â• 1"}
-
-    if throttle_rate_ms is not None and (not isinstance(throttle_rate_ms, int) or throttle_rate_ms < 0):
-        return {"error": "throttle_rate_ms must be an integer ‚â• 0"}
+    qos_error = _validate_qos_args(queue_length, throttle_rate_ms, max_throttle_rate_ms, compression, fragment_size)
+    if qos_error:
+        return {"error": qos_error}
 
     # Send subscription request
     subscribe_msg: dict = {
@@ -419,15 +761,20 @@ def subscribe_for_duration(
         "type": msg_type,
     }
 
-    # Add optional parameters if provided
-    if queue_length is not None:
-        subscribe_msg["queue_length"] = queue_length
-
-    if throttle_rate_ms is not None:
-        subscribe_msg["throttle_rate"] = throttle_rate_ms
-
-    with ws_manager:
-        send_error = ws_manager.send(subscribe_msg)
+    manager = _manager_for(msg_type)
+    with manager:
+        qos = _add_qos_settings(
+            manager,
+            subscribe_msg,
+            adaptive_qos,
+            queue_length,
+            throttle_rate_ms,
+            max_throttle_rate_ms,
+            compression,
+            fragment_size,
+        )
+
+        send_error = manager.send(subscribe_msg)
         if send_error:
             return {"error": f"Failed to subscribe: {send_error}"}
 
@@ -437,11 +784,11 @@ def subscribe_for_duration(
 
         # Loop until duration expires or we hit max_messages
         while time.time() < end_time and len(collected_messages) < max_messages:
-            response = ws_manager.receive(timeout=0.5)  # non-blocking small timeout
+            response = manager.receive(timeout=0.5)  # non-blocking small timeout
             if response is None:
                 continue  # idle timeout: no frame this tick
 
-            msg_data = parse_json(response)
+            msg_data = decode_message(response)
             if not msg_data:
                 continue  # non-JSON or empty
 
@@ -452,17 +799,103 @@ def subscribe_for_duration(
 
             # Check for published messages matching our topic
             if msg_data.get("op") == "publish" and msg_data.get("topic") == topic:
-                collected_messages.append(msg_data.get("msg", {}))
+                manager.link_monitor.record_message(topic, len(response))
+                collected_messages.append(jsonable(msg_data.get("msg", {})))
 
         # Unsubscribe when done
         unsubscribe_msg = {"op": "unsubscribe", "topic": topic}
-        ws_manager.send(unsubscribe_msg)
+        manager.send(unsubscribe_msg)
 
     return {
         "topic": topic,
         "collected_count": len(collected_messages),
         "messages": collected_messages,
         "status_errors": status_errors,  # Include any errors encountered during collection
+        "qos": qos,
+    }
+
+
+@mcp.tool(
+    description=(
+        "Measure message rate, inter-arrival jitter and bandwidth of one or more topics, like `ros2 topic hz/bw`.\n"
+        "Example:\n"
+        "measure_topic(topic='/joint_states', duration=5)\n"
+        "measure_topic(topic=['/camera/image_raw', '/odom'], duration=10)  # Measure several topics at once"
+    ),
+    annotations=READ_ONLY,
+)
+def measure_topic(topic: str | list[str] = "", duration: float = 5.0, max_messages: int = 10000) -> dict:
+    """
+    Subscribe to one or more ROS topics over a single rosbridge connection and measure their traffic.
+
+    Args:
+        topic (str | list[str]): ROS topic name, or list of topic names (e.g. "/joint_states")
+        duration (float): How long (seconds) to measure
+        max_messages (int): Maximum number of messages recorded per topic for the rate and size statistics;
+            the bandwidth counts every message
+
+    Returns:
+        dict:
+            {
+                "duration_s": <measurement window>,
+                "topics": {topic_name: {"rate_hz": ..., "period_ms": {...}, "jitter_ms": ...,
+                                        "size_bytes": {...}, "bytes_per_s": ...}},
+                "status_errors": [...]
+            }
+    """
+    topics = [topic] if isinstance(topic, str) else list(topic)
+    topics = [t for t in topics if t and t.strip()]
+    if not topics:
+        return {"error": "Missing required argument: topic must be provided."}
+
+    if duration <= 0:
+        return {"error": "duration must be > 0"}
+
+    if not isinstance(max_messages, int) or max_messages < 2:
+        return {"error": "max_messages must be an integer ≥ 2"}
+
+    from utils.topic_stats import TopicStats
+
+    stats = {t: TopicStats(t, capacity=max_messages) for t in topics}
+    status_errors = []
+
+    manager = _manager_for()
+    with manager:
+        for t in topics:
+            # The message type is resolved by rosbridge for existing topics
+            send_error = manager.send({"op": "subscribe", "topic": t})
+            if send_error:
+                return {"error": f"Failed to subscribe to {t}: {send_error}"}
+
+        start = time.monotonic()
+        end_time = start + duration
+        while time.monotonic() < end_time:
+            response = manager.receive(timeout=min(0.5, max(end_time - time.monotonic(), 0.01)))
+            if response is None:
+                continue  # idle timeout: no frame this tick
+            stamp = time.monotonic()
+
+            msg_data = parse_json(response)
+            if not msg_data:
+                continue  # non-JSON or empty
+
+            if msg_data.get("op") == "status" and msg_data.get("level") == "error":
+                status_errors.append(msg_data.get("msg", "Unknown error"))
+                continue
+
+            topic_stats = stats.get(msg_data.get("topic", "")) if msg_data.get("op") == "publish" else None
+            if topic_stats is not None:
+                # Payload size; with permessage-deflate the bytes on the wire are fewer
+                topic_stats.record(stamp, len(response))
+
+        window = time.monotonic() - start
+        for t in topics:
+            manager.send({"op": "unsubscribe", "topic": t})
+
+    return {
+        "duration_s": window,
+        "topics": {t: s.summary(window) for t, s in stats.items()},
+        "status_errors": status_errors,
     }
 
 
@@ -470,10 +903,12 @@ def subscribe_for_duration(
     description=(
         "Publish a sequence of messages with delays.\n"
         "Example:\n"
-        "publish_for_durations(topic='/cmd_vel', msg_type='geometry_msgs/msg/TwistStamped', messages=[{'linear': {'x': 1.0}}, {'linear': {'x': 0.0}}], durations=[1, 2])"
+        "publish_for_durations(topic='/cmd_vel', msg_type='geometry_msgs/msg/TwistStamped', messages=[{'twist': {'linear': {'x': 1.0}}}, {'twist': {'linear': {'x': 0.0}}}], durations=[1, 2])"
     )
 )
-def publish_for_durations(topic: str = "", msg_type: str = "", messages: list = [], durations: list = []) -> dict:
+def publish_for_durations(
+    topic: str = "", msg_type: str = "", messages: list = [], durations: list = [], validate: bool = True
+) -> dict:
     """
     Publish a sequence of messages to a given ROS topic with delays in between.
 
@@ -482,6 +917,7 @@ def publish_for_durations(topic: str = "", msg_type: str = "", messages: list =
         msg_type (str): ROS message type (e.g., "geometry_msgs/Twist")
         messages (list): A list of message dictionaries (ROS-compatible payloads)
         durations (list): A list of durations (seconds) to wait between messages
+        validate (bool): Check all the payloads against the message definition, and normalize them, before sending
 
     Returns:
         dict:
@@ -501,16 +937,26 @@ def publish_for_durations(topic: str = "", msg_type: str = "", messages: list =
     if len(messages) != len(durations):
         return {"error": "messages and durations must have the same length"}
 
+    # Invalid payloads are reported before anything is sent, so the robot does not run half a sequence
+    status_wait = 1.0
+    if validate:
+        messages, invalid, validated = _check_payloads(msg_type, messages)
+        if invalid:
+            return invalid
+        if validated:
+            status_wait = VALIDATED_STATUS_WAIT_S
+
     # Use proper advertise ‚Üí publish ‚Üí unadvertise pattern
-    with ws_manager:
+    manager = _manager_for()
+    with manager:
         # 1. Advertise the topic
         advertise_msg = {"op": "advertise", "topic": topic, "type": msg_type}
-        send_error = ws_manager.send(advertise_msg)
+        send_error = manager.send(advertise_msg)
         if send_error:
             return {"error": f"Failed to advertise topic: {send_error}"}
 
         # Check for advertise response/errors
-        response = ws_manager.receive(timeout=1.0)
+        response = manager.receive(timeout=1.0)
         if response:
             try:
                 msg_data = json.loads(response)
@@ -528,17 +974,20 @@ def publish_for_durations(topic: str = "", msg_type: str = "", messages: list =
             publish_msg = {"op": "publish", "topic": topic, "msg": msg}
 
             # Send it
-            send_error = ws_manager.send(publish_msg)
+            send_error = manager.send(publish_msg)
             if send_error:
                 errors.append(f"Message {i + 1}: {send_error}")
                 continue  # Continue with next message instead of failing completely
 
             # Check for publish response/errors
-            response = ws_manager.receive(timeout=1.0)
+            response = manager.receive(timeout=status_wait)
             if response:
                 try:
                     msg_data = json.loads(response)
                     if msg_data.get("op") == "status" and msg_data.get("level") == "error":
+                        if validate:
+                            # Validation missed it: the definition may have changed since it was cached
+                            schema_cache.invalidate(msg_type)
                         errors.append(f"Message {i + 1}: {msg_data.get('msg', 'Unknown error')}")
                         continue
                 except json.JSONDecodeError:
@@ -551,7 +1000,7 @@ def publish_for_durations(topic: str = "", msg_type: str = "", messages: list =
 
         # 3. Unadvertise the topic
         unadvertise_msg = {"op": "unadvertise", "topic": topic}
-        ws_manager.send(unadvertise_msg)
+        manager.send(unadvertise_msg)
 
     return {
         "success": True,
@@ -563,6 +1012,510 @@ def publish_for_durations(topic: str = "", msg_type: str = "", messages: list =
     }
 
 
+## ############################################################################################## ##
+##
+##                       PARAMETERS
+##
+## ############################################################################################## ##
+
+# Parameter values read so far; the ones written through set_params are invalidated
+param_cache = ParamCache(ttl_s=30.0)
+
+
+def _param_request(service: str, args: dict) -> dict:
+    service_type = {"get_param": "rosapi/GetParam", "set_param": "rosapi/SetParam"}[service]
+    return {"op": "call_service", "service": f"/rosapi/{service}", "type": service_type, "args": args}
+
+
+def _service_error(response: dict) -> Optional[str]:
+    """Error of a rosapi call, from the connection, rosbridge, or the `successful`/`reason` fields of ROS 2."""
+    if "error" in response:
+        return response["error"]
+    values = response.get("values") or {}
+    if "result" in response and not response["result"]:
+        return values.get("message", "Service call failed") if isinstance(values, dict) else str(values)
+    if isinstance(values, dict) and values.get("successful") is False:
+        return values.get("reason") or "Service call failed"
+    return None
+
+
+@mcp.tool(
+    description=(
+        "Read ROS parameters, all in one call. Names are '/node:parameter' on ROS 2.\n"
+        "Without names, lists the available parameters.\n"
+        "Example:\n"
+        "get_params(names=['/camera:frame_rate', '/champ_controller:gait.nominal_height'])\n"
+        "get_params()  # List parameter names"
+    ),
+    annotations=READ_ONLY,
+)
+def get_params(names: Optional[list[str]] = None, use_cache: bool = True) -> dict:
+    """
+    Read several ROS parameters with concurrent rosapi calls.
+
+    Args:
+        names (Optional[list[str]]): Parameter names. Default = list the parameter names instead
+        use_cache (bool): Return values read in the last 30 s without asking rosapi again. Default = True
+
+    Returns:
+        dict:
+            {
+                "params": {name: value, ...},
+                "errors": {name: "<error message>", ...},
+                "cached": [names returned from the cache]
+            }
+            OR {"names": [...]} without names
+            OR {"error": "<error message>"}
+    """
+    manager = _manager_for()
+    if not names:
+        message = {"op": "call_service", "service": "/rosapi/get_param_names", "type": "rosapi/GetParamNames"}
+        with manager:
+            response = manager.request(message)
+        error = _service_error(response)
+        if error:
+            return {"error": f"Failed to list parameters: {error}"}
+        return {"names": (response.get("values") or {}).get("names", [])}
+
+    names = list(dict.fromkeys(names))
+    params, misses = param_cache.lookup(names) if use_cache else ({}, names)
+    cached = list(params)
+    errors = {}
+    if misses:
+        requests = [_param_request("get_param", {"name": name}) for name in misses]
+        with manager:
+            responses = manager.request_many(requests)
+
+        fetched = {}
+        for name, response in zip(misses, responses):
+            error = _service_error(response)
+            raw = (response.get("values") or {}).get("value", "") if not error else ""
+            if error or raw == "":
+                errors[name] = error or "Parameter not set"
+                continue
+            try:
+                fetched[name] = json.loads(raw)  # rosapi returns values as JSON
+            except json.JSONDecodeError:
+                fetched[name] = raw
+        param_cache.store(fetched)
+        params.update(fetched)
+
+    return {"params": {name: params[name] for name in names if name in params}, "errors": errors, "cached": cached}
+
+
+@mcp.tool(
+    description=(
+        "Set ROS parameters, all in one call. Names are '/node:parameter' on ROS 2.\n"
+        "Example:\n"
+        "set_params(params={'/camera:frame_rate': 15, '/champ_controller:gait.max_linear_velocity_x': 0.2})"
+    )
+)
+def set_params(params: dict[str, Any]) -> dict:
+    """
+    Set several ROS parameters with concurrent rosapi calls.
+
+    Args:
+        params (dict): Parameter name -> new value (number, string, bool or list)
+
+    Returns:
+        dict:
+            {
+                "set": [names set successfully],
+                "errors": {name: "<error message>", ...}
+            }
+            OR {"error": "<error message>"}
+    """
+    if not params:
+        return {"error": "params must not be empty"}
+
+    names = list(params)
+    requests = [_param_request("set_param", {"name": name, "value": json.dumps(params[name])}) for name in names]
+    manager = _manager_for()
+    with manager:
+        responses = manager.request_many(requests)
+    # The node may have rejected or adjusted a value: the next read goes to rosapi
+    param_cache.invalidate(names)
+
+    errors = {name: error for name, response in zip(names, responses) if (error := _service_error(response))}
+    return {"set": [name for name in names if name not in errors], "errors": errors}
+
+
+## ############################################################################################## ##
+##
+##                       SENSOR SUMMARIES
+##
+## ############################################################################################## ##
+
+
+def _wait_for_message(manager: WebSocketManager, topic: str, timeout: float) -> dict:
+    """
+    Wait for the first message published on a topic the manager is subscribed to.
+
+    Returns:
+        dict: The decoded rosbridge `publish` message, or {"error": "<error message>"}.
+    """
+    end_time = time.time() + timeout
+    while time.time() < end_time:
+        response = manager.receive(timeout=0.5)  # non-blocking small timeout
+        msg_data = decode_message(response)
+        if not msg_data:
+            continue  # idle timeout, non-JSON or empty
+
+        if msg_data.get("op") == "status" and msg_data.get("level") == "error":
+            return {"error": f"Rosbridge error: {msg_data.get('msg', 'Unknown error')}"}
+
+        if msg_data.get("op") == "publish" and msg_data.get("topic") == topic:
+            manager.link_monitor.record_message(topic, len(response))
+            return msg_data
+
+    return {"error": "Timeout waiting for message from topic"}
+
+
+@mcp.tool(
+    description=(
+        "Summarize a laser scan or point cloud as distances to obstacles around the robot.\n"
+        "Returns the minimum range per angular sector, the nearest obstacle, the free directions "
+        "and the directions without valid returns, which are unknown "
+        "(0° is straight ahead, positive angles to the left).\n"
+        "Example:\n"
+        "summarize_scan(topic='/scan')\n"
+        "summarize_scan(topic='/points', msg_type='sensor_msgs/msg/PointCloud2', sectors=8, clearance_m=0.3)"
+    ),
+    annotations=READ_ONLY,
+)
+def summarize_scan(
+    topic: str = "/scan",
+    msg_type: str = "sensor_msgs/msg/LaserScan",
+    sectors: int = 12,
+    clearance_m: float = 0.5,
+    z_min: float = -0.05,
+    z_max: float = 0.5,
+    timeout: Optional[float] = None,
+) -> dict:
+    """
+    Subscribe to a LaserScan or PointCloud2 topic and summarize the first message received.
+
+    The message is decoded into NumPy arrays (requested as CBOR, so that ranges and point data
+    arrive as binary arrays) and reduced to a few dozen numbers.
+
+    Args:
+        topic (str): ROS topic name (e.g. "/scan")
+        msg_type (str): 'sensor_msgs/msg/LaserScan' or 'sensor_msgs/msg/PointCloud2'
+        sectors (int): Number of angular sectors of the histogram
+        clearance_m (float): Minimum distance (m) for a sector to count as free
+        z_min (float): For point clouds, lowest point height (m) considered an obstacle
+        z_max (float): For point clouds, highest point height (m) considered an obstacle
+        timeout (Optional[float]): Timeout in seconds. If None, uses the default timeout.
+
+    Returns:
+        dict:
+            {
+                "topic": topic_name,
+                "sectors": [{"bearing_deg": ..., "min_range_m": ..., "free": true/false/null}, ...],
+                "nearest_obstacle": {"bearing_deg": ..., "range_m": ...},
+                "free_directions_deg": [...],
+                "unknown_directions_deg": [...],  # sectors without valid returns
+                "valid_ratio": ...
+            }
+            OR {"error": "<error message>"}
+    """
+    type_key = msg_type.rsplit("/", 1)[-1]
+    if not topic or type_key not in ("LaserScan", "PointCloud2"):
+        return {"error": "topic must be provided and msg_type must be a LaserScan or PointCloud2 type"}
+
+    if not isinstance(sectors, int) or not 1 <= sectors <= 360:
+        return {"error": "sectors must be an integer between 1 and 360"}
+
+    subscribe_msg: dict = {"op": "subscribe", "topic": topic, "type": msg_type}
+    manager = _manager_for(msg_type)
+    with manager:
+        _add_qos_settings(manager, subscribe_msg, True, None, None, None, None, None)
+        send_error = manager.send(subscribe_msg)
+        if send_error:
+            return {"error": f"Failed to subscribe: {send_error}"}
+
+        actual_timeout = timeout if timeout is not None else manager.default_timeout
+        msg_data = _wait_for_message(manager, topic, actual_timeout)
+        manager.send({"op": "unsubscribe", "topic": topic})
+
+    if "error" in msg_data:
+        return msg_data
+
+    import numpy as np
+    from utils.scan_decoding import decode_laser_scan, decode_point_cloud2, point_cloud_to_polar, summarize_ranges
+
+    msg = msg_data.get("msg", {})
+    try:
+        if type_key == "LaserScan":
+            angles, ranges, valid = decode_laser_scan(msg)
+            span = (msg.get("angle_min", -np.pi), msg.get("angle_max", np.pi))
+            # A full-circle scan is binned like a point cloud, with bearings wrapped to [-180°, 180°)
+            if span[1] - span[0] >= 2 * np.pi - 2 * abs(msg.get("angle_increment", 0.0)):
+                angles, span = np.arctan2(np.sin(angles), np.cos(angles)), None
+            # +inf readings mean that nothing is within range (REP 117)
+            summary = summarize_ranges(angles, ranges, valid, sectors, clearance_m, span, np.isposinf(ranges))
+        else:
+            angles, ranges, valid = point_cloud_to_polar(decode_point_cloud2(msg), z_min, z_max)
+            summary = summarize_ranges(angles, ranges, valid, sectors, clearance_m)
+    except (KeyError, ValueError, TypeError) as e:
+        return {"error": f"Failed to decode {msg_type}: {e}"}
+
+    return {"topic": topic, "msg_type": msg_type, "points": int(ranges.size), **summary}
+
+
+@mcp.tool(
+    description=(
+        "Measure distances in front of the robot from a depth camera, as a grid of cells over the image.\n"
+        "Returns the median and minimum distance (m) and the ratio of valid pixels of each cell, "
+        "row 0 being the top of the image and col 0 its left.\n"
+        "Example:\n"
+        "analyze_depth(topic='/camera/depth/image_raw')\n"
+        "analyze_depth(topic='/camera/depth/image_raw', rows=1, cols=5, roi=[0.0, 0.4, 1.0, 0.6])  # Horizontal band"
+    ),
+    annotations=READ_ONLY,
+)
+def analyze_depth(
+    topic: str = "/camera/depth/image_raw",
+    rows: int = 3,
+    cols: int = 3,
+    roi: Optional[list[float]] = None,
+    min_range_m: float = 0.0,
+    max_range_m: Optional[float] = None,
+    timeout: Optional[float] = None,
+) -> dict:
+    """
+    Subscribe to a depth image topic (16UC1, mono16 or 32FC1) and summarize the first frame received.
+
+    The frame is decoded into a NumPy array, never written to disk, and reduced to a grid of statistics
+    with invalid pixels (0, NaN, out of range) left out.
+
+    Args:
+        topic (str): Depth image topic (sensor_msgs/msg/Image)
+        rows (int): Number of grid rows
+        cols (int): Number of grid columns
+        roi (Optional[list[float]]): [left, top, right, bottom] as fractions of the image. Default = whole image
+        min_range_m (float): Depths below this (m) are ignored
+        max_range_m (Optional[float]): Depths above this (m) are ignored
+        timeout (Optional[float]): Timeout in seconds. If None, uses the default timeout.
+
+    Returns:
+        dict:
+            {
+                "topic": topic_name,
+                "width": ..., "height": ..., "encoding": ...,
+                "median_m": [[...], ...],
+                "min_m": [[...], ...],
+                "valid_ratio": [[...], ...],
+                "nearest": {"row": ..., "col": ..., "median_m": ...}
+            }
+            OR {"error": "<error message>"}
+    """
+    if not 1 <= rows <= 32 or not 1 <= cols <= 32:
+        return {"error": "rows and cols must be between 1 and 32"}
+    if roi is not None and (len(roi) != 4 or not 0 <= roi[0] < roi[2] <= 1 or not 0 <= roi[1] < roi[3] <= 1):
+        return {
+            "error": "roi must be [left, top, right, bottom] with 0 <= left < right <= 1 and 0 <= top < bottom <= 1"
+        }
+
+    msg_type = "sensor_msgs/msg/Image"
+    subscribe_msg: dict = {"op": "subscribe", "topic": topic, "type": msg_type}
+    manager = _manager_for(msg_type)
+    with manager:
+        _add_qos_settings(manager, subscribe_msg, True, None, None, None, None, None)
+        send_error = manager.send(subscribe_msg)
+        if send_error:
+            return {"error": f"Failed to subscribe: {send_error}"}
+
+        actual_timeout = timeout if timeout is not None else manager.default_timeout
+        msg_data = _wait_for_message(manager, topic, actual_timeout)
+        manager.send({"op": "unsubscribe", "topic": topic})
+
+    if "error" in msg_data:
+        return msg_data
+
+    from utils.depth_stats import depth_in_meters, grid_stats
+
+    msg = msg_data.get("msg", {})
+    encoding = msg.get("encoding", "")
+    if encoding not in DEPTH_ENCODINGS:
+        return {"error": f"{topic} has encoding '{encoding}', expected one of {', '.join(DEPTH_ENCODINGS)}"}
+    image = decode_image(msg)
+    if image is None:
+        return {"error": f"Failed to decode the depth image of {topic}"}
+
+    try:
+        stats = grid_stats(depth_in_meters(image, encoding), rows, cols, roi, min_range_m, max_range_m)
+    except ValueError as e:
+        return {"error": str(e)}
+    return {"topic": topic, "width": image.shape[1], "height": image.shape[0], "encoding": encoding, **stats}
+
+
+## ############################################################################################## ##
+##
+##                       RECORDING
+##
+## ############################################################################################## ##
+
+RECORDINGS_DIR = "./recordings"
+
+
+def _recording_path(path: str) -> Optional[str]:
+    """
+    Resolve a recording path given to a tool, which must stay within RECORDINGS_DIR.
+    Relative paths are tried from the working directory ('./recordings/walk.frec'), then from RECORDINGS_DIR
+    ('walk.frec').
+
+    Returns:
+        The resolved path, or None if it is outside RECORDINGS_DIR or goes through '..'.
+    """
+    if ".." in path.replace("\\", "/").split("/"):
+        return None
+    root = os.path.realpath(RECORDINGS_DIR)
+    candidates = [path] if os.path.isabs(path) else [path, os.path.join(RECORDINGS_DIR, path)]
+    for candidate in candidates:
+        resolved = os.path.realpath(candidate)
+        if os.path.commonpath([root, resolved]) == root and resolved != root:
+            return resolved
+    return None
+
+
+@mcp.tool(
+    description=(
+        "Record ROS topics to a file for later analysis or replay.\n"
+        "Example:\n"
+        "record_topics(topics=['/odom', '/cmd_vel'], duration=30.0)\n"
+        "record_topics(topics=['/camera/image_raw'], duration=10.0, image_codec='png')  # Compress images losslessly"
+    )
+)
+def record_topics(
+    topics: list[str],
+    duration: float = 10.0,
+    path: Optional[str] = None,
+    image_codec: str = "raw",
+    max_messages: Optional[int] = None,
+    throttle_rate_ms: int = 0,
+) -> dict:
+    """
+    Record ROS topics to a chunked columnar file (see utils/recording.py).
+
+    Args:
+        topics (list[str]): Topics to record; their types are looked up with rosapi
+        duration (float): Recording duration in seconds
+        path (Optional[str]): Output file, within './recordings'. Default = './recordings/<date>-<time>.frec'
+        image_codec (str): 'raw', 'png' or 'jpeg' for the pixels of sensor_msgs/Image topics
+        max_messages (Optional[int]): Stop after this many messages in total
+        throttle_rate_ms (int): Minimum interval between messages of a topic. Default = 0 (every message)
+
+    Returns:
+        dict:
+            {
+                "path": output_file,
+                "duration_s": ...,
+                "bytes": file_size,
+                "topics": {topic: {"type": ..., "count": ...}, ...},
+                "status_errors": [...]
+            }
+            OR {"error": "<error message>"}
+    """
+    from utils.recording import IMAGE_CODECS, RecordingError, RecordingWriter, record, topic_types
+
+    if not topics or duration <= 0:
+        return {"error": "topics must not be empty and duration must be positive"}
+    if image_codec not in IMAGE_CODECS:
+        return {"error": f"image_codec must be one of {', '.join(IMAGE_CODECS)}"}
+
+    requested = path or os.path.join(RECORDINGS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".frec")
+    path = _recording_path(requested)
+    if path is None:
+        return {"error": f"Recordings must be written within {RECORDINGS_DIR}, not to {requested}"}
+    manager = _manager_for()
+    with manager:
+        types = topic_types(manager)
+        if not types:
+            return {"error": "Failed to get the topic types from rosapi"}
+        unknown = [t for t in topics if t not in types]
+        if unknown:
+            return {"error": f"Unknown topics: {', '.join(unknown)}"}
+
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with RecordingWriter(path, image_codec=image_codec) as writer:
+                result = record(
+                    manager, {t: types[t] for t in topics}, writer, duration, max_messages, throttle_rate_ms
+                )
+        except (OSError, RecordingError) as e:
+            return {"error": f"Failed to write {path}: {e}"}
+
+    if "error" in result:
+        return result
+    return {"path": path, "bytes": os.path.getsize(path), **result}
+
+
+@mcp.tool(
+    description=(
+        "Replay a recording made with record_topics, with the original timing.\n"
+        "Example:\n"
+        "replay_recording(path='./recordings/20260101-120000.frec')\n"
+        "replay_recording(path='./recordings/20260101-120000.frec', topics=['/cmd_vel'], speed=2.0)  # Twice as fast\n"
+        "replay_recording(path='./recordings/20260101-120000.frec', speed=0)  # As fast as possible"
+    )
+)
+def replay_recording(
+    path: str,
+    topics: Optional[list[str]] = None,
+    speed: float = 1.0,
+    start_s: float = 0.0,
+    end_s: Optional[float] = None,
+    repeat: int = 1,
+    restamp: bool = False,
+) -> dict:
+    """
+    Publish the messages of a recording on rosbridge, on their recorded topics.
+
+    Args:
+        path (str): Recording file, within './recordings'
+        topics (Optional[list[str]]): Topics to replay. Default = all recorded topics
+        speed (float): Time multiplier; 0 replays as fast as possible. Default = 1.0
+        start_s (float): Offset from the beginning of the recording where the replay starts
+        end_s (Optional[float]): Offset from the beginning of the recording where the replay ends
+        repeat (int): Number of times the recording is replayed
+        restamp (bool): Set header stamps to the publication time
+
+    Returns:
+        dict:
+            {
+                "duration_s": ...,
+                "published": ...,
+                "topics": {topic: {"type": ..., "count": ...}, ...},
+                "timing": {"mean_lag_ms": ..., "max_lag_ms": ..., "late_messages": ...},
+                "status_errors": [...]
+            }
+            OR {"error": "<error message>"}
+    """
+    from utils.recording import RecordingError, RecordingReader
+    from utils.replay import replay
+
+    if speed < 0 or repeat < 1:
+        return {"error": "speed must not be negative and repeat must be at least 1"}
+    requested, path = path, _recording_path(path)
+    if path is None:
+        return {"error": f"Recordings are read from {RECORDINGS_DIR}, not from {requested}"}
+
+    try:
+        reader = RecordingReader(path)
+    except (OSError, RecordingError) as e:
+        return {"error": f"Failed to open {path}: {e}"}
+
+    with reader:
+        first, _ = reader.time_range()
+        if first is None:
+            return {"error": f"{path} contains no messages"}
+        end = first + end_s if end_s is not None else None
+        manager = _manager_for()
+        with manager:
+            return replay(manager, reader, topics, first + start_s, end, speed, repeat, restamp=restamp)
+
+
 ## ############################################################################################## ##
 ##
 ##                       NETWORK DIAGNOSTICS
@@ -576,7 +1529,8 @@ def publish_for_durations(topic: str = "", msg_type: str = "", messages: list =
         "A successful ping to the IP but not the port can indicate that ROSbridge is not running.\n"
         "Example:\n"
         "ping_robot(ip='192.168.1.100', port=9090)"
-    )
+    ),
+    annotations=READ_ONLY,
 )
 def ping_robot(ip: str, port: int, ping_timeout: float = 2.0, port_timeout: float = 2.0) -> dict:
     """
@@ -595,7 +1549,7 @@ def ping_robot(ip: str, port: int, ping_timeout: float = 2.0, port_timeout: floa
 
 
 # IMAGE ANALYSIS
-@mcp.tool()
+@mcp.tool(annotations=READ_ONLY)
 def analyze_previously_received_image():
     """
     Analyze the received image.
@@ -607,6 +1561,8 @@ def analyze_previously_received_image():
     path = "./camera/received_image.png"
     if not os.path.exists(path):
         return {"error": "No previously received image found at ./camera/received_image.png"}
+    from PIL import Image as PILImage
+
     image = PILImage.open(path)
     return _encode_image_to_imagecontent(image)
 
@@ -630,13 +1586,143 @@ def _encode_image_to_imagecontent(image):
     return img_obj.to_image_content()
 
 
-if __name__ == "__main__":
+class FirstRequestTimer(Middleware):
+    """Reports when the first MCP request after `initialize` (usually `tools/list`) reaches the server."""
+
+    def __init__(self, profile: StartupProfile):
+        self.profile = profile
+        self.seen = False
+
+    async def on_request(self, context: MiddlewareContext, call_next):
+        if not self.seen:
+            self.seen = True
+            self.profile.event(f"first request ({context.method})")
+        return await call_next(context)
+
+
+def _camera_topic(request: Request) -> tuple[str, str]:
+    """Topic and type of a camera preview request, e.g. `/camera/stream?topic=/camera/image_raw`."""
+    topic = request.query_params.get("topic", DEFAULT_CAMERA_TOPIC)
+    default_type = "sensor_msgs/msg/CompressedImage" if topic.endswith("/compressed") else "sensor_msgs/msg/Image"
+    return topic, request.query_params.get("type", default_type)
+
+
+async def camera_stream(request: Request) -> Response:
+    """MJPEG stream of a camera topic, to open in a browser or in an `<img>` tag."""
+    broadcaster = mjpeg_hub.broadcaster(*_camera_topic(request))
+    return StreamingResponse(
+        multipart(broadcaster.frames()),
+        media_type=f"multipart/x-mixed-replace; boundary={BOUNDARY}",
+        headers={"Cache-Control": "no-cache, no-store", "X-Accel-Buffering": "no"},
+    )
+
+
+async def camera_snapshot(request: Request) -> Response:
+    """Latest frame of a camera topic, as JPEG."""
+    broadcaster = mjpeg_hub.broadcaster(*_camera_topic(request))
+    async for frame in broadcaster.frames(timeout=CAMERA_SNAPSHOT_TIMEOUT_S):
+        return Response(frame, media_type="image/jpeg", headers={"Cache-Control": "no-cache, no-store"})
+    error = broadcaster.error or f"No image received on {broadcaster.topic}"
+    return JSONResponse({"error": error}, status_code=504)
+
+
+async def camera_stats(request: Request) -> Response:
+    return JSONResponse(mjpeg_hub.stats())
+
+
+def _start_frame_rings(stop: threading.Event) -> list:
+    """
+    Start one thread per `--frame-ring` topic, writing its decoded frames into shared memory.
+
+    Returns:
+        list: (thread, writer) pairs, to stop and release at exit.
+    """
+    from utils.frame_ring import FrameRingWriter, feed, ring_name
+
+    rings = []
+    for topic in args.frame_ring:
+        writer = FrameRingWriter(ring_name(topic), slots=args.frame_ring_slots)
+        if shared_session:
+            channel = image_ros_session.channel("frame-ring")
+        else:
+            # The tools use the image connection in turn, the ring needs a connection of its own
+            channel = WebSocketManager(
+                args.rosbridge_ip,
+                args.rosbridge_port,
+                default_timeout=5.0,
+                compression_level=image_ws_manager.compression_level,
+                link_monitor=ws_manager.link_monitor,
+            )
+        thread = threading.Thread(
+            target=feed,
+            args=(channel, topic, "sensor_msgs/msg/Image", writer, stop),
+            name=f"frame-ring{topic}",
+            daemon=True,
+        )
+        thread.start()
+        logger.info(f"Writing the frames of {topic} to shared memory '{writer.name}'")
+        rings.append((thread, writer))
+    return rings
+
+
+def _check_connection():
+    """
+    Check that the robot is reachable, without delaying the start of the server.
+    The `ping` subprocess takes up to the connection timeout, so it runs in a background thread
+    and a failure is only logged: the tools report connection errors themselves.
+    """
+    start = time.perf_counter()
     ok, err = ws_manager.test_connection()
+    startup_profile.event("connectivity check done", time.perf_counter() - start)
     if not ok:
-        logger.error(err)
-        exit(1)
+        logger.error(f"Robot {args.rosbridge_ip} not reachable: {err}")
 
-    if transport == "http":
-        mcp.run(transport=transport)
-    else:
-        mcp.run(transport="stdio")
+
+def _run_in_thread(fn):
+    """
+    Wrap a synchronous tool so that it runs in a worker thread, tagged with the MCP session id of the caller.
+    Otherwise a tool waiting for messages would block the event loop, and with it all the other clients.
+    """
+
+    @functools.wraps(fn)
+    async def wrapper(*fn_args, **fn_kwargs):
+        client_id.set(get_context().session_id)
+        # The worker thread runs in a copy of the current context, so it sees the client id
+        return await anyio.to_thread.run_sync(functools.partial(fn, *fn_args, **fn_kwargs))
+
+    return wrapper
+
+
+async def _share_tools():
+    for tool in (await mcp.get_tools()).values():
+        tool.fn = _run_in_thread(tool.fn)
+
+
+if __name__ == "__main__":
+    startup_profile.mark("register tools")
+    threading.Thread(target=_check_connection, name="connectivity-check", daemon=True).start()
+
+    if args.profile_startup:
+        mcp.add_middleware(FirstRequestTimer(startup_profile))
+
+    if shared_session:
+        anyio.run(_share_tools)
+        ros_session.start()
+        image_ros_session.start()
+        mcp.custom_route("/camera/stream", methods=["GET"])(camera_stream)
+        mcp.custom_route("/camera/snapshot.jpg", methods=["GET"])(camera_snapshot)
+        mcp.custom_route("/camera/stats", methods=["GET"])(camera_stats)
+    frame_rings_stop = threading.Event()
+    frame_rings = _start_frame_rings(frame_rings_stop) if args.frame_ring else []
+    startup_profile.report()
+
+    try:
+        if args.mcp_transport == "stdio":
+            mcp.run(transport="stdio")
+        else:
+            mcp.run(transport=args.mcp_transport, host=args.mcp_host, port=args.mcp_port)
+    finally:
+        frame_rings_stop.set()
+        for thread, writer in frame_rings:
+            thread.join(timeout=2.0)
+            writer.close()  # removes the shared memory block
@@ -0,0 +1,77 @@
+"""
+Record ROS topics from rosbridge to a recording file, or describe an existing recording.
+
+Usage:
+    python record.py --topics /odom /cmd_vel --duration 30 --output recordings/walk.frec
+    python record.py --topics /camera/image_raw --image-codec png        # until Ctrl+C
+    python record.py --info recordings/walk.frec
+"""
+
+import json
+import os
+import time
+from argparse import ArgumentParser
+
+from utils.recording import IMAGE_CODECS, RecordingReader, RecordingWriter, record, topic_types
+from utils.websocket_manager import WebSocketManager
+
+
+def print_info(path: str):
+    with RecordingReader(path) as reader:
+        start, end = reader.time_range()
+        info = {
+            "path": path,
+            "bytes": os.path.getsize(path),
+            "chunks": len(reader.chunks),
+            "duration_s": (end - start) if start is not None else 0.0,
+            "topics": reader.topics(),
+        }
+    print(json.dumps(info, indent=2))
+
+
+def main():
+    parser = ArgumentParser(description="Record ROS topics through rosbridge.")
+    parser.add_argument("--rosbridge-ip", type=str, default="127.0.0.1", help="defaults to %(default)s")
+    parser.add_argument("--rosbridge-port", type=int, default=9090, help="defaults to %(default)s")
+    parser.add_argument("--topics", nargs="+", default=[], help="Topics to record; all topics if omitted")
+    parser.add_argument(
+        "--duration", type=float, default=None, help="Duration in seconds; records until Ctrl+C if omitted"
+    )
+    parser.add_argument("--max-messages", type=int, default=None, help="Stop after this many messages in total")
+    parser.add_argument("--output", type=str, default=None, help="Defaults to ./recordings/<date>-<time>.frec")
+    parser.add_argument("--image-codec", choices=IMAGE_CODECS, default="raw", help="defaults to %(default)s")
+    parser.add_argument("--throttle-rate-ms", type=int, default=0, help="Minimum interval between messages of a topic")
+    parser.add_argument("--info", type=str, metavar="RECORDING", help="Describe a recording and exit")
+    args = parser.parse_args()
+
+    if args.info:
+        print_info(args.info)
+        return
+
+    manager = WebSocketManager(args.rosbridge_ip, args.rosbridge_port, default_timeout=5.0)
+    with manager:
+        types = topic_types(manager)
+        if not types:
+            parser.exit(1, f"Failed to get the topic types from rosapi at {args.rosbridge_ip}:{args.rosbridge_port}\n")
+        unknown = [t for t in args.topics if t not in types]
+        if unknown:
+            parser.exit(1, f"Unknown topics: {', '.join(unknown)}\n")
+        topics = {t: types[t] for t in args.topics} if args.topics else types
+
+        output = args.output or os.path.join("recordings", time.strftime("%Y%m%d-%H%M%S") + ".frec")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        print(f"Recording {len(topics)} topics to {output}, Ctrl+C to stop")
+        with RecordingWriter(output, image_codec=args.image_codec) as writer:
+            try:
+                result = record(manager, topics, writer, args.duration, args.max_messages, args.throttle_rate_ms)
+            except KeyboardInterrupt:
+                result = {"topics": {t: {"type": topics[t], "count": writer.counts.get(t, 0)} for t in topics}}
+
+    if "error" in result:
+        parser.exit(1, result["error"] + "\n")
+    print(json.dumps(result, indent=2))
+    print_info(output)
+
+
+if __name__ == "__main__":
+    main()
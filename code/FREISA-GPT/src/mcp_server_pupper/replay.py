@@ -0,0 +1,88 @@
+"""
+Replay a recording made with record.py (or the record_topics tool) into rosbridge.
+
+Usage:
+    python replay.py recordings/walk.frec                           # original timing
+    python replay.py recordings/walk.frec --speed 4 --topics /odom  # four times faster
+    python replay.py recordings/walk.frec --speed 0 --repeat 10     # as fast as possible, e.g. for load tests
+    python replay.py recordings/walk.frec --remap /cmd_vel:=/sim/cmd_vel
+"""
+
+import json
+import threading
+from argparse import ArgumentParser
+
+from utils.recording import RecordingReader
+from utils.replay import replay
+from utils.websocket_manager import WebSocketManager
+
+
+def main():
+    parser = ArgumentParser(description="Replay a recording into rosbridge.")
+    parser.add_argument("recording", type=str, help="Recording file")
+    parser.add_argument("--rosbridge-ip", type=str, default="127.0.0.1", help="defaults to %(default)s")
+    parser.add_argument("--rosbridge-port", type=int, default=9090, help="defaults to %(default)s")
+    parser.add_argument("--topics", nargs="+", default=None, help="Topics to replay; all recorded topics if omitted")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="Time multiplier, 0 for as fast as possible; defaults to %(default)s"
+    )
+    parser.add_argument("--start", type=float, default=0.0, help="Offset in seconds where the replay starts")
+    parser.add_argument("--end", type=float, default=None, help="Offset in seconds where the replay ends")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of times the recording is replayed")
+    parser.add_argument(
+        "--remap", nargs="+", default=[], metavar="FROM:=TO", help="Publish a recorded topic on another topic"
+    )
+    parser.add_argument("--restamp", action="store_true", help="Set header stamps to the publication time")
+    args = parser.parse_args()
+
+    remap = {}
+    for rule in args.remap:
+        source, sep, target = rule.partition(":=")
+        if not sep or not source or not target:
+            parser.error(f"Invalid remapping {rule!r}, expected FROM:=TO")
+        remap[source] = target
+
+    stop = threading.Event()
+    with RecordingReader(args.recording) as reader:
+        first, last = reader.time_range()
+        if first is None:
+            parser.exit(1, f"{args.recording} contains no messages\n")
+        end = first + args.end if args.end is not None else None
+        print(f"Replaying {last - first:.1f} s of {args.recording} at speed {args.speed or 'max'}, Ctrl+C to stop")
+
+        manager = WebSocketManager(args.rosbridge_ip, args.rosbridge_port, default_timeout=5.0)
+        with manager:
+            # Replay in a thread so that Ctrl+C stops it between two messages, then unadvertises
+            results = []
+            worker = threading.Thread(
+                target=lambda: results.append(
+                    replay(
+                        manager,
+                        reader,
+                        args.topics,
+                        first + args.start,
+                        end,
+                        args.speed,
+                        args.repeat,
+                        remap,
+                        args.restamp,
+                        stop,
+                    )
+                )
+            )
+            worker.start()
+            try:
+                while worker.is_alive():
+                    worker.join(0.2)
+            except KeyboardInterrupt:
+                stop.set()
+                worker.join()
+
+    result = results[0] if results else {"error": "Replay failed"}
+    if "error" in result:
+        parser.exit(1, result["error"] + "\n")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Minimal CBOR (RFC 8949) decoder for rosbridge messages sent with `"compression": "cbor"`.
+
+rosbridge encodes `uint8[]` fields as byte strings and other numeric arrays as
+RFC 8746 typed arrays, which are decoded here into NumPy arrays without copying
+element by element. NumPy is only imported once a typed array is met.
+"""
+
+import struct
+from typing import Any, Tuple
+
+# RFC 8746 typed array tags -> NumPy dtype
+TYPED_ARRAY_TAGS = {
+    64: "u1",
+    65: ">u2",
+    66: ">u4",
+    67: ">u8",
+    68: "u1",  # uint8, clamped
+    69: "<u2",
+    70: "<u4",
+    71: "<u8",
+    72: "i1",
+    73: ">i2",
+    74: ">i4",
+    75: ">i8",
+    77: "<i2",
+    78: "<i4",
+    79: "<i8",
+    81: ">f4",
+    82: ">f8",
+    85: "<f4",
+    86: "<f8",
+}
+
+_BREAK = object()
+
+
+class CBORDecodeError(ValueError):
+    pass
+
+
+def loads(data: bytes) -> Any:
+    """
+    Decode a single CBOR data item.
+
+    Args:
+        data (bytes): CBOR encoded payload
+
+    Returns:
+        The decoded Python object; typed arrays are returned as NumPy arrays.
+
+    Raises:
+        CBORDecodeError: If the payload is truncated or malformed.
+    """
+    try:
+        value, offset = _decode(memoryview(data), 0)
+    except (IndexError, struct.error) as e:
+        raise CBORDecodeError(f"Truncated CBOR payload: {e}") from e
+    if value is _BREAK:
+        raise CBORDecodeError("Unexpected break code")
+    return value
+
+
+def _read_argument(buf: memoryview, offset: int, info: int) -> Tuple[int, int]:
+    if info < 24:
+        return info, offset
+    if info == 24:
+        return buf[offset], offset + 1
+    if info == 25:
+        return struct.unpack_from(">H", buf, offset)[0], offset + 2
+    if info == 26:
+        return struct.unpack_from(">I", buf, offset)[0], offset + 4
+    if info == 27:
+        return struct.unpack_from(">Q", buf, offset)[0], offset + 8
+    raise CBORDecodeError(f"Invalid additional information {info}")
+
+
+def _decode(buf: memoryview, offset: int) -> Tuple[Any, int]:
+    initial = buf[offset]
+    offset += 1
+    major, info = initial >> 5, initial & 0x1F
+
+    if major == 7:
+        if info == 20:
+            return False, offset
+        if info == 21:
+            return True, offset
+        if info in (22, 23):
+            return None, offset
+        if info == 25:
+            return struct.unpack_from(">e", buf, offset)[0], offset + 2
+        if info == 26:
+            return struct.unpack_from(">f", buf, offset)[0], offset + 4
+        if info == 27:
+            return struct.unpack_from(">d", buf, offset)[0], offset + 8
+        if info == 31:
+            return _BREAK, offset
+        value, offset = _read_argument(buf, offset, info)
+        return value, offset  # unassigned simple value
+
+    if info == 31:
+        return _decode_indefinite(buf, offset, major)
+
+    value, offset = _read_argument(buf, offset, info)
+    if major == 0:
+        return value, offset
+    if major == 1:
+        return -1 - value, offset
+    if major == 2:
+        return bytes(buf[offset : offset + value]), offset + value
+    if major == 3:
+        return str(buf[offset : offset + value], "utf-8"), offset + value
+    if major == 4:
+        items = []
+        for _ in range(value):
+            item, offset = _decode(buf, offset)
+            items.append(item)
+        return items, offset
+    if major == 5:
+        result = {}
+        for _ in range(value):
+            key, offset = _decode(buf, offset)
+            result[key], offset = _decode(buf, offset)
+        return result, offset
+
+    # major == 6: tagged item
+    item, offset = _decode(buf, offset)
+    dtype = TYPED_ARRAY_TAGS.get(value)
+    if dtype is not None and isinstance(item, bytes):
+        import numpy as np
+
+        return np.frombuffer(item, dtype=dtype), offset
+    return item, offset
+
+
+def _decode_indefinite(buf: memoryview, offset: int, major: int) -> Tuple[Any, int]:
+    if major in (2, 3):
+        chunks = []
+        while True:
+            chunk, offset = _decode(buf, offset)
+            if chunk is _BREAK:
+                break
+            chunks.append(chunk)
+        return (b"".join(chunks) if major == 2 else "".join(chunks)), offset
+    if major == 4:
+        items = []
+        while True:
+            item, offset = _decode(buf, offset)
+            if item is _BREAK:
+                return items, offset
+            items.append(item)
+    if major == 5:
+        result = {}
+        while True:
+            key, offset = _decode(buf, offset)
+            if key is _BREAK:
+                return result, offset
+            result[key], offset = _decode(buf, offset)
+    raise CBORDecodeError(f"Indefinite length not allowed for major type {major}")
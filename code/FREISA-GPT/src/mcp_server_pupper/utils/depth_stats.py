@@ -0,0 +1,91 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Depth encodings in millimeters; the others (32FC1) are in meters
+MILLIMETER_ENCODINGS = ("16UC1", "mono16")
+
+
+def depth_in_meters(image: np.ndarray, encoding: str) -> np.ndarray:
+    """
+    Convert a depth image decoded by `decode_image` to float32 meters, with invalid pixels as NaN.
+
+    Invalid pixels are 0 in 16UC1 images, and 0, NaN or ±inf in 32FC1 images.
+    """
+    depth = image.astype(np.float32)
+    if encoding in MILLIMETER_ENCODINGS:
+        depth *= np.float32(0.001)
+    depth[~np.isfinite(depth) | (depth <= 0)] = np.nan
+    return depth
+
+
+def grid_stats(
+    depth: np.ndarray,
+    rows: int,
+    cols: int,
+    roi: Optional[Sequence[float]] = None,
+    min_range_m: float = 0.0,
+    max_range_m: Optional[float] = None,
+) -> Dict:
+    """
+    Median, minimum and ratio of valid pixels of each cell of a grid laid over a depth image.
+
+    The cells are computed all at once: the ROI is cropped to a multiple of the grid size (dropping
+    fewer than `rows` and `cols` pixels), reshaped to one row of pixels per cell and sorted, with
+    the invalid pixels sorted last as +inf.
+
+    Args:
+        depth (np.ndarray): Depth in meters, NaN for invalid pixels (see `depth_in_meters`)
+        rows (int): Number of grid rows, top to bottom
+        cols (int): Number of grid columns, left to right
+        roi (Optional[Sequence[float]]): [left, top, right, bottom] as fractions of the image; the whole image if None
+        min_range_m (float): Depths below this are invalid
+        max_range_m (Optional[float]): Depths above this are invalid
+
+    Returns:
+        dict: "median_m", "min_m" and "valid_ratio" grids (rows x cols lists, None for cells without
+            valid pixels), and the nearest cell.
+
+    Raises:
+        ValueError: If the ROI is empty or smaller than the grid.
+    """
+    height, width = depth.shape
+    left, top, right, bottom = roi if roi is not None else (0.0, 0.0, 1.0, 1.0)
+    x0, x1 = int(round(left * width)), int(round(right * width))
+    y0, y1 = int(round(top * height)), int(round(bottom * height))
+    cell_h, cell_w = (y1 - y0) // rows, (x1 - x0) // cols
+    if cell_h < 1 or cell_w < 1:
+        raise ValueError(f"ROI of {x1 - x0}x{y1 - y0} pixels is too small for a {rows}x{cols} grid")
+
+    crop = depth[y0 : y0 + rows * cell_h, x0 : x0 + cols * cell_w]
+    cells = crop.reshape(rows, cell_h, cols, cell_w).transpose(0, 2, 1, 3).reshape(rows * cols, cell_h * cell_w)
+    valid = np.isfinite(cells) & (cells >= min_range_m)
+    if max_range_m is not None:
+        valid &= cells <= max_range_m
+
+    ordered = np.sort(np.where(valid, cells, np.inf), axis=1)
+    counts = valid.sum(axis=1)
+    index = np.arange(rows * cols)
+    # Median of the `counts` valid values at the start of each sorted row
+    lower = ordered[index, np.maximum(counts - 1, 0) // 2]
+    upper = ordered[index, counts // 2]
+    medians = np.where(counts > 0, (lower + upper) / 2.0, np.nan)
+    minimums = np.where(counts > 0, ordered[:, 0], np.nan)
+    ratios = counts / float(cell_h * cell_w)
+
+    def to_grid(values: np.ndarray, digits: int) -> List[List[Optional[float]]]:
+        return [[None if np.isnan(v) else round(float(v), digits) for v in row] for row in values.reshape(rows, cols)]
+
+    result = {
+        "rows": rows,
+        "cols": cols,
+        "roi_px": [x0, y0, x0 + cols * cell_w, y0 + rows * cell_h],
+        "median_m": to_grid(medians, 3),
+        "min_m": to_grid(minimums, 3),
+        "valid_ratio": to_grid(ratios, 2),
+        "nearest": None,
+    }
+    if (counts > 0).any():
+        cell = int(np.nanargmin(medians))
+        result["nearest"] = {"row": cell // cols, "col": cell % cols, "median_m": round(float(medians[cell]), 3)}
+    return result
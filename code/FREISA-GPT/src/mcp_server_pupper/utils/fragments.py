@@ -0,0 +1,123 @@
+import time
+from typing import Dict, List, Optional
+
+
+class _PartialMessage:
+    """
+    A message being reassembled, with a slot for each fragment preallocated from the fragment count.
+    Sizes are in characters, as rosbridge slices the serialized message.
+    """
+
+    def __init__(self, total: int, chunk_len: int, now: float):
+        self.total = total
+        self.chunk_len = chunk_len
+        self.chunks: List[Optional[str]] = [None] * total
+        self.count = 0
+        self.last_update = now
+
+    def add(self, num: int, chunk: str, now: float) -> bool:
+        """
+        Put a fragment into place.
+
+        Returns:
+            bool: True once all the fragments have been received.
+        """
+        if self.chunks[num] is not None:
+            return self.count == self.total  # duplicate fragment
+        if len(chunk) > self.chunk_len or (num < self.total - 1 and len(chunk) != self.chunk_len):
+            raise ValueError(f"Fragment {num} has size {len(chunk)}, expected {self.chunk_len}")
+
+        self.chunks[num] = chunk
+        self.count += 1
+        self.last_update = now
+        return self.count == self.total
+
+
+class FragmentAssembler:
+    """
+    Reassembles rosbridge `fragment` messages into the original JSON message.
+
+    rosbridge splits a serialized message longer than the `fragment_size` requested on subscribe into
+    fragments of exactly `fragment_size` characters (the last one being shorter), all sharing the same id.
+    Fragments of different messages may interleave; messages left incomplete for longer than `timeout_s`
+    are evicted.
+    """
+
+    def __init__(self, timeout_s: float = 5.0, max_pending: int = 32):
+        self.timeout_s = timeout_s
+        self.max_pending = max_pending
+        self.pending: Dict[str, _PartialMessage] = {}
+        # Last fragments received before any other fragment of their message, which gives the chunk size
+        self.early_last: Dict[str, tuple] = {}
+        self.evicted = 0
+
+    def add(self, fragment: dict, now: Optional[float] = None) -> Optional[str]:
+        """
+        Add a fragment.
+
+        Args:
+            fragment (dict): A parsed rosbridge message with `"op": "fragment"`.
+            now (Optional[float]): Current monotonic time; defaults to `time.monotonic()`.
+
+        Returns:
+            The reassembled message string when `fragment` completes it, None otherwise.
+        """
+        now = time.monotonic() if now is None else now
+        self.evict(now)
+
+        msg_id = str(fragment.get("id"))
+        num, total = fragment.get("num"), fragment.get("total")
+        data = fragment.get("data")
+        if not isinstance(num, int) or not isinstance(total, int) or not 0 <= num < total or not isinstance(data, str):
+            print(f"[WebSocket] Invalid fragment {num}/{total} for message {msg_id}")
+            return None
+        chunk = data
+
+        if total == 1:
+            return data
+
+        partial = self.pending.get(msg_id)
+        if partial is None:
+            if num == total - 1:
+                # The chunk size is only known from a non-last fragment
+                self.early_last[msg_id] = (chunk, now)
+                return None
+            if len(self.pending) >= self.max_pending:
+                oldest = min(self.pending, key=lambda k: self.pending[k].last_update)
+                self._drop(oldest)
+            partial = self.pending[msg_id] = _PartialMessage(total, len(chunk), now)
+            early = self.early_last.pop(msg_id, None)
+        else:
+            early = None
+
+        try:
+            if early is not None:
+                partial.add(total - 1, early[0], now)
+            complete = partial.add(num, chunk, now)
+        except ValueError as e:
+            print(f"[WebSocket] Dropping message {msg_id}: {e}")
+            self._drop(msg_id)
+            return None
+
+        if not complete:
+            return None
+        del self.pending[msg_id]
+        return "".join(partial.chunks)
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """
+        Drop the messages that received no fragment for longer than the timeout.
+
+        Returns:
+            int: Number of evicted messages.
+        """
+        now = time.monotonic() if now is None else now
+        expired = [k for k, p in self.pending.items() if now - p.last_update > self.timeout_s]
+        expired += [k for k, (_, t) in self.early_last.items() if now - t > self.timeout_s]
+        for msg_id in expired:
+            self._drop(msg_id)
+        return len(expired)
+
+    def _drop(self, msg_id: str):
+        if self.pending.pop(msg_id, None) is not None or self.early_last.pop(msg_id, None) is not None:
+            self.evicted += 1
@@ -0,0 +1,294 @@
+"""
+Hand-off of decoded camera frames to other processes of the same host, through shared memory.
+
+The MCP server decodes the frames of a topic once and writes them into a ring of slots in a
+`multiprocessing.shared_memory` block named after the topic (see `ring_name`). Readers map the
+same block and get the frames as NumPy arrays, copied or as views of the shared memory.
+
+Layout::
+
+    RING_HEADER  magic, slot count, slot data size, number of the latest frame (0 if none)
+    slot 0       SLOT_HEADER (seq, stamp, nbytes, height, width, channels, dtype, encoding), pixels
+    slot 1       ...
+
+Each slot is protected by a sequence lock: the writer makes `seq` odd while it rewrites the slot and
+even (2 x frame number) once done, and a reader retries when `seq` is odd or changed during its read,
+so it never returns a torn frame. The writer never waits for readers.
+
+Reader example::
+
+    with FrameRingReader(ring_name("/camera/image_raw")) as ring:
+        frame = ring.wait(timeout=1.0)
+        if frame is not None:
+            print(frame.seq, frame.encoding, frame.array.shape)
+"""
+
+import re
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from .websocket_manager import decode_image, decode_message
+
+RING_MAGIC = b"FRRING\x00\x01"
+# magic, slot count, slot data size, latest frame number
+RING_HEADER = struct.Struct("<8sIIQ")
+LATEST_OFFSET = 16
+# seq, stamp, nbytes, height, width, channels, (padding), dtype, encoding
+SLOT_HEADER = struct.Struct("<QdQIII4x8s16s")
+SEQ = struct.Struct("<Q")
+SLOT_ALIGN = 64
+
+# Resubscribe when a topic has been silent for this long, e.g. after a reconnection
+RESUBSCRIBE_AFTER_S = 5.0
+
+
+class Frame(NamedTuple):
+    seq: int
+    stamp: float
+    encoding: str
+    array: np.ndarray
+
+
+def ring_name(topic: str) -> str:
+    """Shared memory name of the ring of a topic, e.g. '/camera/image_raw' -> 'freisa_camera_image_raw'."""
+    return "freisa" + re.sub(r"[^A-Za-z0-9]+", "_", topic).rstrip("_")
+
+
+def _slot_offset(slot: int, slot_bytes: int) -> int:
+    return RING_HEADER.size + slot * (SLOT_HEADER.size + slot_bytes)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing block without registering it for removal when this process exits."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        from multiprocessing import resource_tracker
+
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class FrameRingWriter:
+    """
+    Writes frames into a shared memory ring, created on the first frame with slots of its size.
+
+    Args:
+        name (str): Shared memory name, see `ring_name`
+        slots (int): Number of frames kept; a reader holding a view has `slots - 1` frames of time to use it
+    """
+
+    def __init__(self, name: str, slots: int = 4):
+        self.name = name
+        self.slots = slots
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self.slot_bytes = 0
+        self.count = 0
+        self.skipped = 0
+
+    def _create(self, slot_bytes: int):
+        size = _slot_offset(self.slots, slot_bytes)
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            # Left over by a server that did not exit cleanly
+            stale = _attach(self.name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        self.slot_bytes = slot_bytes
+        RING_HEADER.pack_into(self.shm.buf, 0, RING_MAGIC, self.slots, slot_bytes, 0)
+
+    def write(self, array: np.ndarray, stamp: float, encoding: str) -> bool:
+        """
+        Write a frame (height x width or height x width x channels).
+
+        Returns:
+            bool: False if the frame is larger than the slots, which are sized on the first frame.
+        """
+        if self.shm is None:
+            # Slots are rounded up so that every slot header stays aligned
+            self._create(-(-(array.nbytes + SLOT_HEADER.size) // SLOT_ALIGN) * SLOT_ALIGN - SLOT_HEADER.size)
+        if array.nbytes > self.slot_bytes:
+            self.skipped += 1
+            return False
+
+        number = self.count + 1
+        offset = _slot_offset(number % self.slots, self.slot_bytes)
+        buf = self.shm.buf
+        SEQ.pack_into(buf, offset, 2 * number - 1)  # odd: slot being written
+        target = np.ndarray(array.shape, array.dtype, buffer=buf, offset=offset + SLOT_HEADER.size)
+        np.copyto(target, array)
+        del target  # no view may outlive the block
+        height, width = array.shape[:2]
+        channels = array.shape[2] if array.ndim == 3 else 1
+        SLOT_HEADER.pack_into(
+            buf,
+            offset,
+            2 * number - 1,
+            stamp,
+            array.nbytes,
+            height,
+            width,
+            channels,
+            array.dtype.str.encode("ascii"),
+            encoding.encode("ascii")[:16],
+        )
+        SEQ.pack_into(buf, offset, 2 * number)
+        SEQ.pack_into(buf, LATEST_OFFSET, number)
+        self.count = number
+        return True
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class FrameRingReader:
+    """
+    Reads the frames written by a `FrameRingWriter` of another process.
+
+    Args:
+        name (str): Shared memory name, see `ring_name`
+
+    Raises:
+        FileNotFoundError: If no ring of this name exists (yet).
+        ValueError: If the block is not a frame ring.
+    """
+
+    def __init__(self, name: str):
+        self.shm = _attach(name)
+        magic, self.slots, self.slot_bytes, _ = RING_HEADER.unpack_from(self.shm.buf, 0)
+        if magic != RING_MAGIC:
+            self.shm.close()
+            raise ValueError(f"{name} is not a frame ring")
+        self.last_seq = 0
+
+    def latest_seq(self) -> int:
+        return SEQ.unpack_from(self.shm.buf, LATEST_OFFSET)[0]
+
+    def latest(self, copy: bool = True, retries: int = 10) -> Optional[Frame]:
+        """
+        Read the latest frame.
+
+        Args:
+            copy (bool): Return a copy; otherwise the array is a view of the shared memory, which stays
+                valid until the writer reuses the slot, see `is_valid`
+            retries (int): Attempts when the slot is overwritten during the read
+
+        Returns:
+            Frame, or None if no frame was written yet or every attempt was overtaken by the writer.
+        """
+        buf = self.shm.buf
+        for _ in range(retries):
+            number = self.latest_seq()
+            if number == 0:
+                return None
+            offset = _slot_offset(number % self.slots, self.slot_bytes)
+            seq, stamp, nbytes, height, width, channels, dtype, encoding = SLOT_HEADER.unpack_from(buf, offset)
+            if seq != 2 * number:
+                continue  # being rewritten for a newer frame
+            shape = (height, width, channels) if channels > 1 else (height, width)
+            array = np.ndarray(
+                shape, np.dtype(dtype.rstrip(b"\x00").decode()), buffer=buf, offset=offset + SLOT_HEADER.size
+            )
+            if copy:
+                array = array.copy()
+            if SEQ.unpack_from(buf, offset)[0] != seq:
+                continue  # torn read
+            self.last_seq = number
+            return Frame(number, stamp, encoding.rstrip(b"\x00").decode(), array)
+        return None
+
+    def is_valid(self, frame: Frame) -> bool:
+        """Whether the slot of a frame read without copy still holds that frame."""
+        offset = _slot_offset(frame.seq % self.slots, self.slot_bytes)
+        return SEQ.unpack_from(self.shm.buf, offset)[0] == 2 * frame.seq
+
+    def wait(self, timeout: Optional[float] = None, copy: bool = True, poll_s: float = 0.002) -> Optional[Frame]:
+        """Wait for a frame newer than the last one read, then read it. Returns None on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.latest_seq() <= self.last_seq:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_s)
+        return self.latest(copy)
+
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # views returned with copy=False still map the block; it is unmapped once they are freed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def feed(channel, topic: str, msg_type: str, writer: FrameRingWriter, stop: threading.Event, throttle_rate_ms: int = 0):
+    """
+    Subscribe to an image topic and write every decoded frame into a ring, until `stop` is set.
+
+    Args:
+        channel: `WebSocketManager` or session channel dedicated to this topic
+        topic (str): Image topic
+        msg_type (str): Its type, 'sensor_msgs/msg/Image'
+        writer (FrameRingWriter): Destination ring
+        stop (threading.Event): Set to end the subscription
+        throttle_rate_ms (int): Minimum interval between frames
+    """
+    subscribe_msg = {
+        "op": "subscribe",
+        "topic": topic,
+        "type": msg_type,
+        "throttle_rate": throttle_rate_ms,
+        "queue_length": 1,
+        "compression": "cbor",
+    }
+    unsubscribe_msg = {"op": "unsubscribe", "topic": topic}
+    last_message = 0.0
+    subscribed = False
+    with channel:
+        while not stop.is_set():
+            if time.monotonic() - last_message > RESUBSCRIBE_AFTER_S:
+                if subscribed:
+                    # Drop the previous subscription first, which is still there if the topic only paused
+                    channel.send(unsubscribe_msg)
+                    subscribed = False
+                if channel.send(subscribe_msg):
+                    stop.wait(1.0)
+                    continue
+                subscribed = True
+                last_message = time.monotonic()
+
+            msg_data = decode_message(channel.receive(timeout=0.5))
+            if not msg_data or msg_data.get("op") != "publish" or msg_data.get("topic") != topic:
+                continue
+            last_message = time.monotonic()
+            msg = msg_data.get("msg", {})
+            image = decode_image(msg)
+            if image is None:
+                continue
+            header_stamp = msg.get("header", {}).get("stamp", {})
+            sec = header_stamp.get("sec", header_stamp.get("secs"))
+            nanosec = header_stamp.get("nanosec", header_stamp.get("nsecs", 0))
+            stamp = sec + nanosec * 1e-9 if sec is not None else time.time()
+            # decode_image converts color images to BGR
+            writer.write(image, stamp, "bgr8" if image.ndim == 3 else msg.get("encoding", ""))
+        channel.send(unsubscribe_msg)
@@ -0,0 +1,195 @@
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+# Compression modes supported by rosbridge for outgoing messages
+COMPRESSIONS = ("none", "png", "cbor")
+
+# Message types carrying large binary arrays, which are much smaller as CBOR than as base64 JSON
+BINARY_TYPES = ("Image", "CompressedImage", "PointCloud2", "LaserScan", "OccupancyGrid")
+
+# Expected wire size (bytes) of a message before any has been measured on the topic
+DEFAULT_SIZES = {"Image": 900_000, "PointCloud2": 1_000_000, "CompressedImage": 60_000, "LaserScan": 8_000}
+DEFAULT_SIZE = 1_000
+
+# Below this throughput (bytes/s) JSON messages are worth PNG-compressing on the rosbridge side
+SLOW_LINK_BPS = 500_000
+PNG_MIN_SIZE = 2_000
+
+# Fraction of the measured throughput a single subscription is allowed to use
+LINK_BUDGET = 0.5
+
+# Fragments are sized to take about this long on the link, so that small control messages
+# can be interleaved between the fragments of a large message
+FRAGMENT_TIME_S = 0.05
+MIN_FRAGMENT_SIZE = 16_384
+MAX_FRAGMENT_SIZE = 1_048_576
+
+
+class LinkMonitor:
+    """
+    Continuously estimates the quality of the rosbridge link from the traffic going through it.
+
+    Round-trip time is sampled on every request/response exchange, throughput on every large
+    frame received, and the wire size of each topic is tracked per message. All estimates are
+    exponentially weighted moving averages.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.2,
+        min_transfer_bytes: int = 16_384,
+        min_transfer_s: float = 0.005,
+        idle_factor: float = 2.0,
+        max_rejected: int = 8,
+    ):
+        self.alpha = alpha
+        self.min_transfer_bytes = min_transfer_bytes
+        self.min_transfer_s = min_transfer_s
+        self.idle_factor = idle_factor
+        self.max_rejected = max_rejected
+        self.rejected_bps: List[float] = []  # throughput of the samples ignored in a row
+        self.rtt_s: Optional[float] = None
+        self.throughput_bps: Optional[float] = None
+        self.topic_sizes: Dict[str, float] = {}
+        self.last_update = 0.0
+        self.lock = threading.Lock()
+
+    def _ewma(self, current: Optional[float], sample: float) -> float:
+        return sample if current is None else (1 - self.alpha) * current + self.alpha * sample
+
+    def record_rtt(self, rtt_s: float):
+        with self.lock:
+            self.rtt_s = self._ewma(self.rtt_s, rtt_s)
+            self.last_update = time.monotonic()
+
+    def record_transfer(self, nbytes: int, elapsed_s: float, back_to_back: bool = False):
+        """
+        Record the reception of a frame. Small or already-buffered frames say nothing about
+        the link capacity and are ignored, so the estimate errs on the conservative side.
+
+        The time waited for a frame also counts the time the link was idle before it was sent.
+        Unless the frame was sent right after the previous one (`back_to_back`, like the fragments
+        of a message), it is ignored when it took more than `idle_factor` times as long as the
+        current estimate predicts. After `max_rejected` such frames in a row the link is taken to
+        have slowed down, and the fastest of them is recorded.
+        """
+        if nbytes < self.min_transfer_bytes or elapsed_s < self.min_transfer_s:
+            return
+        sample_bps = nbytes / elapsed_s
+        with self.lock:
+            expected_s = nbytes / self.throughput_bps if self.throughput_bps else None
+            if not back_to_back and expected_s is not None and elapsed_s > self.idle_factor * expected_s:
+                self.rejected_bps.append(sample_bps)
+                if len(self.rejected_bps) < self.max_rejected:
+                    return
+                sample_bps = max(self.rejected_bps)
+            self.rejected_bps.clear()
+            self.throughput_bps = self._ewma(self.throughput_bps, sample_bps)
+            self.last_update = time.monotonic()
+
+    def record_message(self, topic: str, nbytes: int):
+        with self.lock:
+            self.topic_sizes[topic] = self._ewma(self.topic_sizes.get(topic), nbytes)
+
+    def is_stale(self, max_age_s: float) -> bool:
+        return self.rtt_s is None or time.monotonic() - self.last_update > max_age_s
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                "rtt_ms": self.rtt_s * 1000.0 if self.rtt_s is not None else None,
+                "throughput_bps": self.throughput_bps,
+            }
+
+
+@dataclass
+class QosSettings:
+    throttle_rate_ms: int
+    queue_length: int
+    compression: str
+    fragment_size: Optional[int] = None
+
+    def apply(self, subscribe_msg: dict) -> dict:
+        """Add the settings to a rosbridge `subscribe` message."""
+        subscribe_msg["throttle_rate"] = self.throttle_rate_ms
+        subscribe_msg["queue_length"] = self.queue_length
+        if self.compression != "none":
+            subscribe_msg["compression"] = self.compression
+        if self.fragment_size is not None:
+            subscribe_msg["fragment_size"] = self.fragment_size
+        return subscribe_msg
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _type_key(msg_type: str) -> str:
+    return msg_type.rsplit("/", 1)[-1]
+
+
+def choose_qos(
+    monitor: LinkMonitor,
+    topic: str,
+    msg_type: str,
+    min_throttle_rate_ms: int = 0,
+    max_throttle_rate_ms: int = 2000,
+    queue_length: Optional[int] = None,
+    compression: Optional[str] = None,
+    fragment_size: Optional[int] = None,
+) -> QosSettings:
+    """
+    Pick subscription settings for a topic from the measured link quality.
+
+    The throttle rate is chosen so that one subscription uses at most `LINK_BUDGET` of the
+    measured throughput, then clamped to the caller-given bounds. It does not depend on the
+    round-trip time, as the websocket pipelines the messages. Binary-heavy types are
+    requested as CBOR; verbose JSON messages are PNG-compressed when the link is slow.
+    JSON messages larger than what the link carries in `FRAGMENT_TIME_S` are fragmented.
+
+    Args:
+        monitor (LinkMonitor): Link quality estimates.
+        topic (str): ROS topic name.
+        msg_type (str): ROS message type.
+        min_throttle_rate_ms (int): Lower bound for the throttle rate.
+        max_throttle_rate_ms (int): Upper bound for the throttle rate.
+        queue_length (Optional[int]): Caller-given queue length; defaults to 1 (latest message wins).
+        compression (Optional[str]): Caller-given compression; chosen automatically if None.
+        fragment_size (Optional[int]): Caller-given fragment size; chosen automatically if None.
+
+    Returns:
+        QosSettings: The chosen settings.
+    """
+    type_key = _type_key(msg_type)
+    is_binary = type_key in BINARY_TYPES
+    with monitor.lock:
+        throughput = monitor.throughput_bps
+        size = monitor.topic_sizes.get(topic, DEFAULT_SIZES.get(type_key, DEFAULT_SIZE))
+
+    if compression is None:
+        if is_binary:
+            compression = "cbor"
+        elif throughput is not None and throughput < SLOW_LINK_BPS and size >= PNG_MIN_SIZE:
+            compression = "png"
+        else:
+            compression = "none"
+
+    if throughput:
+        transfer_ms = size / (throughput * LINK_BUDGET) * 1000.0
+    else:
+        transfer_ms = 0.0
+    throttle = int(min(max(transfer_ms, min_throttle_rate_ms), max(max_throttle_rate_ms, min_throttle_rate_ms)))
+
+    # rosbridge only fragments text messages
+    if fragment_size is None and compression != "cbor":
+        link_size = throughput * FRAGMENT_TIME_S if throughput else MAX_FRAGMENT_SIZE
+        candidate = int(min(max(link_size, MIN_FRAGMENT_SIZE), MAX_FRAGMENT_SIZE))
+        fragment_size = candidate if size > candidate else None
+
+    return QosSettings(
+        throttle_rate_ms=throttle,
+        queue_length=queue_length if queue_length is not None else 1,
+        compression=compression,
+        fragment_size=fragment_size,
+    )
@@ -0,0 +1,254 @@
+"""
+Local validation of ROS message payloads against the typedefs returned by `rosapi/MessageDetails`.
+
+For each message type a validator is compiled once, as a tree of small functions specialized for
+each field, that checks a payload and normalizes it (e.g. "1.5" -> 1.5 for a float64 field),
+so that malformed messages are reported with the path of the faulty field before reaching rosbridge.
+"""
+
+import base64
+import difflib
+import math
+import threading
+from typing import Callable, Dict, List, Optional
+
+# Validator: (value, path, errors) -> normalized value; problems are appended to `errors`
+Validator = Callable[[object, str, List[str]], object]
+
+# Stop collecting errors past this number, the first ones are the useful ones
+MAX_ERRORS = 10
+
+INT_RANGES = {
+    "int8": (-(2**7), 2**7 - 1),
+    "uint8": (0, 2**8 - 1),
+    "byte": (0, 2**8 - 1),
+    "char": (0, 2**8 - 1),
+    "int16": (-(2**15), 2**15 - 1),
+    "uint16": (0, 2**16 - 1),
+    "int32": (-(2**31), 2**31 - 1),
+    "uint32": (0, 2**32 - 1),
+    "int64": (-(2**63), 2**63 - 1),
+    "uint64": (0, 2**64 - 1),
+}
+FLOAT_TYPES = ("float32", "float64")
+STRING_TYPES = ("string", "wstring")
+# Primitive time types of ROS 1; ROS 2 uses builtin_interfaces messages, described by their own typedefs
+TIME_TYPES = ("time", "duration")
+# Arrays of these are sent by rosbridge as base64 strings
+BYTE_TYPES = ("uint8", "byte", "char")
+# IDL names of primitive types, as found in some ROS 2 typedefs
+PRIMITIVE_ALIASES = {"double": "float64", "float": "float32", "boolean": "bool", "octet": "byte"}
+
+
+class SchemaError(ValueError):
+    """Raised when the definition of a message type cannot be obtained or compiled."""
+
+
+def normalize_type(msg_type: str) -> str:
+    """'geometry_msgs/msg/Twist' -> 'geometry_msgs/Twist', the form used in typedefs."""
+    parts = msg_type.strip().split("/")
+    if len(parts) == 3 and parts[1] == "msg":
+        return f"{parts[0]}/{parts[2]}"
+    return msg_type.strip()
+
+
+def _base_type(field_type: str) -> str:
+    # Bounded strings and arrays, e.g. 'string<=10' or 'float64[<=3]', come without their bound
+    base = field_type.split("<=")[0].split("[")[0]
+    return PRIMITIVE_ALIASES.get(base, base)
+
+
+def _error(errors: List[str], path: str, message: str):
+    if len(errors) < MAX_ERRORS:
+        errors.append(f"{path or '<msg>'}: {message}")
+
+
+def _float_validator(field_type: str) -> Validator:
+    def validate(value, path, errors):
+        if isinstance(value, bool):
+            _error(errors, path, f"expected {field_type}, got bool")
+            return value
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, str):
+            try:
+                return float(value)
+            except ValueError:
+                pass
+        _error(errors, path, f"expected {field_type}, got {type(value).__name__} {value!r}")
+        return value
+
+    return validate
+
+
+def _int_validator(field_type: str) -> Validator:
+    low, high = INT_RANGES[field_type]
+
+    def validate(value, path, errors):
+        if isinstance(value, bool):
+            _error(errors, path, f"expected {field_type}, got bool")
+            return value
+        result = value
+        if isinstance(value, float) and math.isfinite(value) and value.is_integer():
+            result = int(value)
+        elif isinstance(value, str):
+            try:
+                result = int(value, 0)
+            except ValueError:
+                pass
+        if not isinstance(result, int):
+            _error(errors, path, f"expected {field_type}, got {type(value).__name__} {value!r}")
+            return value
+        if not low <= result <= high:
+            _error(errors, path, f"{result} out of range for {field_type} [{low}, {high}]")
+        return result
+
+    return validate
+
+
+def _bool_validator(value, path, errors):
+    if isinstance(value, bool):
+        return value
+    if value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    _error(errors, path, f"expected bool, got {type(value).__name__} {value!r}")
+    return value
+
+
+def _string_validator(value, path, errors):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    _error(errors, path, f"expected string, got {type(value).__name__}")
+    return value
+
+
+def _time_validator(value, path, errors):
+    if isinstance(value, dict) and set(value) <= {"secs", "nsecs", "sec", "nanosec"}:
+        return value
+    _error(errors, path, "expected {'secs': int, 'nsecs': int}")
+    return value
+
+
+def _array_validator(element: Validator, length: int, is_bytes: bool) -> Validator:
+    """`length` follows rosapi `fieldarraylen`: 0 for unbounded arrays, the size for fixed-size ones."""
+
+    def validate(value, path, errors):
+        if is_bytes and isinstance(value, str):
+            try:
+                base64.b64decode(value, validate=True)
+            except ValueError:
+                _error(errors, path, "expected a list of bytes or a base64 string")
+            return value
+        if not isinstance(value, (list, tuple)):
+            _error(errors, path, f"expected a list, got {type(value).__name__}")
+            return value
+        if length > 0 and len(value) != length:
+            _error(errors, path, f"expected exactly {length} elements, got {len(value)}")
+        return [element(v, f"{path}[{i}]", errors) for i, v in enumerate(value)]
+
+    return validate
+
+
+def _message_validator(type_name: str, fields: Dict[str, Validator]) -> Validator:
+    def validate(value, path, errors):
+        if not isinstance(value, dict):
+            _error(errors, path, f"expected a {type_name} object, got {type(value).__name__}")
+            return value
+        result = {}
+        for key, item in value.items():
+            validator = fields.get(key)
+            if validator is None:
+                close = difflib.get_close_matches(str(key), list(fields), n=1)
+                hint = f", did you mean '{close[0]}'?" if close else f"; fields are {', '.join(fields)}"
+                _error(errors, f"{path}.{key}" if path else str(key), f"unknown field of {type_name}{hint}")
+                continue
+            result[key] = validator(item, f"{path}.{key}" if path else key, errors)
+        return result  # missing fields are filled with their default by rosbridge
+
+    return validate
+
+
+def compile_validator(msg_type: str, typedefs: List[dict]) -> Validator:
+    """
+    Compile a validator for a message type from its rosapi typedefs.
+
+    Args:
+        msg_type (str): Message type, e.g. 'geometry_msgs/msg/Twist'
+        typedefs (list): `typedefs` of the `rosapi/MessageDetails` response, including nested types
+
+    Raises:
+        SchemaError: If the definition of a nested type is missing.
+    """
+    by_name = {normalize_type(t["type"]): t for t in typedefs if "type" in t}
+    compiled: Dict[str, Validator] = {}
+
+    def field_validator(field_type: str) -> Validator:
+        base = _base_type(field_type)
+        if base in FLOAT_TYPES:
+            return _float_validator(base)
+        if base in INT_RANGES:
+            return _int_validator(base)
+        if base == "bool":
+            return _bool_validator
+        if base in STRING_TYPES:
+            return _string_validator
+        if base in TIME_TYPES:
+            return _time_validator
+        return message(normalize_type(base))
+
+    def message(name: str) -> Validator:
+        if name in compiled:
+            return compiled[name]
+        typedef = by_name.get(name)
+        if typedef is None:
+            raise SchemaError(f"No definition for message type {name}")
+        fields: Dict[str, Validator] = {}
+        compiled[name] = _message_validator(name, fields)  # filled below; allows recursive types
+        array_lengths = typedef.get("fieldarraylen") or [-1] * len(typedef.get("fieldnames", []))
+        for field, field_type, length in zip(
+            typedef.get("fieldnames", []), typedef.get("fieldtypes", []), array_lengths
+        ):
+            validator = field_validator(field_type)
+            if length >= 0:
+                validator = _array_validator(validator, length, _base_type(field_type) in BYTE_TYPES)
+            fields[field] = validator
+        return compiled[name]
+
+    return message(normalize_type(msg_type))
+
+
+class SchemaCache:
+    """
+    Compiled validators of the message types seen so far, fetched from rosapi once per type, until
+    a payload that passed validation is rejected by rosbridge.
+
+    Args:
+        fetch_typedefs (callable): Function returning the typedefs of a message type, or raising SchemaError
+    """
+
+    def __init__(self, fetch_typedefs: Callable[[str], List[dict]]):
+        self.fetch_typedefs = fetch_typedefs
+        self.validators: Dict[str, Validator] = {}
+        self.lock = threading.Lock()
+
+    def validator(self, msg_type: str) -> Validator:
+        key = normalize_type(msg_type)
+        with self.lock:
+            validator = self.validators.get(key)
+        if validator is None:
+            validator = compile_validator(key, self.fetch_typedefs(msg_type))
+            with self.lock:
+                self.validators[key] = validator
+        return validator
+
+    def invalidate(self, msg_type: Optional[str] = None):
+        """Drop the validator of a type, or of every type, so that its definition is fetched again."""
+        with self.lock:
+            if msg_type is None:
+                self.validators.clear()
+            else:
+                self.validators.pop(normalize_type(msg_type), None)
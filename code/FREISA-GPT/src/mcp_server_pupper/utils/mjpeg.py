@@ -0,0 +1,244 @@
+"""
+MJPEG preview of camera topics, for the HTTP transports of the MCP server.
+
+One `FrameBroadcaster` per topic holds a single rosbridge subscription, throttled to the preview
+frame rate, and encodes each received image to JPEG once. Viewers only ever get the latest frame:
+a viewer slower than the camera skips frames, and never delays the subscription or the other viewers.
+The subscription is dropped a few seconds after the last viewer leaves.
+"""
+
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Optional, Set, Tuple
+
+from .websocket_manager import decode_image, decode_message
+
+BOUNDARY = "frame"
+
+
+class FrameBroadcaster:
+    """
+    Latest JPEG frame of an image topic, shared by all the viewers of the topic.
+
+    Args:
+        open_channel (callable): Returns a new rosbridge channel (`SessionChannel` or `WebSocketManager`)
+        topic (str): Image topic
+        msg_type (str): 'sensor_msgs/msg/Image' or 'sensor_msgs/msg/CompressedImage'
+        fps (float): Maximum frame rate, enforced by rosbridge with `throttle_rate`
+        quality (int): JPEG quality, 0-100
+        max_width (Optional[int]): Frames wider than this are scaled down before encoding
+        linger_s (float): How long the subscription is kept after the last viewer leaves
+    """
+
+    def __init__(
+        self,
+        open_channel: Callable[[], object],
+        topic: str,
+        msg_type: str,
+        fps: float = 10.0,
+        quality: int = 80,
+        max_width: Optional[int] = None,
+        linger_s: float = 5.0,
+    ):
+        self.open_channel = open_channel
+        self.topic = topic
+        self.msg_type = msg_type
+        self.fps = fps
+        self.quality = quality
+        self.max_width = max_width
+        self.linger_s = linger_s
+
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        self.waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self.idle_since: Optional[float] = None
+        self.frame: Optional[bytes] = None
+        self.seq = 0
+        self.error: Optional[str] = None
+        self.encoded = 0
+        self.dropped = 0
+
+    def _start(self):
+        """Start the subscription thread if it is not running; called with the lock held."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name=f"mjpeg{self.topic}", daemon=True)
+            self.thread.start()
+
+    def _should_stop(self) -> bool:
+        with self.lock:
+            if self.waiters:
+                self.idle_since = None
+                return False
+            if self.idle_since is None:
+                self.idle_since = time.monotonic()
+            if time.monotonic() - self.idle_since < self.linger_s:
+                return False
+            self.thread = None
+            self.frame = None  # a later viewer must not get a stale frame
+            return True
+
+    def _run(self):
+        subscribe_msg = {
+            "op": "subscribe",
+            "topic": self.topic,
+            "type": self.msg_type,
+            "throttle_rate": int(1000 / self.fps) if self.fps > 0 else 0,
+            "queue_length": 1,
+            "compression": "cbor",
+        }
+        channel = self.open_channel()
+        with channel:
+            subscribed = False
+            while not self._should_stop():
+                if not subscribed:
+                    self.error = channel.send(subscribe_msg)
+                    subscribed = self.error is None
+                    if not subscribed:
+                        time.sleep(1.0)
+                        continue
+
+                raw = channel.receive(timeout=0.5)
+                # Latest frame wins: skip the frames that queued up while the previous one was encoded
+                while raw is not None:
+                    newer = channel.receive(timeout=0)
+                    if newer is None:
+                        break
+                    self.dropped += 1
+                    raw = newer
+                msg_data = decode_message(raw)
+                if not msg_data:
+                    continue
+                if msg_data.get("op") == "status" and msg_data.get("level") == "error":
+                    self.error = msg_data.get("msg", "Unknown error")
+                    continue
+                if msg_data.get("op") != "publish" or msg_data.get("topic") != self.topic:
+                    continue
+
+                jpeg = self._encode(msg_data.get("msg", {}))
+                if jpeg is not None:
+                    self.error = None
+                    self._publish(jpeg)
+            if subscribed:
+                channel.send({"op": "unsubscribe", "topic": self.topic})
+
+    def _encode(self, msg: dict) -> Optional[bytes]:
+        import base64
+
+        import cv2
+        import numpy as np
+
+        if self.msg_type.endswith("CompressedImage"):
+            data = msg.get("data", b"")
+            data = base64.b64decode(data) if isinstance(data, str) else bytes(data)
+            if "jpeg" in msg.get("format", "") and self.max_width is None:
+                return data  # already JPEG, sent as is
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        else:
+            image = decode_image(msg)
+        if image is None:
+            self.error = f"Cannot decode the images of {self.topic}"
+            return None
+
+        if self.max_width and image.shape[1] > self.max_width:
+            height = round(image.shape[0] * self.max_width / image.shape[1])
+            image = cv2.resize(image, (self.max_width, height), interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        self.encoded += 1
+        return buffer.tobytes() if ok else None
+
+    def _publish(self, jpeg: bytes):
+        with self.lock:
+            self.frame = jpeg
+            self.seq += 1
+            waiters = list(self.waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # event loop closed, the viewer is gone
+
+    async def frames(self, timeout: Optional[float] = None) -> AsyncIterator[bytes]:
+        """
+        Iterate over the frames of the topic, starting with the latest one.
+
+        Args:
+            timeout (Optional[float]): Stop when no new frame arrives within this time; None waits forever
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.lock:
+            self.waiters.add(waiter)
+            self._start()
+        try:
+            seen = 0
+            while True:
+                waiter[1].clear()
+                with self.lock:
+                    seq, frame = self.seq, self.frame
+                if frame is not None and seq != seen:
+                    seen = seq
+                    yield frame
+                    continue
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout)
+                except asyncio.TimeoutError:
+                    return
+        finally:
+            with self.lock:
+                self.waiters.discard(waiter)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "topic": self.topic,
+                "viewers": len(self.waiters),
+                "running": self.thread is not None,
+                "frames_encoded": self.encoded,
+                "frames_dropped": self.dropped,
+                "error": self.error,
+            }
+
+
+class MjpegHub:
+    """
+    Frame broadcasters by topic, created on the first viewer of a topic.
+
+    Args:
+        open_channel (callable): Returns a new rosbridge channel
+        fps (float), quality (int), max_width (Optional[int]): Encoding settings, see `FrameBroadcaster`
+    """
+
+    def __init__(
+        self, open_channel: Callable[[], object], fps: float = 10.0, quality: int = 80, max_width: Optional[int] = None
+    ):
+        self.open_channel = open_channel
+        self.fps = fps
+        self.quality = quality
+        self.max_width = max_width
+        self.broadcasters: Dict[str, FrameBroadcaster] = {}
+        self.lock = threading.Lock()
+
+    def broadcaster(self, topic: str, msg_type: str) -> FrameBroadcaster:
+        with self.lock:
+            broadcaster = self.broadcasters.get(topic)
+            if broadcaster is None or broadcaster.msg_type != msg_type:
+                broadcaster = FrameBroadcaster(
+                    self.open_channel, topic, msg_type, self.fps, self.quality, self.max_width
+                )
+                self.broadcasters[topic] = broadcaster
+            return broadcaster
+
+    def stats(self) -> Dict:
+        with self.lock:
+            broadcasters = list(self.broadcasters.values())
+        return {"fps": self.fps, "quality": self.quality, "topics": [b.stats() for b in broadcasters]}
+
+
+async def multipart(frames: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Wrap JPEG frames into the parts of a `multipart/x-mixed-replace` response."""
+    async for frame in frames:
+        yield (
+            f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(frame)}\r\n\r\n".encode("ascii")
+            + frame
+            + b"\r\n"
+        )
@@ -0,0 +1,48 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+
+class ParamCache:
+    """
+    ROS parameter values read through rosapi, kept for a while to spare the round trips.
+
+    Parameters written through the server are invalidated, so that the next read returns the value
+    actually applied by the node. Changes made by other clients are seen once the entries expire.
+
+    Args:
+        ttl_s (float): How long a value is returned from the cache
+    """
+
+    def __init__(self, ttl_s: float = 30.0):
+        self.ttl_s = ttl_s
+        self.values: Dict[str, Tuple[object, float]] = {}
+        self.lock = threading.Lock()
+
+    def lookup(self, names: Iterable[str]) -> Tuple[Dict[str, object], List[str]]:
+        """
+        Returns:
+            tuple: (cached values by name, names to fetch)
+        """
+        now = time.monotonic()
+        hits: Dict[str, object] = {}
+        misses: List[str] = []
+        with self.lock:
+            for name in names:
+                entry = self.values.get(name)
+                if entry is not None and now - entry[1] < self.ttl_s:
+                    hits[name] = entry[0]
+                else:
+                    misses.append(name)
+        return hits, misses
+
+    def store(self, values: Dict[str, object]):
+        now = time.monotonic()
+        with self.lock:
+            for name, value in values.items():
+                self.values[name] = (value, now)
+
+    def invalidate(self, names: Iterable[str]):
+        with self.lock:
+            for name in names:
+                self.values.pop(name, None)
@@ -0,0 +1,565 @@
+"""
+Chunked, append-only recording of ROS topics, stored column-wise.
+
+A recording is a file header followed by chunks. Each chunk holds consecutive messages of one topic
+with the same layout, stored as columns:
+
+- `stamp`: reception time of each message (float64, seconds since the epoch), the time index
+- numeric fields: one float64 or int64 column per field, e.g. `pose.pose.position.x`
+- numeric arrays of fixed length in the chunk: one 2D column, e.g. `pose.covariance`
+- byte arrays (e.g. image data): one blob column, optionally PNG/JPEG encoded
+- everything else: the rest of each message as JSON, in a blob column
+
+Chunk layout::
+
+    CHUNK_HEADER (magic, meta length, data length, first stamp, last stamp, message count)
+    meta: JSON {"topic", "type", "columns": [{"name", "path", "kind", "dtype", "shape", "offset", "nbytes", ...}]}
+    data: the columns, each aligned to 8 bytes
+
+Chunks are written with a single write, so an interrupted recording loses at most the last chunk, which
+the reader ignores. The reader memory-maps the file and only decodes the chunks of the topics and time
+range asked for.
+"""
+
+import base64
+import heapq
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .link_quality import choose_qos
+from .websocket_manager import decode_message
+
+FILE_MAGIC = b"FRREC\x00\x01\x00"
+CHUNK_MAGIC = b"CHNK"
+# magic, meta length, data length, first stamp, last stamp, message count
+CHUNK_HEADER = struct.Struct("<4sIQddI")
+
+IMAGE_CODECS = ("raw", "png", "jpeg")
+# Image encodings that can be stored as PNG/JPEG: encoding -> channels
+ENCODABLE_IMAGES = {"rgb8": 3, "bgr8": 3, "mono8": 1, "8UC1": 1, "8UC3": 3}
+
+_EXTRACTED = object()
+
+
+class RecordingError(ValueError):
+    """Raised when a file is not a recording."""
+
+
+def _split(value, path: tuple, layout: list, values: list):
+    """
+    Move the numeric and binary leaves of a message into `layout`/`values`.
+
+    Returns:
+        What remains of `value`, or `_EXTRACTED` if the value itself was moved.
+    """
+    if isinstance(value, dict):
+        rest = {}
+        for key, item in value.items():
+            remainder = _split(item, path + (key,), layout, values)
+            if remainder is not _EXTRACTED:
+                rest[key] = remainder
+        return rest
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        layout.append((path, "num", None))
+        values.append(value)
+        return _EXTRACTED
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        layout.append((path, "blob", None))
+        values.append(bytes(value))
+        return _EXTRACTED
+    if isinstance(value, np.ndarray) and value.ndim == 1 and value.dtype.kind in "iuf":
+        layout.append((path, "ndarray", (value.dtype.newbyteorder("<").str, value.size)))
+        values.append(value)
+        return _EXTRACTED
+    if (
+        isinstance(value, list)
+        and value
+        and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+    ):
+        layout.append((path, "list", len(value)))
+        values.append(value)
+        return _EXTRACTED
+    return value
+
+
+def _insert(message: dict, path: Sequence[str], value):
+    for key in path[:-1]:
+        message = message.setdefault(key, {})
+    message[path[-1]] = value
+
+
+def _offsets_and_data(items: List[bytes]) -> Tuple[np.ndarray, bytes]:
+    offsets = np.zeros(len(items) + 1, dtype="<u8")
+    np.cumsum([len(b) for b in items], out=offsets[1:])
+    return offsets, b"".join(items)
+
+
+class _ChunkBuffer:
+    """Messages of one topic waiting to be written, all with the same layout."""
+
+    def __init__(self, topic: str, msg_type: str, layout: tuple):
+        self.topic = topic
+        self.msg_type = msg_type
+        self.layout = layout
+        self.stamps: List[float] = []
+        self.values: List[list] = []
+        self.rests: List[bytes] = []
+        self.nbytes = 0
+        self.created = time.monotonic()
+
+
+class RecordingWriter:
+    """
+    Appends topic messages to a recording.
+
+    Args:
+        path (str): Recording file; created if missing, appended to otherwise
+        image_codec (str): 'raw', 'png' (lossless) or 'jpeg' for the pixels of `sensor_msgs/Image` messages
+        chunk_messages (int): Maximum number of messages per chunk
+        chunk_bytes (int): Approximate maximum size of a chunk
+        chunk_seconds (float): Maximum time a message is buffered before being written
+
+    Raises:
+        RecordingError: If `path` is a non-empty file that is not a recording
+    """
+
+    def __init__(
+        self,
+        path: str,
+        image_codec: str = "raw",
+        chunk_messages: int = 1000,
+        chunk_bytes: int = 8 * 1024 * 1024,
+        chunk_seconds: float = 5.0,
+    ):
+        if image_codec not in IMAGE_CODECS:
+            raise ValueError(f"image_codec must be one of {', '.join(IMAGE_CODECS)}")
+        self.path = path
+        self.image_codec = image_codec
+        self.chunk_messages = chunk_messages
+        self.chunk_bytes = chunk_bytes
+        self.chunk_seconds = chunk_seconds
+        self.buffers: Dict[str, _ChunkBuffer] = {}
+        self.counts: Dict[str, int] = {}
+        self.bytes_written = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as existing:
+                if existing.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                    raise RecordingError(f"{path} is not a recording, not appending to it")
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(FILE_MAGIC)
+
+    def write(self, topic: str, msg_type: str, stamp: float, msg: dict):
+        """
+        Add a message (as decoded from rosbridge, JSON or CBOR) to the recording.
+
+        Args:
+            topic (str): Topic name
+            msg_type (str): Message type, needed to replay the topic
+            stamp (float): Reception time, in seconds since the epoch
+            msg (dict): The message
+        """
+        layout: list = []
+        values: list = []
+        rest = _split(msg, (), layout, values)
+        layout_key = tuple(layout)
+
+        buffer = self.buffers.get(topic)
+        if buffer is not None and (buffer.layout != layout_key or buffer.msg_type != msg_type):
+            self._flush(buffer)
+            buffer = None
+        if buffer is None:
+            buffer = self.buffers[topic] = _ChunkBuffer(topic, msg_type, layout_key)
+
+        rest_json = json.dumps(rest, separators=(",", ":")).encode("utf-8")
+        buffer.stamps.append(stamp)
+        buffer.values.append(values)
+        buffer.rests.append(rest_json)
+        buffer.nbytes += len(rest_json) + sum(len(v) if isinstance(v, bytes) else 8 for v in values)
+        self.counts[topic] = self.counts.get(topic, 0) + 1
+
+        if (
+            len(buffer.stamps) >= self.chunk_messages
+            or buffer.nbytes >= self.chunk_bytes
+            or time.monotonic() - buffer.created >= self.chunk_seconds
+        ):
+            self._flush(buffer)
+
+    def flush(self):
+        for buffer in list(self.buffers.values()):
+            self._flush(buffer)
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _encode_images(self, buffer: _ChunkBuffer, blobs: List[bytes]) -> Tuple[List[bytes], str]:
+        """Encode the pixels of the chunk's images, if they all have an encodable format."""
+        if self.image_codec == "raw" or not buffer.msg_type.endswith("/Image"):
+            return blobs, "raw"
+        import cv2
+
+        # height and width are numeric columns, the encoding is in the rest of the message
+        paths = [path for path, _, _ in buffer.layout]
+        if ("height",) not in paths or ("width",) not in paths:
+            return blobs, "raw"
+        height_index, width_index = paths.index(("height",)), paths.index(("width",))
+        shapes = []
+        for values, rest in zip(buffer.values, buffer.rests):
+            channels = ENCODABLE_IMAGES.get(json.loads(rest).get("encoding"))
+            if channels is None:
+                return blobs, "raw"
+            shapes.append((int(values[height_index]), int(values[width_index]), channels))
+
+        extension = ".png" if self.image_codec == "png" else ".jpg"
+        encoded = []
+        for blob, (height, width, channels) in zip(blobs, shapes):
+            pixels = np.frombuffer(blob, dtype=np.uint8)
+            if pixels.size != height * width * channels:
+                return blobs, "raw"  # e.g. rows padded by `step`
+            ok, data = cv2.imencode(extension, pixels.reshape(height, width, channels))
+            if not ok:
+                return blobs, "raw"
+            encoded.append(data.tobytes())
+        return encoded, self.image_codec
+
+    def _flush(self, buffer: _ChunkBuffer):
+        if self.buffers.get(buffer.topic) is buffer:
+            del self.buffers[buffer.topic]
+        if not buffer.stamps:
+            return
+
+        columns: List[Tuple[dict, bytes]] = []
+        stamps = np.asarray(buffer.stamps, dtype="<f8")
+        columns.append(({"name": "stamp", "kind": "stamp", "dtype": "<f8"}, stamps.tobytes()))
+
+        for i, (path, kind, extra) in enumerate(buffer.layout):
+            name = ".".join(path)
+            column = [values[i] for values in buffer.values]
+            meta = {"name": name, "path": list(path), "kind": kind}
+            if kind == "blob":
+                blobs, codec = self._encode_images(buffer, column) if path == ("data",) else (column, "raw")
+                offsets, data = _offsets_and_data(blobs)
+                meta.update(codec=codec, offsets_nbytes=offsets.nbytes)
+                columns.append((meta, offsets.tobytes() + data))
+                continue
+            if kind == "ndarray":
+                array = np.stack(column).astype(extra[0], copy=False)
+            else:
+                flat = column if kind == "num" else (v for row in column for v in row)
+                is_float = any(isinstance(v, float) for v in flat)
+                try:
+                    array = np.asarray(column, dtype="<f8" if is_float else "<i8")
+                except OverflowError:  # uint64 beyond the int64 range
+                    array = np.asarray(column, dtype="<f8")
+            meta.update(dtype=array.dtype.str, shape=list(array.shape[1:]))
+            columns.append((meta, array.tobytes()))
+
+        offsets, data = _offsets_and_data(buffer.rests)
+        columns.append(({"name": "rest", "kind": "json", "offsets_nbytes": offsets.nbytes}, offsets.tobytes() + data))
+
+        # Lay the columns out, each aligned to 8 bytes so they can be mapped as NumPy arrays
+        payload = bytearray()
+        metas = []
+        for meta, data in columns:
+            payload += b"\x00" * (-len(payload) % 8)
+            meta.update(offset=len(payload), nbytes=len(data))
+            metas.append(meta)
+            payload += data
+        meta_bytes = json.dumps({"topic": buffer.topic, "type": buffer.msg_type, "columns": metas}).encode("utf-8")
+        meta_bytes += b" " * (-(CHUNK_HEADER.size + len(meta_bytes)) % 8)
+
+        header = CHUNK_HEADER.pack(
+            CHUNK_MAGIC, len(meta_bytes), len(payload), stamps[0], stamps[-1], len(buffer.stamps)
+        )
+        # File positions stay 8-byte aligned: the file header and every chunk have a size multiple of 8
+        self.file.write(header + meta_bytes + bytes(payload))
+        self.file.flush()
+        self.bytes_written += CHUNK_HEADER.size + len(meta_bytes) + len(payload)
+
+
+class ChunkInfo:
+    """Location and time range of a chunk, from its header."""
+
+    def __init__(self, offset: int, meta: dict, start: float, end: float, count: int):
+        self.data_offset = offset
+        self.topic = meta["topic"]
+        self.msg_type = meta["type"]
+        self.columns = meta["columns"]
+        self.start = start
+        self.end = end
+        self.count = count
+
+
+class RecordingReader:
+    """
+    Memory-mapped, random access to a recording.
+
+    Only the chunk headers are read when opening; columns are mapped as NumPy arrays on demand.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < len(FILE_MAGIC) or self.file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            self.file.close()
+            raise RecordingError(f"{path} is not a recording")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.chunks: List[ChunkInfo] = []
+
+        offset = len(FILE_MAGIC)
+        while offset + CHUNK_HEADER.size <= size:
+            magic, meta_len, data_len, start, end, count = CHUNK_HEADER.unpack_from(self.mm, offset)
+            data_offset = offset + CHUNK_HEADER.size + meta_len
+            if magic != CHUNK_MAGIC or data_offset + data_len > size:
+                break  # truncated last chunk, e.g. interrupted recording
+            meta = json.loads(self.mm[offset + CHUNK_HEADER.size : data_offset])
+            self.chunks.append(ChunkInfo(data_offset, meta, start, end, count))
+            offset = data_offset + data_len
+
+    def close(self):
+        try:
+            self.mm.close()
+        except BufferError:
+            pass  # arrays returned by `columns()` still map the file; it is unmapped once they are freed
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def topics(self) -> Dict[str, Dict]:
+        """Type, message count and time range of each recorded topic."""
+        result: Dict[str, Dict] = {}
+        for chunk in self.chunks:
+            info = result.setdefault(
+                chunk.topic, {"type": chunk.msg_type, "count": 0, "start": chunk.start, "end": chunk.end}
+            )
+            info["count"] += chunk.count
+            info["start"] = min(info["start"], chunk.start)
+            info["end"] = max(info["end"], chunk.end)
+        return result
+
+    def time_range(self) -> Tuple[Optional[float], Optional[float]]:
+        if not self.chunks:
+            return None, None
+        return min(c.start for c in self.chunks), max(c.end for c in self.chunks)
+
+    def _select(self, topic: str, start: Optional[float], end: Optional[float]) -> List[ChunkInfo]:
+        return [
+            c
+            for c in self.chunks
+            if c.topic == topic and (start is None or c.end >= start) and (end is None or c.start <= end)
+        ]
+
+    def _array(self, chunk: ChunkInfo, column: dict) -> np.ndarray:
+        shape = (chunk.count, *column.get("shape", []))
+        return np.frombuffer(
+            self.mm, dtype=column["dtype"], count=int(np.prod(shape)), offset=chunk.data_offset + column["offset"]
+        ).reshape(shape)
+
+    def _blobs(self, chunk: ChunkInfo, column: dict) -> Tuple[np.ndarray, int]:
+        base = chunk.data_offset + column["offset"]
+        offsets = np.frombuffer(self.mm, dtype="<u8", count=chunk.count + 1, offset=base)
+        return offsets, base + column["offsets_nbytes"]
+
+    def _blob(self, offsets: np.ndarray, base: int, i: int) -> bytes:
+        return self.mm[base + int(offsets[i]) : base + int(offsets[i + 1])]
+
+    def columns(self, topic: str, start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """
+        Numeric columns of a topic within a time range, e.g. for plotting or statistics.
+
+        Returns:
+            dict: 'stamp' and one array per numeric field (dotted path), concatenated over the chunks.
+                Fields missing from some chunks are left out.
+        """
+        parts: Dict[str, List[np.ndarray]] = {}
+        chunks = self._select(topic, start, end)
+        for chunk in chunks:
+            stamps = self._array(chunk, chunk.columns[0])
+            mask = np.ones(chunk.count, dtype=bool)
+            if start is not None:
+                mask &= stamps >= start
+            if end is not None:
+                mask &= stamps <= end
+            for column in chunk.columns:
+                if column["kind"] in ("stamp", "num", "list", "ndarray"):
+                    parts.setdefault(column["name"], []).append(self._array(chunk, column)[mask])
+        return {name: np.concatenate(arrays) for name, arrays in parts.items() if len(arrays) == len(chunks)}
+
+    def _decode_image(self, blob: bytes) -> bytes:
+        import cv2
+
+        image = cv2.imdecode(np.frombuffer(blob, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        return image.tobytes()
+
+    def _chunk_messages(
+        self, chunk: ChunkInfo, start: Optional[float], end: Optional[float]
+    ) -> Iterator[Tuple[float, str, dict]]:
+        stamps = self._array(chunk, chunk.columns[0])
+        first = 0 if start is None else int(np.searchsorted(stamps, start, side="left"))
+        last = chunk.count if end is None else int(np.searchsorted(stamps, end, side="right"))
+        if first >= last:
+            return
+
+        readers = []
+        for column in chunk.columns[1:]:
+            kind = column["kind"]
+            if kind in ("blob", "json"):
+                offsets, base = self._blobs(chunk, column)
+                readers.append((column, offsets, base))
+            else:
+                readers.append((column, self._array(chunk, column), None))
+
+        for i in range(first, last):
+            rest_column, offsets, base = readers[-1]
+            message = json.loads(self._blob(offsets, base, i))
+            for column, data, base in readers[:-1]:
+                kind = column["kind"]
+                if kind == "blob":
+                    value = self._blob(data, base, i)
+                    if column.get("codec", "raw") != "raw":
+                        value = self._decode_image(value)
+                elif kind == "ndarray":
+                    value = data[i]
+                elif kind == "list":
+                    value = data[i].tolist()
+                else:
+                    value = data[i].item()
+                _insert(message, column["path"], value)
+            yield float(stamps[i]), chunk.topic, message
+
+    def messages(
+        self,
+        topics: Optional[Sequence[str]] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Iterator[Tuple[float, str, dict]]:
+        """
+        Iterate lazily over the messages of some topics within a time range, in time order.
+
+        Yields:
+            tuple: (stamp, topic, message)
+        """
+        names = list(self.topics()) if topics is None else list(topics)
+        streams = [
+            (m for chunk in self._select(name, start, end) for m in self._chunk_messages(chunk, start, end))
+            for name in names
+        ]
+        return heapq.merge(*streams, key=lambda item: item[0])
+
+
+def topic_types(manager) -> Dict[str, str]:
+    """
+    Ask rosapi for the type of every topic, needed to subscribe with CBOR and to replay.
+
+    Returns:
+        dict: topic -> type, empty if rosapi could not be reached.
+    """
+    message = {"op": "call_service", "service": "/rosapi/topics", "type": "rosapi/Topics", "id": "recording_topics"}
+    values = manager.request(message).get("values") or {}
+    return dict(zip(values.get("topics", []), values.get("types", [])))
+
+
+def record(
+    manager,
+    topics: Dict[str, str],
+    writer: RecordingWriter,
+    duration: Optional[float],
+    max_messages: Optional[int] = None,
+    throttle_rate_ms: int = 0,
+    queue_length: int = 10,
+) -> Dict:
+    """
+    Subscribe to topics and write their messages to a recording.
+
+    Compression is picked per topic from the link quality, like for the other subscriptions
+    (CBOR for binary-heavy types), but messages are not throttled unless asked to.
+
+    Args:
+        manager: `WebSocketManager` or session channel to receive from
+        topics (dict): topic -> message type
+        writer (RecordingWriter): Destination
+        duration (Optional[float]): Recording duration in seconds; None records until interrupted
+        max_messages (Optional[int]): Stop after this many messages in total
+        throttle_rate_ms (int): Minimum interval between messages of a topic
+        queue_length (int): rosbridge queue length per topic
+
+    Returns:
+        dict: Message count per topic, recording duration and rosbridge errors, or {"error": ...}
+    """
+    if manager.link_monitor.is_stale(10.0):
+        manager.probe()
+    subscribed = []
+    status_errors: List[str] = []
+    total = 0
+    start = time.monotonic()
+    try:
+        for topic, msg_type in topics.items():
+            qos = choose_qos(
+                manager.link_monitor,
+                topic,
+                msg_type,
+                min_throttle_rate_ms=throttle_rate_ms,
+                max_throttle_rate_ms=throttle_rate_ms,
+                queue_length=queue_length,
+            )
+            send_error = manager.send(qos.apply({"op": "subscribe", "topic": topic, "type": msg_type}))
+            if send_error:
+                return {"error": f"Failed to subscribe to {topic}: {send_error}"}
+            subscribed.append(topic)
+
+        end_time = None if duration is None else start + duration
+        while (end_time is None or time.monotonic() < end_time) and (max_messages is None or total < max_messages):
+            timeout = 0.5 if end_time is None else min(0.5, max(end_time - time.monotonic(), 0.01))
+            response = manager.receive(timeout=timeout)
+            msg_data = decode_message(response)
+            if not msg_data:
+                continue  # idle timeout, non-JSON or empty
+
+            if msg_data.get("op") == "status" and msg_data.get("level") == "error":
+                status_errors.append(msg_data.get("msg", "Unknown error"))
+                continue
+
+            topic = msg_data.get("topic", "")
+            if msg_data.get("op") != "publish" or topic not in topics:
+                continue
+            msg = msg_data.get("msg", {})
+            if isinstance(msg.get("data"), str) and topics[topic].endswith("Image"):
+                msg["data"] = base64.b64decode(msg["data"])  # pixels as a blob, not as base64 JSON
+            manager.link_monitor.record_message(topic, len(response))
+            writer.write(topic, topics[topic], time.time(), msg)
+            total += 1
+    finally:
+        for topic in subscribed:
+            manager.send({"op": "unsubscribe", "topic": topic})
+        writer.flush()
+
+    return {
+        "duration_s": time.monotonic() - start,
+        "topics": {t: {"type": topics[t], "count": writer.counts.get(t, 0)} for t in topics},
+        "status_errors": status_errors,
+    }
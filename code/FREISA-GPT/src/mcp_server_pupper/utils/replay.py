@@ -0,0 +1,144 @@
+"""
+Timed replay of a recording (see recording.py) into rosbridge.
+
+All topics go through a single scheduler: the reader merges the per-topic chunks into one stream
+ordered by stamp, and each message is published when its offset from the first stamp, divided by the
+speed, has elapsed. Messages are read lazily, so replaying a long recording does not load it in memory.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from .recording import RecordingReader
+from .websocket_manager import decode_message, jsonable
+
+# Messages published later than this after their due time are counted as late
+LATE_THRESHOLD_S = 0.01
+# How long rosbridge errors are collected after the replay
+STATUS_WAIT_S = 0.5
+
+
+def _restamp(msg: dict, now: float):
+    """Set `header.stamp` to the current time, keeping the field names of the ROS version that recorded it."""
+    stamp = msg.get("header", {}).get("stamp") if isinstance(msg.get("header"), dict) else None
+    if not isinstance(stamp, dict):
+        return
+    sec, nanosec = int(now), int((now % 1.0) * 1e9)
+    if "secs" in stamp:
+        stamp.update(secs=sec, nsecs=nanosec)
+    else:
+        stamp.update(sec=sec, nanosec=nanosec)
+
+
+def replay(
+    manager,
+    reader: RecordingReader,
+    topics: Optional[Sequence[str]] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    speed: Optional[float] = 1.0,
+    repeat: int = 1,
+    remap: Optional[Dict[str, str]] = None,
+    restamp: bool = False,
+    stop: Optional[threading.Event] = None,
+) -> Dict:
+    """
+    Publish recorded messages on rosbridge with their original timing.
+
+    Args:
+        manager: `WebSocketManager` or session channel to publish with
+        reader (RecordingReader): Recording to replay
+        topics (Optional[Sequence[str]]): Topics to replay; all recorded topics if None
+        start (Optional[float]): Skip the messages recorded before this stamp
+        end (Optional[float]): Skip the messages recorded after this stamp
+        speed (Optional[float]): Time multiplier, e.g. 2.0 replays twice as fast; None or 0 replays as fast as possible
+        repeat (int): Number of times the recording is replayed
+        remap (Optional[Dict[str, str]]): Recorded topic -> topic to publish on
+        restamp (bool): Set `header.stamp` to the publication time, e.g. for TF buffers that drop old data
+        stop (Optional[threading.Event]): Set to end the replay early
+
+    Returns:
+        dict: Published message count per topic, timing statistics and rosbridge errors, or {"error": ...}
+    """
+    recorded = reader.topics()
+    names = list(recorded) if topics is None else list(topics)
+    unknown = [t for t in names if t not in recorded]
+    if unknown:
+        return {"error": f"Topics not in the recording: {', '.join(unknown)}"}
+    if not names:
+        return {"error": "The recording is empty"}
+    remap = remap or {}
+
+    advertised: List[str] = []
+    counts = {name: 0 for name in names}
+    lags: List[float] = []
+    send_errors: List[str] = []
+    began = time.perf_counter()
+    try:
+        for name in names:
+            target = remap.get(name, name)
+            send_error = manager.send({"op": "advertise", "topic": target, "type": recorded[name]["type"]})
+            if send_error:
+                return {"error": f"Failed to advertise {target}: {send_error}"}
+            advertised.append(target)
+
+        for _ in range(max(repeat, 1)):
+            first_stamp = None
+            origin = time.perf_counter()
+            for stamp, topic, msg in reader.messages(names, start, end):
+                if first_stamp is None:
+                    first_stamp = stamp
+                if speed:
+                    due = origin + (stamp - first_stamp) / speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        if stop is None:
+                            time.sleep(delay)
+                        elif stop.wait(delay):
+                            break
+                    lags.append(max(time.perf_counter() - due, 0.0))
+                elif stop is not None and stop.is_set():
+                    break
+
+                if restamp:
+                    _restamp(msg, time.time())
+                send_error = manager.send({"op": "publish", "topic": remap.get(topic, topic), "msg": jsonable(msg)})
+                if send_error:
+                    if len(send_errors) < 10:
+                        send_errors.append(f"{topic}: {send_error}")
+                    continue
+                counts[topic] += 1
+            if stop is not None and stop.is_set():
+                break
+    finally:
+        for target in advertised:
+            manager.send({"op": "unadvertise", "topic": target})
+
+    elapsed = time.perf_counter() - began
+    # rosbridge reports rejected messages with status messages, collect what arrived meanwhile
+    status_errors: List[str] = []
+    deadline = time.monotonic() + STATUS_WAIT_S
+    while len(status_errors) < 10 and time.monotonic() < deadline:
+        msg_data = decode_message(manager.receive(timeout=0.1))
+        if not msg_data:
+            break
+        if msg_data.get("op") == "status" and msg_data.get("level") == "error":
+            status_errors.append(msg_data.get("msg", "Unknown error"))
+
+    total = sum(counts.values())
+    result = {
+        "duration_s": elapsed,
+        "published": total,
+        "rate_hz": total / elapsed if elapsed > 0 else 0.0,
+        "topics": {remap.get(t, t): {"type": recorded[t]["type"], "count": counts[t]} for t in names},
+        "send_errors": send_errors,
+        "status_errors": status_errors,
+    }
+    if lags:
+        result["timing"] = {
+            "mean_lag_ms": 1000.0 * sum(lags) / len(lags),
+            "max_lag_ms": 1000.0 * max(lags),
+            "late_messages": sum(lag > LATE_THRESHOLD_S for lag in lags),
+        }
+    return result
@@ -0,0 +1,465 @@
+import itertools
+import queue
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Set, Union
+
+from .websocket_manager import WebSocketManager, decode_message, parse_json
+
+# rosbridge serializes `publish` messages with `op` and `topic` first, so they can be routed without parsing the payload
+_PUBLISH_HEADER = re.compile(r'\{\s*"op"\s*:\s*"publish"\s*,\s*"topic"\s*:\s*"([^"]*)"')
+
+
+class _Topic:
+    """A topic subscribed on rosbridge by one or more channels."""
+
+    def __init__(self):
+        self.channels: Set["SessionChannel"] = set()
+        self.subscriptions: Dict[str, dict] = {}  # rosbridge subscription id -> subscribe message
+        self.owners: Dict[str, "SessionChannel"] = {}  # subscription id -> channel, for the active ones
+        self.latest: Optional[tuple] = None  # (monotonic stamp, raw frame)
+        self.idle_since: Optional[float] = None
+
+
+class _Advertisement:
+    """A topic advertised on rosbridge, shared by the channels publishing on it."""
+
+    def __init__(self, msg_type: str, message: dict):
+        self.msg_type = msg_type
+        self.message = message
+        self.owners: Dict["SessionChannel", int] = {}
+        self.idle_since: Optional[float] = None
+
+
+class _PendingRequest:
+    def __init__(self):
+        self.event = threading.Event()
+        self.response: Optional[dict] = None
+
+
+class RosbridgeSession:
+    """
+    A single rosbridge connection shared by all the MCP clients of a long-running server.
+
+    A reader thread receives every frame and routes it: `publish` messages to the channels subscribed
+    to the topic, service responses and status messages to the channel whose request they answer.
+    Tools use a `SessionChannel`, which behaves like a `WebSocketManager`, so the same tool code
+    runs with a private connection (stdio) or with the shared session (HTTP transports).
+
+    Subscriptions and advertisements are reference-counted across channels: rosbridge merges the
+    subscriptions of a connection to the same topic, so each topic is received once whatever the
+    number of clients. When the last channel leaves a topic, the subscription (or advertisement)
+    lingers for `linger_s`, so that the next request for it finds the latest message already cached.
+    After a reconnection, subscriptions and advertisements are restored.
+    """
+
+    def __init__(
+        self,
+        manager: WebSocketManager,
+        linger_s: float = 10.0,
+        cache_max_age_s: float = 1.0,
+        channel_queue_size: int = 1000,
+    ):
+        """
+        Args:
+            manager (WebSocketManager): Connection to rosbridge, used by the session only
+            linger_s (float): How long unused subscriptions and advertisements are kept
+            cache_max_age_s (float): Maximum age of a cached message handed to a new subscriber
+            channel_queue_size (int): Messages buffered per channel; the oldest ones are dropped first
+        """
+        self.manager = manager
+        self.linger_s = linger_s
+        self.cache_max_age_s = cache_max_age_s
+        self.channel_queue_size = channel_queue_size
+        self.lock = threading.RLock()
+        self.topics: Dict[str, _Topic] = {}
+        self.advertisements: Dict[str, _Advertisement] = {}
+        self.channels: Dict[str, "SessionChannel"] = {}
+        self.pending: Dict[str, _PendingRequest] = {}
+        self.ids = itertools.count(1)
+        self.reader: Optional[threading.Thread] = None
+        self.running = False
+        self.connections_seen = 0
+
+    @property
+    def link_monitor(self):
+        return self.manager.link_monitor
+
+    @property
+    def default_timeout(self) -> float:
+        return self.manager.default_timeout
+
+    def start(self):
+        """Start the reader thread; the connection is opened, and reopened, by the thread."""
+        with self.lock:
+            if self.reader is not None:
+                return
+            self.running = True
+            self.reader = threading.Thread(target=self._read_loop, name=f"rosbridge-{self.manager.port}", daemon=True)
+            self.reader.start()
+
+    def stop(self):
+        self.running = False
+        if self.reader is not None:
+            self.reader.join(timeout=2.0)
+            self.reader = None
+        self.manager.close()
+
+    def channel(self, client_id: str) -> "SessionChannel":
+        """
+        Open a channel for one tool call of an MCP client.
+
+        Args:
+            client_id (str): MCP session id of the client, used to tag its requests
+        """
+        self.start()
+        with self.lock:
+            channel = SessionChannel(self, client_id, f"{client_id}:{next(self.ids)}")
+            self.channels[channel.id] = channel
+            return channel
+
+    def stats(self) -> Dict:
+        """Subscriptions, advertisements and channels currently held by the session."""
+        with self.lock:
+            return {
+                "connected": self.manager.ws is not None,
+                "connections": self.manager.connections,
+                "channels": len(self.channels),
+                "clients": len({c.client_id for c in self.channels.values()}),
+                "topics": {
+                    name: {"channels": len(t.channels), "lingering": t.idle_since is not None}
+                    for name, t in self.topics.items()
+                },
+                "advertisements": {
+                    name: {"type": a.msg_type, "channels": len(a.owners), "lingering": a.idle_since is not None}
+                    for name, a in self.advertisements.items()
+                },
+            }
+
+    # -- reader thread -------------------------------------------------------------------------
+
+    def _read_loop(self):
+        backoff = 0.5
+        while self.running:
+            raw = self.manager.receive(timeout=0.5)
+            if self.manager.connections != self.connections_seen:
+                self.connections_seen = self.manager.connections
+                self._restore()
+                backoff = 0.5
+            if raw is not None:
+                self._dispatch(raw)
+            elif self.manager.ws is None:
+                self._fail_pending("rosbridge connection lost")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 10.0)
+            self._expire(time.monotonic())
+
+    def _dispatch(self, raw: Union[str, bytes]):
+        match = _PUBLISH_HEADER.match(raw, 0, 256) if isinstance(raw, str) else None
+        if match is not None:
+            self._deliver(match.group(1), raw)
+            return
+
+        msg = parse_json(raw) if isinstance(raw, str) else decode_message(raw)
+        if msg is None:
+            return
+        op = msg.get("op")
+        if op == "png":
+            msg = decode_message(raw)
+            op = msg.get("op") if msg else None
+        if op == "publish":
+            self._deliver(msg.get("topic", ""), raw)
+        elif op == "service_response":
+            with self.lock:
+                pending = self.pending.pop(str(msg.get("id")), None)
+            if pending is not None:
+                pending.response = msg
+                pending.event.set()
+        elif op == "status":
+            self._route_status(msg, raw)
+
+    def _deliver(self, topic_name: str, raw: Union[str, bytes]):
+        with self.lock:
+            topic = self.topics.get(topic_name)
+            if topic is None:
+                return
+            topic.latest = (time.monotonic(), raw)
+            channels = list(topic.channels)
+        for channel in channels:
+            channel._put(raw)
+
+    def _route_status(self, msg: dict, raw: Union[str, bytes]):
+        """Status messages go to the channel whose operation caused them, or to everyone if they carry no id."""
+        msg_id = str(msg.get("id") or "")
+        with self.lock:
+            if msg_id:
+                channels = [c for c in self.channels.values() if msg_id.startswith(c.id + ":")]
+            else:
+                channels = list(self.channels.values())
+        for channel in channels:
+            channel._put(raw)
+
+    def _restore(self):
+        """Subscribe and advertise again after a (re)connection."""
+        with self.lock:
+            messages = [a.message for a in self.advertisements.values()]
+            messages += [m for t in self.topics.values() for m in t.subscriptions.values()]
+            if messages and self.connections_seen > 1:
+                print(f"[Rosbridge] Reconnected, restoring {len(messages)} subscriptions and advertisements")
+            for message in messages:
+                self.manager.send(message)
+
+    def _fail_pending(self, error: str):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for request in pending.values():
+            request.response = {"error": error}
+            request.event.set()
+
+    def _expire(self, now: float):
+        """Drop the subscriptions and advertisements unused for longer than the linger time."""
+        with self.lock:
+            for name, topic in list(self.topics.items()):
+                if topic.idle_since is not None and now - topic.idle_since > self.linger_s:
+                    for sub_id in topic.subscriptions:
+                        self.manager.send({"op": "unsubscribe", "topic": name, "id": sub_id})
+                    del self.topics[name]
+            for name, advertisement in list(self.advertisements.items()):
+                if advertisement.idle_since is not None and now - advertisement.idle_since > self.linger_s:
+                    self.manager.send({"op": "unadvertise", "topic": name})
+                    del self.advertisements[name]
+
+    # -- operations on behalf of channels ------------------------------------------------------
+
+    def _send(self, channel: "SessionChannel", message: dict) -> Optional[str]:
+        op = message.get("op")
+        with self.lock:
+            if op == "subscribe":
+                return self._subscribe(channel, message)
+            if op == "unsubscribe":
+                return self._unsubscribe(channel, message.get("topic", ""))
+            if op == "advertise":
+                return self._advertise(channel, message)
+            if op == "unadvertise":
+                return self._unadvertise(channel, message.get("topic", ""))
+            if "id" not in message:
+                message = {**message, "id": f"{channel.id}:{op}:{next(self.ids)}"}
+            return self.manager.send(message)
+
+    def _subscribe(self, channel: "SessionChannel", message: dict) -> Optional[str]:
+        name = message.get("topic", "")
+        sub_id = f"{channel.id}:sub:{next(self.ids)}"
+        message = {**message, "id": sub_id}
+        topic = self.topics.setdefault(name, _Topic())
+
+        error = self.manager.send(message)
+        if error:
+            if not topic.subscriptions:
+                del self.topics[name]
+            return error
+
+        # Subscriptions left over by channels that are gone are replaced by the new one
+        for old_id in [i for i in topic.subscriptions if i not in topic.owners]:
+            self.manager.send({"op": "unsubscribe", "topic": name, "id": old_id})
+            del topic.subscriptions[old_id]
+        topic.subscriptions[sub_id] = message
+        topic.owners[sub_id] = channel
+        topic.idle_since = None
+        topic.channels.add(channel)
+        channel.topics.add(name)
+
+        if topic.latest is not None and time.monotonic() - topic.latest[0] <= self.cache_max_age_s:
+            channel._put(topic.latest[1])
+        return None
+
+    def _unsubscribe(self, channel: "SessionChannel", name: str) -> Optional[str]:
+        topic = self.topics.get(name)
+        channel.topics.discard(name)
+        if topic is None or channel not in topic.channels:
+            return None
+        topic.channels.discard(channel)
+        own_ids = [i for i, c in topic.owners.items() if c is channel]
+        for sub_id in own_ids:
+            del topic.owners[sub_id]
+        if topic.channels:
+            for sub_id in own_ids:
+                del topic.subscriptions[sub_id]
+                self.manager.send({"op": "unsubscribe", "topic": name, "id": sub_id})
+        else:
+            topic.idle_since = time.monotonic()  # keep receiving, and caching, for a while
+        return None
+
+    def _advertise(self, channel: "SessionChannel", message: dict) -> Optional[str]:
+        name, msg_type = message.get("topic", ""), message.get("type", "")
+        advertisement = self.advertisements.get(name)
+        if advertisement is not None and advertisement.msg_type != msg_type:
+            if advertisement.owners:
+                return f"Topic {name} is already advertised with type {advertisement.msg_type} by another client"
+            self.manager.send({"op": "unadvertise", "topic": name})
+            advertisement = None
+
+        if advertisement is None:
+            message = {**message, "id": f"{channel.id}:advertise:{next(self.ids)}"}
+            error = self.manager.send(message)
+            if error:
+                return error
+            advertisement = self.advertisements[name] = _Advertisement(msg_type, message)
+
+        advertisement.owners[channel] = advertisement.owners.get(channel, 0) + 1
+        advertisement.idle_since = None
+        channel.advertisements.add(name)
+        return None
+
+    def _unadvertise(self, channel: "SessionChannel", name: str) -> Optional[str]:
+        advertisement = self.advertisements.get(name)
+        if advertisement is None or channel not in advertisement.owners:
+            return None
+        advertisement.owners[channel] -= 1
+        if advertisement.owners[channel] == 0:
+            del advertisement.owners[channel]
+            channel.advertisements.discard(name)
+        if not advertisement.owners:
+            advertisement.idle_since = time.monotonic()
+        return None
+
+    def _request(self, channel: "SessionChannel", message: dict, timeout: Optional[float]) -> dict:
+        request_id = f"{channel.id}:{message.get('id', message.get('op'))}:{next(self.ids)}"
+        with self.lock:
+            pending = self.pending[request_id] = _PendingRequest()
+        start = time.monotonic()
+        error = self.manager.send({**message, "id": request_id})
+        if error:
+            with self.lock:
+                self.pending.pop(request_id, None)
+            return {"error": error}
+
+        if not pending.event.wait(timeout if timeout is not None else self.default_timeout):
+            with self.lock:
+                self.pending.pop(request_id, None)
+            return {"error": "no response or timeout from rosbridge"}
+        self.link_monitor.record_rtt(time.monotonic() - start)
+        response = pending.response or {}
+        if "id" in message and "id" in response:
+            response["id"] = message["id"]
+        return response
+
+    def _request_many(self, channel: "SessionChannel", messages: List[dict], timeout: Optional[float]) -> List[dict]:
+        requests = []
+        with self.lock:
+            for message in messages:
+                request_id = f"{channel.id}:{message.get('id', message.get('op'))}:{next(self.ids)}"
+                requests.append((request_id, self.pending.setdefault(request_id, _PendingRequest())))
+        start = time.monotonic()
+        errors = {}
+        for (request_id, _), message in zip(requests, messages):
+            errors[request_id] = self.manager.send({**message, "id": request_id})
+
+        deadline = start + (timeout if timeout is not None else self.default_timeout)
+        responses = []
+        for (request_id, pending), message in zip(requests, messages):
+            if errors[request_id] is None and pending.event.wait(max(deadline - time.monotonic(), 0.0)):
+                if not responses:
+                    self.link_monitor.record_rtt(time.monotonic() - start)
+                response = pending.response or {}
+                if "id" in message:
+                    response["id"] = message["id"]
+                responses.append(response)
+                continue
+            with self.lock:
+                self.pending.pop(request_id, None)
+            responses.append({"error": errors[request_id] or "no response or timeout from rosbridge"})
+        return responses
+
+    def _release(self, channel: "SessionChannel"):
+        with self.lock:
+            for name in list(channel.topics):
+                self._unsubscribe(channel, name)
+            for name in list(channel.advertisements):
+                advertisement = self.advertisements.get(name)
+                while advertisement is not None and channel in advertisement.owners:
+                    self._unadvertise(channel, name)
+            self.channels.pop(channel.id, None)
+
+
+class SessionChannel:
+    """
+    The view of a `RosbridgeSession` given to one tool call, with the interface of a `WebSocketManager`.
+
+    Only the messages for the channel's own subscriptions and requests are received. Closing the channel
+    (or leaving its `with` block) releases its subscriptions and advertisements, not the connection.
+    """
+
+    def __init__(self, session: RosbridgeSession, client_id: str, channel_id: str):
+        self.session = session
+        self.client_id = client_id
+        self.id = channel_id
+        self.queue: queue.Queue = queue.Queue(maxsize=session.channel_queue_size)
+        self.topics: Set[str] = set()
+        self.advertisements: Set[str] = set()
+
+    @property
+    def link_monitor(self):
+        return self.session.link_monitor
+
+    @property
+    def default_timeout(self) -> float:
+        return self.session.default_timeout
+
+    def _put(self, raw: Union[str, bytes]):
+        while True:
+            try:
+                self.queue.put_nowait(raw)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()  # drop the oldest message
+                except queue.Empty:
+                    pass
+
+    def send(self, message: dict) -> Optional[str]:
+        """
+        Send a message through the shared session.
+
+        Returns:
+            None if successful, or an error message string.
+        """
+        return self.session._send(self, message)
+
+    def receive(self, timeout: Optional[float] = None) -> Optional[Union[str, bytes]]:
+        """
+        Receive the next message for this channel within the given timeout.
+
+        Returns:
+            The raw rosbridge message, or None on timeout.
+        """
+        try:
+            return self.queue.get(timeout=timeout if timeout is not None else self.default_timeout)
+        except queue.Empty:
+            return None
+
+    def request(self, message: dict, timeout: Optional[float] = None) -> dict:
+        """
+        Send a request to rosbridge and wait for the response with the matching id.
+
+        Returns:
+            dict: Parsed response, or {"error": "<error message>"}.
+        """
+        return self.session._request(self, message, timeout)
+
+    def request_many(self, messages: List[dict], timeout: Optional[float] = None) -> List[dict]:
+        """Send several requests at once and wait for all their responses, see `WebSocketManager.request_many`."""
+        return self.session._request_many(self, messages, timeout)
+
+    def probe(self) -> Optional[str]:
+        message = {"op": "call_service", "service": "/rosapi/get_time", "type": "rosapi/GetTime", "id": "probe"}
+        return self.request(message).get("error")
+
+    def close(self):
+        self.session._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
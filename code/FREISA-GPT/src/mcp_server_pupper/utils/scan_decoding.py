@@ -0,0 +1,170 @@
+import base64
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# sensor_msgs/PointField datatype -> NumPy type code
+POINTFIELD_DTYPES = {1: "i1", 2: "u1", 3: "i2", 4: "u2", 5: "i4", 6: "u4", 7: "f4", 8: "f8"}
+
+
+def _as_bytes(data) -> bytes:
+    """`uint8[]` fields are base64 strings in JSON and byte strings in CBOR."""
+    if isinstance(data, str):
+        return base64.b64decode(data)
+    if isinstance(data, np.ndarray):
+        return data.tobytes()
+    if isinstance(data, list):
+        return bytes(data)
+    return data
+
+
+def decode_laser_scan(msg: dict) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decode a `sensor_msgs/LaserScan` message.
+
+    Args:
+        msg (dict): LaserScan message; `ranges` is a list (JSON) or a float32 array (CBOR)
+
+    Returns:
+        tuple: (angles [rad], ranges [m], valid mask) as NumPy arrays. Ranges outside
+            [range_min, range_max], infinite or NaN (null in JSON) are marked invalid.
+    """
+    ranges = np.asarray(msg.get("ranges", []), dtype=np.float32)  # None (JSON null) becomes NaN
+    angles = msg.get("angle_min", 0.0) + np.arange(ranges.size, dtype=np.float32) * msg.get("angle_increment", 0.0)
+    with np.errstate(invalid="ignore"):
+        valid = np.isfinite(ranges) & (ranges >= msg.get("range_min", 0.0)) & (ranges <= msg.get("range_max", np.inf))
+    return angles, ranges, valid
+
+
+def pointcloud2_dtype(msg: dict) -> np.dtype:
+    """
+    Build the structured dtype of the points of a `sensor_msgs/PointCloud2` message from its `fields`.
+    """
+    endianness = ">" if msg.get("is_bigendian") else "<"
+    names, formats, offsets = [], [], []
+    for field in msg.get("fields", []):
+        code = POINTFIELD_DTYPES.get(field.get("datatype"))
+        if code is None:
+            raise ValueError(f"Unsupported PointField datatype {field.get('datatype')} for '{field.get('name')}'")
+        count = field.get("count", 1) or 1
+        names.append(field["name"])
+        formats.append(f"{endianness}{code}" if count == 1 else (f"{endianness}{code}", (count,)))
+        offsets.append(field["offset"])
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": msg["point_step"]})
+
+
+def decode_point_cloud2(msg: dict) -> np.ndarray:
+    """
+    Decode the points of a `sensor_msgs/PointCloud2` message without per-point Python work.
+
+    Args:
+        msg (dict): PointCloud2 message
+
+    Returns:
+        np.ndarray: Structured array of `height * width` points, one named column per field.
+    """
+    dtype = pointcloud2_dtype(msg)
+    data = _as_bytes(msg.get("data", b""))
+    height, width = msg.get("height", 1), msg.get("width", 0)
+    row_step = msg.get("row_step", width * dtype.itemsize)
+
+    if row_step == width * dtype.itemsize:
+        return np.frombuffer(data, dtype=dtype, count=height * width)
+    # Rows are padded: drop the padding before reinterpreting the bytes
+    rows = np.frombuffer(data, dtype=np.uint8, count=height * row_step).reshape(height, row_step)
+    return np.ascontiguousarray(rows[:, : width * dtype.itemsize]).view(dtype).reshape(-1)
+
+
+def point_cloud_to_polar(
+    points: np.ndarray, z_min: float = -np.inf, z_max: float = np.inf
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Project the points within a height band onto the ground plane.
+
+    Returns:
+        tuple: (angles [rad], ranges [m], valid mask), like `decode_laser_scan`.
+    """
+    x, y = points["x"].astype(np.float32), points["y"].astype(np.float32)
+    z = points["z"].astype(np.float32) if "z" in (points.dtype.names or ()) else np.zeros_like(x)
+    with np.errstate(invalid="ignore"):
+        valid = np.isfinite(x) & np.isfinite(y) & np.isfinite(z) & (z >= z_min) & (z <= z_max)
+    return np.arctan2(y, x), np.hypot(x, y), valid
+
+
+def summarize_ranges(
+    angles: np.ndarray,
+    ranges: np.ndarray,
+    valid: np.ndarray,
+    sectors: int = 12,
+    clearance: float = 0.5,
+    angle_span: Optional[Tuple[float, float]] = None,
+    out_of_range: Optional[np.ndarray] = None,
+) -> Dict:
+    """
+    Summarize a scan as a sector-wise minimum-range histogram.
+
+    Bearings follow ROS conventions: 0° is straight ahead (x axis), positive angles are to the left.
+    A sector without any valid return is free only if it has readings meaning that nothing is within
+    range (+inf in a LaserScan); otherwise whether it is free is unknown (None).
+
+    Args:
+        angles (np.ndarray): Bearing of each return, in radians
+        ranges (np.ndarray): Range of each return, in meters
+        valid (np.ndarray): Mask of the returns to consider
+        sectors (int): Number of angular sectors
+        clearance (float): Minimum distance (m) for a sector to count as free
+        angle_span (Optional[tuple]): (min, max) angles covered by the sectors; defaults to the full circle
+        out_of_range (Optional[np.ndarray]): Mask of the readings meaning that nothing is within range
+
+    Returns:
+        dict: Per-sector minimum range and free state, nearest obstacle, free and unknown directions and
+            valid-return ratio.
+    """
+    if angle_span is None:
+        # Full circle, with one sector centered straight behind (and so, for even counts, one straight ahead)
+        width = 2 * np.pi / sectors
+        centers = np.degrees(-np.pi + np.arange(sectors) * width)
+
+        def sector_of(x: np.ndarray) -> np.ndarray:
+            return (np.mod(x + np.pi + width / 2, 2 * np.pi) // width).astype(np.int64) % sectors
+
+    else:
+        lo, hi = angle_span
+        width = (hi - lo) / sectors
+        centers = np.degrees(lo + (np.arange(sectors) + 0.5) * width)
+
+        def sector_of(x: np.ndarray) -> np.ndarray:
+            return np.clip(((x - lo) / width).astype(np.int64), 0, sectors - 1)
+
+    a, r = angles[valid], ranges[valid]
+    mins = np.full(sectors, np.inf, dtype=np.float64)
+    np.minimum.at(mins, sector_of(a), r)
+
+    # Sectors without valid returns are free only if their readings say nothing is within range
+    known = np.isfinite(mins)
+    if out_of_range is not None:
+        known[sector_of(angles[out_of_range & ~valid])] = True
+    free = known & (mins > clearance)
+    summary: Dict = {
+        "sectors": [
+            {
+                "bearing_deg": round(float(c), 1),
+                "min_range_m": round(float(m), 3) if np.isfinite(m) else None,
+                "free": bool(f) if k else None,
+            }
+            for c, m, k, f in zip(centers, mins, known, free)
+        ],
+        "free_directions_deg": [round(float(c), 1) for c in centers[free]],
+        "unknown_directions_deg": [round(float(c), 1) for c in centers[~known]],
+        "clearance_m": clearance,
+        "valid_ratio": round(float(valid.mean()), 3) if valid.size else 0.0,
+    }
+    if r.size:
+        nearest = int(np.argmin(r))
+        summary["nearest_obstacle"] = {
+            "bearing_deg": round(float(np.degrees(a[nearest])), 1),
+            "range_m": round(float(r[nearest]), 3),
+        }
+    else:
+        summary["nearest_obstacle"] = None
+    return summary
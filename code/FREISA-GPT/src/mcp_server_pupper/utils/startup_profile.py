@@ -0,0 +1,54 @@
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple
+
+
+class StartupProfile:
+    """
+    Records how long each start-up phase of the server takes.
+
+    Phases are delimited by calls to `mark()`; each one lasts from the previous mark (or the
+    creation of the profile) to the current one. The report goes to stderr, since stdout carries
+    the MCP messages with the stdio transport.
+
+    Only the standard library is imported here, so that the profile can be created before the heavy imports.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.last = self.origin
+        self.phases: List[Tuple[str, float]] = []
+        self.lock = threading.Lock()
+        self.enabled = False
+
+    def mark(self, phase: str) -> float:
+        """
+        End a phase.
+
+        Returns:
+            float: Duration of the phase, in seconds.
+        """
+        with self.lock:
+            now = time.perf_counter()
+            elapsed = now - self.last
+            self.phases.append((phase, elapsed))
+            self.last = now
+            return elapsed
+
+    def event(self, name: str, duration_s: Optional[float] = None):
+        """Report an event happening off the main start-up sequence, e.g. in a background thread."""
+        if not self.enabled:
+            return
+        since_start = (time.perf_counter() - self.origin) * 1000.0
+        took = f" (took {duration_s * 1000.0:.1f} ms)" if duration_s is not None else ""
+        print(f"[startup] {name} at {since_start:.1f} ms{took}", file=sys.stderr, flush=True)
+
+    def report(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            lines = [f"[startup] {phase:<28} {elapsed * 1000.0:>8.1f} ms" for phase, elapsed in self.phases]
+            total = (self.last - self.origin) * 1000.0
+        lines.append(f"[startup] {'total':<28} {total:>8.1f} ms")
+        print("\n".join(lines), file=sys.stderr, flush=True)
@@ -0,0 +1,92 @@
+from typing import Dict
+
+import numpy as np
+
+# Percentiles reported for inter-arrival periods and message sizes
+PERCENTILES = (50, 90, 99)
+
+
+class TopicStats:
+    """
+    Rate and bandwidth statistics for a single topic, similar to `ros2 topic hz` and `ros2 topic bw`.
+
+    Arrival timestamps and message sizes are written into preallocated NumPy buffers,
+    so recording a message is O(1) and statistics are computed in a single vectorized pass.
+    Once the buffers are full, messages are still counted in the bandwidth but no longer in the
+    rate and size distributions.
+    """
+
+    def __init__(self, topic: str, capacity: int = 10000):
+        self.topic = topic
+        self.capacity = capacity
+        self.stamps = np.empty(capacity, dtype=np.float64)
+        self.sizes = np.empty(capacity, dtype=np.int64)
+        self.count = 0
+        self.dropped = 0
+        self.total_bytes = 0  # of every message, dropped ones included
+
+    def record(self, stamp: float, size: int) -> bool:
+        """
+        Record the arrival of a message.
+
+        Args:
+            stamp (float): Arrival time in seconds (monotonic clock).
+            size (int): Size of the message on the wire, in bytes.
+
+        Returns:
+            bool: False if the buffer is full and the message was only counted in the bandwidth.
+        """
+        self.total_bytes += size
+        if self.count >= self.capacity:
+            self.dropped += 1
+            return False
+        self.stamps[self.count] = stamp
+        self.sizes[self.count] = size
+        self.count += 1
+        return True
+
+    def summary(self, window: float) -> Dict:
+        """
+        Compute rate, jitter and size statistics over the recorded messages.
+
+        Args:
+            window (float): Length of the measurement window in seconds, used for bytes/s.
+
+        Returns:
+            dict: Message count, rate (Hz), inter-arrival period percentiles and jitter (ms),
+                message size distribution (bytes) and bandwidth (bytes/s).
+        """
+        n = self.count
+        result: Dict = {"topic": self.topic, "count": n, "dropped": self.dropped}
+        if n == 0:
+            result["warning"] = "No messages received"
+            return result
+
+        sizes = self.sizes[:n]
+        size_pct = np.percentile(sizes, PERCENTILES)
+        result["size_bytes"] = {
+            "mean": float(sizes.mean()),
+            "min": int(sizes.min()),
+            "max": int(sizes.max()),
+            **{f"p{p}": float(v) for p, v in zip(PERCENTILES, size_pct)},
+        }
+        result["total_bytes"] = self.total_bytes
+        result["bytes_per_s"] = self.total_bytes / window if window > 0 else None
+
+        if n < 2:
+            result["warning"] = "Not enough messages to compute the rate"
+            return result
+
+        periods = np.diff(self.stamps[:n]) * 1000.0
+        period_pct = np.percentile(periods, PERCENTILES)
+        span = self.stamps[n - 1] - self.stamps[0]
+        result["rate_hz"] = float((n - 1) / span) if span > 0 else None
+        result["period_ms"] = {
+            "mean": float(periods.mean()),
+            "min": float(periods.min()),
+            "max": float(periods.max()),
+            **{f"p{p}": float(v) for p, v in zip(PERCENTILES, period_pct)},
+        }
+        # Jitter as the standard deviation of the inter-arrival period, like `ros2 topic hz`
+        result["jitter_ms"] = float(periods.std())
+        return result
@@ -2,14 +2,24 @@
 import json
 import os
 import threading
-from typing import Optional, Tuple, Union
+import time
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union
 
-import cv2
-import numpy as np
-import websocket
+from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory
+from websockets.protocol import State
+from websockets.sync.client import connect as ws_connect
 
+from . import cbor
+from .fragments import FragmentAssembler
+from .link_quality import LinkMonitor
 from .network_utils import ping_ip_and_port
 
+if TYPE_CHECKING:
+    import numpy as np
+
+# OpenCV and NumPy take a large share of the server start-up time, so they are only
+# imported by the functions handling images and compressed payloads.
+
 
 def parse_json(raw: Optional[str | bytes]) -> Optional[dict]:
     """
@@ -32,36 +42,98 @@ def parse_json(raw: Optional[str | bytes]) -> Optional[dict]:
         return None
 
 
-def parse_image(raw: Optional[Union[str, bytes]]) -> Optional[dict]:
+def decode_png_payload(data_b64: str) -> Optional[str]:
     """
-    Decode a image message (json with base64 data) and save as PNG.
+    Decode the payload of a rosbridge `png` message, i.e. a JSON string packed into the pixels of a PNG image.
 
     Args:
-        raw: JSON string, bytes, or None
+        data_b64: base64 encoded PNG image
 
     Returns:
-        Parsed dict if successful, None if raw is None, parsing fails, or result is not a dict
+        The original JSON string, or None if decoding fails
     """
+    import cv2
+    import numpy as np
 
-    if raw is None:
+    try:
+        png = np.frombuffer(base64.b64decode(data_b64), dtype=np.uint8)
+    except (ValueError, TypeError):
+        return None
+    img = cv2.imdecode(png, cv2.IMREAD_COLOR)
+    if img is None:
         return None
+    # rosbridge packs the bytes as RGB and pads them with newlines
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB).tobytes().rstrip(b"\n").decode("utf-8", errors="replace")
 
-    try:
-        result = json.loads(raw)
-        msg = result["msg"]
-    except (json.JSONDecodeError, KeyError):
-        print("[Image] Invalid JSON or missing 'msg' field.")
+
+def decode_message(raw: Optional[Union[str, bytes]]) -> Optional[dict]:
+    """
+    Decode a rosbridge frame, whatever the compression requested on subscribe.
+
+    Args:
+        raw: JSON text frame, JSON `png` message, CBOR binary frame, or None
+
+    Returns:
+        Parsed dict if successful, None otherwise
+    """
+    if raw is None:
         return None
+    if isinstance(raw, bytes):
+        try:
+            result = cbor.loads(raw)
+        except (cbor.CBORDecodeError, UnicodeDecodeError):
+            return parse_json(raw)
+        return result if isinstance(result, dict) else None
+
+    result = parse_json(raw)
+    if result is not None and result.get("op") == "png":
+        return parse_json(decode_png_payload(result.get("data", "")))
+    return result
+
+
+def jsonable(value):
+    """
+    Convert decoded message content into JSON-serializable values.
+    Byte arrays are base64 encoded, as rosbridge does for `uint8[]` in JSON.
+    """
+    if isinstance(value, dict):
+        return {k: jsonable(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [jsonable(v) for v in value]
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode("ascii")
+    if hasattr(value, "tolist"):  # NumPy array from a CBOR typed array
+        return value.tolist()
+    return value
+
+
+# Depth image encodings -> NumPy type
+DEPTH_ENCODINGS = {"16UC1": "u2", "mono16": "u2", "32FC1": "f4"}
+
+
+def decode_image(msg: dict) -> Optional["np.ndarray"]:
+    """
+    Convert a `sensor_msgs/Image` message into an OpenCV (BGR or mono) array.
+    Depth images (16UC1/mono16 in millimeters, 32FC1 in meters) keep their values and type.
+
+    Args:
+        msg: Image message, with `data` either base64 encoded (JSON) or raw bytes (CBOR)
+
+    Returns:
+        The image array, or None if the message cannot be decoded
+    """
+    import cv2
+    import numpy as np
 
     height, width, encoding = msg.get("height"), msg.get("width"), msg.get("encoding")
-    data_b64 = msg.get("data")
+    data = msg.get("data")
 
-    if not all([height, width, encoding, data_b64]):
+    if not all([height, width, encoding]) or data is None or len(data) == 0:
         print("[Image] Missing required fields in message.")
         return None
 
     # Decode base64 to numpy array
-    image_bytes = base64.b64decode(data_b64)
+    image_bytes = base64.b64decode(data) if isinstance(data, str) else data
     img_np = np.frombuffer(image_bytes, dtype=np.uint8)
 
     # Encoding handlers
@@ -73,30 +145,99 @@ def parse_image(raw: Optional[Union[str, bytes]]) -> Optional[dict]:
             img_cv = img_np.reshape((height, width, 3))
         elif encoding == "mono8":
             img_cv = img_np.reshape((height, width))
+        elif encoding in DEPTH_ENCODINGS:
+            dtype = np.dtype(DEPTH_ENCODINGS[encoding]).newbyteorder(">" if msg.get("is_bigendian") else "<")
+            # Rows may be padded: `step` is the row length in bytes
+            step = msg.get("step") or width * dtype.itemsize
+            rows = img_np[: height * step].reshape((height, step))[:, : width * dtype.itemsize]
+            img_cv = np.ascontiguousarray(rows).view(dtype).reshape((height, width)).astype(dtype.newbyteorder("="))
         else:
             print(f"[Image] Unsupported encoding: {encoding}")
             return None
     except ValueError as e:
         print(f"[Image] Reshape error: {e}")
         return None
+    return img_cv
+
+
+def parse_image(raw: Optional[Union[str, bytes]]) -> Optional[dict]:
+    """
+    Decode a image message (json with base64 data, or CBOR) and save as PNG.
+
+    Args:
+        raw: JSON string, bytes, or None
+
+    Returns:
+        Parsed dict if successful, None if raw is None, parsing fails, or result is not a dict
+    """
+
+    if raw is None:
+        return None
+
+    result = decode_message(raw)
+    if result is None or "msg" not in result:
+        print("[Image] Invalid JSON or missing 'msg' field.")
+        return None
+
+    # Status and other non-image messages are passed through untouched
+    if result.get("op") != "publish":
+        return result
+
+    img_cv = decode_image(result["msg"])
+    if img_cv is None:
+        return None
 
     if not os.path.exists("./camera"):
         os.makedirs("./camera")
 
+    import cv2
+    import numpy as np
+
+    if img_cv.dtype.kind == "f":
+        # 32FC1 depth in meters, saved as 16-bit millimeters like 16UC1 (0 for invalid pixels)
+        depth_m = np.nan_to_num(img_cv, nan=0.0, posinf=0.0, neginf=0.0)
+        img_cv = (depth_m.clip(0, 65.535) * 1000.0).round().astype(np.uint16)
     success = cv2.imwrite("./camera/received_image.png", img_cv)
     if success:
-        return result if isinstance(result, dict) else None
+        return result
     else:
         return None
 
 
+def _is_fragment(raw: Union[str, bytes]) -> bool:
+    """Cheap check for rosbridge `fragment` messages, whose `op` field comes first."""
+    return isinstance(raw, str) and '"fragment"' in raw[:32]
+
+
 class WebSocketManager:
-    def __init__(self, ip: str, port: int, default_timeout: float = 2.0):
+    def __init__(
+        self,
+        ip: str,
+        port: int,
+        default_timeout: float = 2.0,
+        compression_level: Optional[int] = 6,
+        link_monitor: Optional[LinkMonitor] = None,
+    ):
+        """
+        Args:
+            ip (str): rosbridge address
+            port (int): rosbridge port
+            default_timeout (float): Connection and receive timeout in seconds
+            compression_level (Optional[int]): zlib level (0-9) used to compress outgoing frames with
+                permessage-deflate. None disables the extension, e.g. for already-compressed image payloads.
+                Incoming frames are compressed by rosbridge only if it runs with `use_compression:=true`.
+            link_monitor (Optional[LinkMonitor]): Link quality estimator, to share one between managers
+        """
         self.ip = ip
         self.port = port
         self.default_timeout = default_timeout
+        self.compression_level = compression_level
+        self.compression_negotiated = False
+        self.connections = 0  # successful connections so far, to detect reconnections
         self.ws = None
         self.lock = threading.RLock()
+        self.link_monitor = link_monitor if link_monitor is not None else LinkMonitor()
+        self.fragments = FragmentAssembler(timeout_s=max(default_timeout, 5.0))
 
     def test_connection(self) -> Tuple[bool, str]:
         result = ping_ip_and_port(self.ip, self.port, self.default_timeout, self.default_timeout)
@@ -119,11 +260,32 @@ def connect(self) -> Optional[str]:
             or an error message string if connection failed.
         """
         with self.lock:
-            if self.ws is None or not self.ws.connected:
+            if self.ws is None or self.ws.protocol.state is not State.OPEN:
                 try:
                     url = f"ws://{self.ip}:{self.port}"
-                    self.ws = websocket.create_connection(url, timeout=self.default_timeout)
-                    print(f"[WebSocket] Connected ({self.default_timeout}s timeout)")
+                    extensions = None
+                    if self.compression_level is not None:
+                        extensions = [
+                            ClientPerMessageDeflateFactory(
+                                client_max_window_bits=True,
+                                compress_settings={"level": self.compression_level, "memLevel": 5},
+                            )
+                        ]
+                    self.ws = ws_connect(
+                        url,
+                        open_timeout=self.default_timeout,
+                        compression=None,
+                        extensions=extensions,
+                        max_size=None,  # images and point clouds easily exceed the 1 MiB default
+                        proxy=None,
+                    )
+                    self.compression_negotiated = any(
+                        ext.name == "permessage-deflate" for ext in self.ws.protocol.extensions
+                    )
+                    self.fragments = FragmentAssembler(timeout_s=self.fragments.timeout_s)
+                    self.connections += 1
+                    deflate = "on" if self.compression_negotiated else "off"
+                    print(f"[WebSocket] Connected ({self.default_timeout}s timeout, permessage-deflate {deflate})")
                     return None  # no error
                 except Exception as e:
                     error_msg = f"[WebSocket] Connection error: {e}"
@@ -166,6 +328,7 @@ def send(self, message: dict) -> Optional[str]:
     def receive(self, timeout: Optional[float] = None) -> Optional[Union[str, bytes]]:
         """
         Receive a single message from rosbridge within the given timeout.
+        Fragmented messages are reassembled, so only complete messages are returned.
 
         Args:
             timeout (Optional[float]): Seconds to wait before timing out.
@@ -174,20 +337,45 @@ def receive(self, timeout: Optional[float] = None) -> Optional[Union[str, bytes]
         Returns:
             Optional[str]: JSON string received from rosbridge, or None if timeout/error.
         """
+        # The lock is not held while waiting, so that another thread can send in the meantime
         with self.lock:
             self.connect()
-            if self.ws:
-                try:
-                    # Use default timeout if none specified
-                    actual_timeout = timeout if timeout is not None else self.default_timeout
-                    # Temporarily set the receive timeout
-                    self.ws.settimeout(actual_timeout)
-                    raw = self.ws.recv()  # rosbridge sends JSON as a string
+            ws = self.ws
+        if ws is None:
+            return None
+        try:
+            # Use default timeout if none specified
+            actual_timeout = timeout if timeout is not None else self.default_timeout
+            deadline = time.monotonic() + actual_timeout
+            previous_fragment = None
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                start = time.monotonic()
+                raw = ws.recv(timeout=remaining)  # rosbridge sends JSON as a string
+                end = time.monotonic()
+                if not _is_fragment(raw):
+                    self.link_monitor.record_transfer(len(raw), end - start)
                     return raw
-                except Exception as e:
-                    print(f"[WebSocket] Receive error or timeout: {e}")
+                # rosbridge sends the fragments of a message back to back: the time since the
+                # previous one was spent on the link only
+                if previous_fragment is not None:
+                    self.link_monitor.record_transfer(len(raw), end - previous_fragment, back_to_back=True)
+                previous_fragment = end
+                fragment = parse_json(raw)
+                message = self.fragments.add(fragment) if fragment else None
+                if message is not None:
+                    return message
+        except TimeoutError:
+            # Idle timeout: keep the connection (and its subscriptions) open
+            return None
+        except Exception as e:
+            print(f"[WebSocket] Receive error or timeout: {e}")
+            with self.lock:
+                if self.ws is ws:
                     self.close()
-                    return None
+                    self.ws = None
             return None
 
     def request(self, message: dict, timeout: Optional[float] = None) -> dict:
@@ -211,9 +399,11 @@ def request(self, message: dict, timeout: Optional[float] = None) -> dict:
             return {"error": send_error}
 
         # Attempt to receive a response (connect() is called internally in receive())
+        start = time.monotonic()
         response = self.receive(timeout=timeout)
         if response is None:
             return {"error": "no response or timeout from rosbridge"}
+        self.link_monitor.record_rtt(time.monotonic() - start)
 
         # Attempt to parse JSON
         parsed_response = parse_json(response)
@@ -222,9 +412,60 @@ def request(self, message: dict, timeout: Optional[float] = None) -> dict:
             return {"error": "invalid_json", "raw": response}
         return parsed_response
 
+    def request_many(self, messages: List[dict], timeout: Optional[float] = None) -> List[dict]:
+        """
+        Send several requests at once and collect their responses, matched by id as they arrive.
+
+        All the requests are in flight together, so the whole batch takes about one round trip
+        instead of one per request.
+
+        Args:
+            messages (List[dict]): Rosbridge requests (e.g. `call_service`)
+            timeout (Optional[float]): Seconds to wait for all the responses. If None, uses the default timeout.
+
+        Returns:
+            List[dict]: The response to each request, in order, or {"error": "<error message>"}.
+        """
+        responses: List[dict] = [{"error": "no response or timeout from rosbridge"}] * len(messages)
+        waiting = {}
+        for index, message in enumerate(messages):
+            request_id = f"{message.get('id', message.get('op'))}:batch:{index}"
+            send_error = self.send({**message, "id": request_id})
+            if send_error:
+                responses[index] = {"error": send_error}
+            else:
+                waiting[request_id] = index
+
+        start = time.monotonic()
+        deadline = start + (timeout if timeout is not None else self.default_timeout)
+        while waiting and time.monotonic() < deadline:
+            response = parse_json(self.receive(timeout=max(deadline - time.monotonic(), 0.01)))
+            index = waiting.pop(str(response.get("id")), None) if response else None
+            if index is None:
+                continue  # not a response to this batch
+            if len(waiting) == len(messages) - 1:
+                self.link_monitor.record_rtt(time.monotonic() - start)
+            if "id" in messages[index]:
+                response["id"] = messages[index]["id"]
+            else:
+                response.pop("id", None)
+            responses[index] = response
+        return responses
+
+    def probe(self) -> Optional[str]:
+        """
+        Measure the round-trip time to rosbridge with a lightweight rosapi call.
+
+        Returns:
+            None if successful, or an error message string.
+        """
+        message = {"op": "call_service", "service": "/rosapi/get_time", "type": "rosapi/GetTime", "id": "probe"}
+        response = self.request(message)
+        return response.get("error")
+
     def close(self):
         with self.lock:
-            if self.ws and self.ws.connected:
+            if self.ws and self.ws.protocol.state is State.OPEN:
                 try:
                     self.ws.close()
                     print("[WebSocket] Closed")